@@ -1,3 +1,6 @@
+from cStringIO import StringIO
+
+
 class AsmInstruction(object):
     def __init__(self, op=None, arg1=None, arg2=None, arg3=None, comment=""):
         self.op = op
@@ -7,39 +10,103 @@ class AsmInstruction(object):
         self.comment = comment
 
     def __str__(self):
-        # to add the comments aligned correctly
-        comment = lambda s: s + (" " * (30 - len(s))) + "# " + self.comment
         if self.arg1 is not None and self.arg2 is not None and self.arg3 is not None:
-            return comment("%s %s, %s, %s" % (self.op, self.arg1, self.arg2, self.arg3))
+            s = "%s %s, %s, %s" % (self.op, self.arg1, self.arg2, self.arg3)
         elif self.arg1 is not None and self.arg2 is not None:
-            return comment("%s %s, %s" % (self.op, self.arg1, self.arg2))
+            s = "%s %s, %s" % (self.op, self.arg1, self.arg2)
         elif self.arg1 is not None:
-            return comment("%s %s" % (self.op, self.arg1))
+            s = "%s %s" % (self.op, self.arg1)
         else:
-            return comment(self.op)
+            s = self.op
+        # to add the comments aligned correctly
+        return "%-30s# %s" % (s, self.comment)
+
+
+class AsmWriter(object):
+
+    def __init__(self, out, size=1024):
+        """Buffered writer of assembly lines. Lines are joined and written
+        out in chunks, instead of one write per line
+
+        Arguments:
+        out - file like object
+
+        Keyword Arguments:
+        size - number of lines per chunk
+
+        """
+        self.out = out
+        self.size = size
+        self.lines = []
+
+    def write(self, line):
+        """Add a line (without the newline)
+
+        """
+        self.lines.append(line)
+        if len(self.lines) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if len(self.lines) != 0:
+            self.lines.append('')
+            self.out.write('\n'.join(self.lines))
+            self.lines = []
+
+
+def write_asm(out, asm, icc):
+    """Write out an assembly program, consuming asm as it goes
+
+    Arguments:
+    out - file like object
+    asm - iterable of AsmInstruction (or assembly line strings)
+    icc - ICContext of the program
+
+    """
+    writer = AsmWriter(out)
+    writer.write('.data')
+    for g in icc.globals:
+        writer.write('global_%s: .word 0' % g)
+    writer.write('out_of_bounds: .asciiz "Proto Runtime Error: Attempt to access array out of bounds.\\n"')
+    writer.write('.text')
+    writer.write('# Exception handler')
+    writer.write('exc_oob:\nli $v0, 4\nla $a0, out_of_bounds\nsyscall')
+    writer.write('li $a0, -1\nli $v0, 10\nsyscall')
+    writer.write("# Main code")
+    writer.write('main:')
+    writer.write('jal func_main')
+    # Exit gracefully
+    writer.write('# Exit gracefully\nli $v0, 10\nsyscall')
+    for a in asm:
+        writer.write(str(a))
+    writer.flush()
+
+
+def asm_to_string(asm, icc):
+    """Make the text of an assembly program
 
+    Arguments:
+    asm - iterable of AsmInstruction (or assembly line strings)
+    icc - ICContext of the program
+
+    Return:
+    string
+
+    """
+    out = StringIO()
+    write_asm(out, asm, icc)
+    return out.getvalue()
 
-def write_asm_to_file(program_name, asm, icc):
+
+def write_asm_to_file(program_name, text):
     """Write out program to a file called
     program_name.asm
 
     Arguments:
     program_name - name of program
+    text - assembly string, look @asm_to_string
 
     """
     out = open('%s.asm' % program_name, 'w')
-    out.write('.data\n')
-    for g in icc.globals:
-        out.write('global_%s: .word 0\n' % g)
-    out.write('out_of_bounds: .asciiz "Proto Runtime Error: Attempt to access array out of bounds.\\n"\n')
-    out.write('.text\n')
-    out.write('# Exception handler\n');
-    out.write('exc_oob:\nli $v0, 4\nla $a0, out_of_bounds\nsyscall\n')
-    out.write('li $a0, -1\nli $v0, 10\nsyscall\n')
-    out.write("# Main code\n")
-    out.write('main:\n')
-    out.write('jal func_main\n')
-    # Exit gracefully
-    out.write('# Exit gracefully\nli $v0, 10\nsyscall\n')
-    for a in asm:
-        out.write('%s\n' % a)
+    out.write(text)
+    out.close()
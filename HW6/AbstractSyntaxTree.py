@@ -1,5 +1,5 @@
 from IntermediateCode import *
-from proto5lexer import find_column, colorize
+from Diagnostics import Diagnostics
 
 NODE_COLORS = {
     'ASTAlloc': '#FFFFFF',
@@ -44,6 +44,11 @@ class ASTContext(object):
         self.globals = set()
         # Classes
         self.classes = {}
+        # class name -> set of the names of all of its superclasses
+        self.ancestors = {}
+        # (class name, function name, number of arguments) -> list of
+        # function names which could match, look @lookup_function
+        self.methods = {}
         # Declared variables ie: int a
         self.declared = set()
         # Defined variables ie: a = 2;
@@ -63,8 +68,14 @@ class ASTContext(object):
         self.returns = False
         # Counter for making new variable names
         self.counter = 0
-        # Reference to previous astc
-        self.previous = None
+        # Stack of ASTScope, one for every scope entered
+        self.scopes = []
+        # Changes of declared, defined, used, rename and types made inside
+        # of scopes, undone on leaving them: (set, name) for a name added
+        # to a set, or (dict, key, had key, old value) for a dict item
+        self.undo = []
+        # Diagnostics collector for errors
+        self.diagnostics = None
 
         # Other
         self.debug_functions = {}
@@ -84,36 +95,94 @@ class ASTContext(object):
         self.counter += 1
         return n
 
-    def clone(self):
-        """Clone this ASTContext
+    def enter_scope(self):
+        """Start a nested scope (block, loop body, if branch, function).
+        Declarations, definitions, renames and types made in it only last
+        until exit_scope
+
+        """
+        self.scopes.append(ASTScope(len(self.undo), self.returns,
+                                    self.counter))
+
+    def exit_scope(self):
+        """Leave the current scope, undoing all of its changes. The counter
+        and returns are also restored to what they were when it started
 
         Return:
-        ASTContext with the same information and
-        a reference to its parent astc
+        ASTScope with the variables defined, the returns and counter of
+        the scope when it ended
+
+        """
+        scope = self.scopes.pop()
+        scope.returns, self.returns = self.returns, scope.returns
+        scope.counter, self.counter = self.counter, scope.counter
+        while len(self.undo) != scope.mark:
+            change = self.undo.pop()
+            if len(change) == 2:
+                change[0].discard(change[1])
+                if change[0] is self.defined:
+                    scope.defined.add(change[1])
+            elif change[2]:
+                change[0][change[1]] = change[3]
+            else:
+                del change[0][change[1]]
+        return scope
+
+    def add(self, names, name):
+        if name not in names:
+            names.add(name)
+            if len(self.scopes) != 0:
+                self.undo.append((names, name))
+
+    def put(self, mapping, key, value):
+        if len(self.scopes) != 0:
+            if key in mapping:
+                self.undo.append((mapping, key, True, mapping[key]))
+            else:
+                self.undo.append((mapping, key, False, None))
+        mapping[key] = value
+
+    def declare(self, name):
+        self.add(self.declared, name)
+
+    def define(self, name):
+        self.add(self.defined, name)
+
+    def use(self, name):
+        self.add(self.used, name)
+
+    def set_rename(self, name, new_name):
+        self.put(self.rename, name, new_name)
+
+    def set_type(self, name, t):
+        self.put(self.types, name, t)
+
+    def error(self, message, node=None):
+        """Report an error in the program, at the source position of a node
+        if it has one and the diagnostics have the source (look
+        @ASTNode.__init__)
+
+        Arguments:
+        message - description string
+
+        Keyword Arguments:
+        node - ASTNode the error is about
+
+        """
+        lineno = column = None
+        if node is not None and node.lexpos is not None and \
+           self.diagnostics.source:
+            lineno, column = self.diagnostics.position(node.lexpos)
+        self.diagnostics.error(message, lineno=lineno, column=column)
+
+    def note(self, message):
+        """Add more detail to the last error
+
+        Arguments:
+        message - description string
 
         """
-        a = ASTContext()
-        for x in self.globals:
-            a.globals.add(x)
-        for k, v in self.classes.iteritems():
-            a.classes[k] = v
-        for x in self.declared:
-            a.declared.add(x)
-        for x in self.defined:
-            a.defined.add(x)
-        for x in self.used:
-            a.used.add(x)
-        for k, v in self.rename.iteritems():
-            a.rename[k] = v
-        for k, v in self.types.iteritems():
-            a.types[k] = v
-        for k, v in self.functions.iteritems():
-            a.functions[k] = v
-        a.current_function = self.current_function
-        a.returns = self.returns
-        a.counter = self.counter
-        a.previous = self
-        return a
+        self.diagnostics.note(message)
 
     def classes_castable(self, l, r):
         lt = l.type(self)
@@ -122,24 +191,55 @@ class ASTContext(object):
             # handle superclasses
             if (lt[0] in self.classes and rt[0] in self.classes
                     and lt[1] == 0 and rt[1] == 0):
-                s = self.classes[rt[0]]['super']
-                while s is not None:
-                    if s == lt[0]:
-                        return True
-                    s = self.classes[s]['super']
+                return lt[0] in self.ancestors[rt[0]]
             return False
         return True
 
+    def add_class(self, name, superclass):
+        """Add a class to the hierarchy index. The superclass must have
+        been added before
+
+        Arguments:
+        name - class name
+        superclass - name of superclass, or None
+
+        """
+        if superclass is None:
+            self.ancestors[name] = set()
+        else:
+            self.ancestors[name] = self.ancestors[superclass] | set([superclass])
+
+    def method_candidates(self, cltype, func, n):
+        """Functions which a call of a method could resolve to, in order:
+        the ones of the class first, then of its superclasses
+
+        Arguments:
+        cltype - class name
+        func - method name
+        n - number of arguments
+
+        Return:
+        list of function names with n arguments
+
+        """
+        key = (cltype, func, n)
+        if key not in self.methods:
+            candidates = []
+            c = cltype
+            while c is not None:
+                for f in self.classes[c]['fun_decl'].get(func, []):
+                    if len(self.functions[f]) == n:
+                        candidates.append(f)
+                c = self.classes[c]['super']
+            self.methods[key] = candidates
+        return self.methods[key]
+
     def lookup_function(self, cltype, func, args):
-        if func in self.classes[cltype]['fun_decl']:
-            functions = self.classes[cltype]['fun_decl'][func]
-            for f in functions:  # find the matching signature
-                if len(args) == len(self.functions[f]):
-                    if all([self.classes_castable(b, a) for a, b in
-                           zip(args, self.functions[f])]):
-                        return f
-        if self.classes[cltype]['super'] is not None:
-            return self.lookup_function(self.classes[cltype]['super'], func, args)
+        for f in self.method_candidates(cltype, func, len(args)):
+            # find the matching signature
+            if all([self.classes_castable(b, a) for a, b in
+                   zip(args, self.functions[f])]):
+                return f
 
     def __str__(self):
         return 'Declared: [%s], Defined: [%s]' % (
@@ -147,6 +247,24 @@ class ASTContext(object):
                ','.join([repr(x) for x in self.defined]))
 
 
+class ASTScope(object):
+
+    def __init__(self, mark, returns, counter):
+        """Scope of an ASTContext. Look @ASTContext.enter_scope
+
+        Arguments:
+        mark - length of the undo log when the scope started
+        returns - whether there is an all-control flow return
+        counter - counter for making new variable names
+
+        """
+        self.mark = mark
+        self.returns = returns
+        self.counter = counter
+        # Variables defined in the scope, which were not defined before
+        self.defined = set()
+
+
 class ASTNode(object):
     """ASTNode which represents different AST TYPES
     Exepects to implement wellformed, gencode
@@ -154,12 +272,52 @@ class ASTNode(object):
     The default COLOR attribute is white
     """
     COLOR = NODE_COLORS['ASTNode']
+    # Nodes have no __dict__, every subclass lists its own attributes
+    __slots__ = ('lineno', 'lexpos', 'expr_type')
 
-    def __init__(self):
+    def __init__(self, p):
+        """Keep the source position of a production, but not the
+        production itself (it belongs to the parser)
+
+        Arguments:
+        p - pyl parser object, or None for nodes made by the compiler
+
+        """
+        # Line (counted from 0) and offset in the source of the first
+        # token of the node, or None if unknown
+        self.lineno = None
+        self.lexpos = None
+        # Type of the expression in its scope, annotated by wellformed
+        self.expr_type = None
+        if p is None:
+            return
+        for symbol in p.slice[1:]:
+            if hasattr(symbol, 'lexpos'):
+                # A token
+                self.lineno, self.lexpos = symbol.lineno, symbol.lexpos
+                return
+            if isinstance(symbol.value, ASTNode) and \
+               symbol.value.lexpos is not None:
+                self.lineno = symbol.value.lineno
+                self.lexpos = symbol.value.lexpos
+                return
+
+    def compute_type(self, astc):
+        """Compute the type of this expression from the types of its
+        children and the ASTContext
+
+        Arguments:
+        astc - ASTContext object
+
+        Return:
+        ('str', dimensions)
+
+        """
         raise NotImplementedError(type(self))
 
     def type(self, astc):
-        """Return the type of this expression
+        """Return the type of this expression: the annotated one after
+        wellformed, else computed (look @compute_type)
 
         Arguments:
         astc - ASTContext object
@@ -168,7 +326,35 @@ class ASTNode(object):
         ('str', dimensions)
 
         """
-        raise NotImplementedError(type(self))
+        if self.expr_type is not None:
+            return self.expr_type
+        return self.compute_type(astc)
+
+    def annotate(self, astc):
+        """Annotate the type of this expression, at the end of wellformed
+        once its children are annotated
+
+        Arguments:
+        astc - ASTContext object
+
+        Return:
+        ('str', dimensions)
+
+        """
+        self.expr_type = self.compute_type(astc)
+        return self.expr_type
+
+    def graph_name(self, counter, label):
+        """Name of the node in the AST graph, with its annotated type
+
+        Arguments:
+        counter - unique node id
+        label - description of the node
+
+        """
+        if self.expr_type is None:
+            return "%s\n%s" % (counter, label)
+        return "%s\n%s\n%s" % (counter, label, type_to_string(self.expr_type))
 
     def wellformed(self):
         """Check language semantics.
@@ -182,7 +368,10 @@ class ASTNode(object):
         raise NotImplementedError(type(self))
 
     def gencode(self, icc):
-        """Generate IntermediateCode
+        """Generate IntermediateCode. Nodes which generate the code of
+        their parts between their own instructions (such as loops) are
+        generators: they yield a list of parts whenever the code of those
+        parts comes next, look @gencode_order
 
         Arguments:
         icc - IntermediateCodeContext
@@ -190,15 +379,16 @@ class ASTNode(object):
         """
         raise NotImplementedError(type(self))
 
-    def to_stack(self):
-        """Convert from internal tree representation to an
-        in order stack representation
+    def children(self):
+        """Nodes whose code is generated before the code of this node.
+        Nodes which generate the code of their parts themselves (such as
+        loops) only return the parts evaluated before them
 
         Return:
-        array of ASTNode in reverse order of operations
+        list of ASTNode in order of operations
 
         """
-        raise NotImplementedError(type(self))
+        return []
 
     def add_edges_to_graph(self, graph, parent, counter):
         """Add nodes and edges to a graph
@@ -231,7 +421,113 @@ def function_to_string(d, astc):
     return '%s %s(%s)' % (type_to_string(d.type(astc)), d.name, args)
 
 
+# ASTNode class -> names of all of its attributes, look @node_fields
+_node_slots = {}
+
+
+def count_nodes(node):
+    """Count the ASTNodes of a tree (each shared node once)
+
+    Arguments:
+    node - root ASTNode
+
+    Return:
+    number of nodes
+
+    """
+    seen = set()
+    stack = [node]
+    while len(stack) != 0:
+        n = stack.pop()
+        if id(n) in seen:
+            continue
+        seen.add(id(n))
+        for v in node_fields(n):
+            if isinstance(v, ASTNode):
+                stack.append(v)
+            elif isinstance(v, list):
+                stack.extend([x for x in v if isinstance(x, ASTNode)])
+    return len(seen)
+
+
+def node_fields(node):
+    """Return the values of all attributes of an ASTNode
+
+    """
+    cls = type(node)
+    if cls not in _node_slots:
+        _node_slots[cls] = [name for c in cls.__mro__
+                            for name in c.__dict__.get('__slots__', ())]
+    return [getattr(node, name, None) for name in _node_slots[cls]]
+
+
+def postorder(nodes):
+    """Iterate over trees in the order their code is generated: every
+    node after its children (look @ASTNode.children). Uses an explicit
+    stack instead of recursion
+
+    Arguments:
+    nodes - list of root ASTNode
+
+    """
+    stack = [(n, False) for n in reversed(nodes)]
+    while len(stack) != 0:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend([(c, False) for c in reversed(node.children())])
+
+
+def gencode_order(nodes, icc):
+    """Generate IntermediateCode of trees, look @postorder. The parts
+    yielded by a gencode generator (look @ASTNode.gencode) are generated
+    before it is resumed, from a stack of iterators instead of recursion,
+    so the Python stack does not grow with the nesting of the program
+
+    Arguments:
+    nodes - list of root ASTNode
+    icc - IntermediateCodeContext
+
+    Return:
+    iterator of ASTNode, each one once its code is generated
+
+    """
+    # Stack of (postorder iterator, None) and (gencode generator, node)
+    stack = [(postorder(nodes), None)]
+    while len(stack) != 0:
+        iterator, node = stack[-1]
+        item = next(iterator, None)
+        if item is None:
+            stack.pop()
+            if node is not None:
+                yield node
+        elif node is not None:
+            # Parts of a node, to generate before resuming it
+            stack.append((postorder(item), None))
+        else:
+            steps = item.gencode(icc)
+            if steps is None:
+                yield item
+            else:
+                stack.append((steps, item))
+
+
+def gencode_nodes(nodes, icc):
+    """Generate IntermediateCode of trees, look @gencode_order
+
+    Arguments:
+    nodes - list of root ASTNode
+    icc - IntermediateCodeContext
+
+    """
+    for s in gencode_order(nodes, icc):
+        pass
+
+
 class ASTProgram(ASTNode):
+    __slots__ = ('declarations', 'diagnostics', 'astc', 'icc')
 
     def __init__(self, p, declarations):
         """Encapsulates ASTStatements
@@ -240,40 +536,57 @@ class ASTProgram(ASTNode):
         declarations - array of ASTDeclareList, ASTFunc, ASTClass
 
         """
-        self.p = p
+        super(ASTProgram, self).__init__(p)
         self.declarations = declarations
+        self.diagnostics = None
+        self.astc = None
+        self.icc = None
 
-    def wellformed(self):
+    def wellformed(self, diagnostics=None):
+        """Check the program for semantic errors
+
+        Keyword Arguments:
+        diagnostics - Diagnostics to add errors to (default: a new one,
+            which is kept in ASTProgram.diagnostics). Errors only have
+            source positions if it has the program source
+
+        Return:
+        True / False for well formed / errors
+
+        """
+        if diagnostics is None:
+            diagnostics = Diagnostics()
+        self.diagnostics = diagnostics
         self.astc = ASTContext()
         astc = self.astc
+        astc.diagnostics = diagnostics
         ok = True
         # Get all functions
         for d in self.declarations:
             if isinstance(d, ASTFunctionDeclare):
                 if d.name in astc.functions:
-                    print '%s %s %s %s' % (
-                        colorize('%s:' % self.p.lexer.proto_file, 'white'),
-                        colorize('error:', 'red'),
-                        colorize('redeclaration of function:', 'white'),
-                        colorize("'%s'" % d.name, 'yellow'))
-                    print function_to_string(d, astc)
-                    print colorize('previously declared as:', 'white')
-                    print function_name_to_string(d.name, astc)
+                    astc.error("redeclaration of function: '%s'" % d.name,
+                               node=d)
+                    astc.note(function_to_string(d, astc))
+                    astc.note('previously declared as:')
+                    astc.note(function_name_to_string(d.name, astc))
                     ok = False
                 elif d.name in astc.types:
-                    print 'Redeclaration of class as function: %s' % d.name
+                    astc.error('Redeclaration of class as function: %s' % d.name,
+                               node=d)
+                    ok = False
                 else:
                     astc.functions[d.name] = d.formals
-                    astc.types[d.name] = d.type(astc)
+                    astc.set_type(d.name, d.type(astc))
                     astc.debug_functions[d.name] = d
             elif isinstance(d, ASTDeclareList):
                 for dec in d.declarations:
                     if dec.value in astc.globals:
-                        print 'Redefinition of global variable: %s' % dec.value
+                        astc.error('Redefinition of global variable: %s' % dec.value,
+                                   node=dec)
                         return False
-                    print "Global: %s" % dec.value
-                    astc.types[dec.value] = dec.type(astc)
-                    astc.defined.add(dec.value)
+                    astc.set_type(dec.value, dec.type(astc))
+                    astc.define(dec.value)
                     astc.globals.add(dec.value)
                 # print d.declarations[0].value
                 # astc.defined.add(d.declarations[0].value)
@@ -288,28 +601,18 @@ class ASTProgram(ASTNode):
         #         d.first_pass(astc)
         # Check for correct main
         if 'main' not in astc.functions:
-            print '%s %s %s %s' % (
-                colorize('%s:' % self.p.lexer.proto_file, 'white'),
-                colorize('error:', 'red'),
-                colorize("'main'", 'yellow'),
-                colorize("function missing", 'white'))
+            astc.error("'main' function missing")
             return False
         if len(astc.functions['main']) != 0:
-            print '%s %s %s %s' % (
-                colorize('%s:' % self.p.lexer.proto_file, 'white'),
-                colorize('error:', 'red'),
-                colorize("'main'", 'yellow'),
-                colorize("function has arguments", 'white'))
-            print function_name_to_string('main', astc)
+            astc.error("'main' function has arguments",
+                       node=astc.debug_functions['main'])
+            astc.note(function_name_to_string('main', astc))
             ok = False
         if astc.types['main'] != ('void', 0):
-            print '%s %s %s %s %s' % (
-                colorize('%s:' % self.p.lexer.proto_file, 'white'),
-                colorize('error:', 'red'),
-                colorize("'main'", 'yellow'),
-                colorize("function has non-void return type:", 'white'),
-                colorize('%s%s' % (astc.types['main'][0], "[]" * astc.types['main'][1]), 'green'))
-            print function_name_to_string('main', astc)
+            astc.error("'main' function has non-void return type: %s" % (
+                type_to_string(astc.types['main'])),
+                node=astc.debug_functions['main'])
+            astc.note(function_name_to_string('main', astc))
             ok = False
         if not ok:
             return False
@@ -322,17 +625,28 @@ class ASTProgram(ASTNode):
     def gencode(self):
         icc = ICContext(self.astc.globals)
         self.icc = icc
-        stack = self.to_stack()
-        while len(stack) != 0:
-            s = stack.pop()
-            s.gencode(icc)
+        gencode_nodes(self.declarations, icc)
         return icc
 
-    def to_stack(self):
-        stack = []
-        for s in self.declarations:
-            stack = s.to_stack() + stack
-        return stack
+    def gencode_functions(self, icc):
+        """Generate IntermediateCode one function at a time. The code of
+        each function is taken out of the ICContext before it is returned
+        (look @ICContext.pop_functions), so only the function being worked
+        on is kept
+
+        Arguments:
+        icc - IntermediateCodeContext
+
+        Return:
+        iterator of (function name, list of ICContextBasicBlock), in
+        program order
+
+        """
+        self.icc = icc
+        for s in gencode_order(self.declarations, icc):
+            if isinstance(s, ASTFunctionDeclare):
+                for f in icc.pop_functions():
+                    yield f
 
     def add_edges_to_graph(self, graph, parent, counter):
         name = "program"
@@ -366,6 +680,7 @@ class ASTProgram(ASTNode):
 
 class ASTAlloc(ASTNode):
     COLOR = NODE_COLORS['ASTAlloc']
+    __slots__ = ('a_type', 'size', 'dimensions')
 
     def __init__(self, p, a_type, size, dimensions):
         """AST integer
@@ -375,20 +690,21 @@ class ASTAlloc(ASTNode):
         size - size of array
 
         """
-        self.p = p
+        super(ASTAlloc, self).__init__(p)
         self.a_type = a_type[0]
         self.size = size
         self.dimensions = dimensions
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return (self.a_type, self.dimensions)
 
     def wellformed(self, astc):
         if not self.size.wellformed(astc):
             return False
         if self.size.type(astc) != ('int', 0):
-            print 'Array size is not an integer!'
+            astc.error('Array size is not an integer!', node=self.size)
             return False
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
@@ -401,11 +717,11 @@ class ASTAlloc(ASTNode):
 
         icc.push_var(var)
 
-    def to_stack(self):
-        return [self] + [self.size]
+    def children(self):
+        return [self.size]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\nalloc(%s)" % (counter, self.size)
+        name = self.graph_name(counter, "alloc(%s)" % self.size)
         graph.add_node(name, fillcolor=ASTInteger.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -416,6 +732,7 @@ class ASTAlloc(ASTNode):
 
 class ASTAllocObject(ASTNode):
     COLOR = NODE_COLORS['ASTAllocObject']
+    __slots__ = ('name', 'size')
 
     def __init__(self, p, name):
         """Allocate a new object of type name
@@ -425,17 +742,18 @@ class ASTAllocObject(ASTNode):
         name - class name
 
         """
-        self.p = p
+        super(ASTAllocObject, self).__init__(p)
         self.name = name
         self.size = 0
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return (self.name, 0)
 
     def wellformed(self, astc):
         if self.name not in astc.classes:
             return False
         self.size = len(astc.classes[self.name]['types'].keys())
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
@@ -443,11 +761,8 @@ class ASTAllocObject(ASTNode):
         icc.add_instruction(ICAllocMemory(var, Integer(self.size)))
         icc.push_var(var)
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n objalloc(%s)" % (counter, self.size)
+        name = self.graph_name(counter, "objalloc(%s)" % self.size)
         graph.add_node(name, fillcolor=ASTAllocObject.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -455,6 +770,7 @@ class ASTAllocObject(ASTNode):
 
 class ASTArray(ASTNode):
     COLOR = NODE_COLORS['ASTArray']
+    __slots__ = ('value', 'element')
 
     def __init__(self, p, value, element):
         """AST variable
@@ -464,22 +780,25 @@ class ASTArray(ASTNode):
         value - name of variable
 
         """
-        self.p = p
+        super(ASTArray, self).__init__(p)
         self.value = value
         self.element = element
 
-    def type(self, astc):
+    def compute_type(self, astc):
         # Subtract a dimension because we're accessing
         t = self.value.type(astc)
         return (t[0], t[1] - 1)
 
     def wellformed(self, astc):
         if self.element.type(astc) != ('int', 0):
-            print 'Array index is not an integer!'
+            astc.error('Array index is not an integer!', node=self.element)
             return False
         if not self.element.wellformed(astc):
             return False
-        return self.value.wellformed(astc)
+        if not self.value.wellformed(astc):
+            return False
+        self.annotate(astc)
+        return True
 
     def gencode(self, icc):
 
@@ -491,16 +810,14 @@ class ASTArray(ASTNode):
 
         icc.add_instruction(ICLoadWord(val, base, Integer(0), elem))
 
-        val.is_pointer = True
-        val._elem = elem
-        val._base = base
+        icc.element_addresses[val] = (base, elem)
         icc.push_var(val)
 
-    def to_stack(self):
-        return [self] + self.value.to_stack() + self.element.to_stack()
+    def children(self):
+        return [self.element, self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s[%s]" % (counter, self.value, self.element)
+        name = self.graph_name(counter, "%s[%s]" % (self.value, self.element))
         graph.add_node(name, fillcolor=ASTVariable.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -511,6 +828,7 @@ class ASTArray(ASTNode):
 
 class ASTAssign(ASTNode):
     COLOR = NODE_COLORS['ASTAssign']
+    __slots__ = ('left', 'right')
 
     def __init__(self, p, left, right):
         """AST assignment operation
@@ -521,11 +839,11 @@ class ASTAssign(ASTNode):
         right - stuff being assigned to variable
 
         """
-        self.p = p
+        super(ASTAssign, self).__init__(p)
         self.left = left
         self.right = right
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return self.right.type(astc)
 
     def wellformed(self, astc):
@@ -535,24 +853,27 @@ class ASTAssign(ASTNode):
             if self.left.value in astc.rename:
                 self.left.value = astc.rename[self.left.value]
             if self.left.value not in astc.declared:
-                print "%s assigned but not declared!" % self.left.value
+                astc.error("%s assigned but not declared!" % self.left.value,
+                           node=self.left)
                 return False
-            astc.defined.add(self.left.value)
+            astc.define(self.left.value)
         if not self.left.wellformed(astc):
             return False
 
         if not astc.classes_castable(self.left, self.right):
-            print self.left, self.left.type(astc)
-            print self.right, self.right.type(astc)
-            print 'type mismatch for asisgnment statement!'
+            astc.error('type mismatch for asisgnment statement!', node=self)
+            astc.note('%s %s' % (self.left, self.left.type(astc)))
+            astc.note('%s %s' % (self.right, self.right.type(astc)))
             return False
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
         dest = icc.pop_var()
         src = icc.pop_var()
         if isinstance(self.left, ASTArray) or isinstance(self.left, ASTFieldAccess):
-            icc.add_instruction(ICStoreWord(src, dest._base, Integer(0), dest._elem))
+            base, elem = icc.element_addresses[dest]
+            icc.add_instruction(ICStoreWord(src, base, Integer(0), elem))
             icc.push_var(src)
         else:
             if dest.value in icc.globals:
@@ -561,13 +882,13 @@ class ASTAssign(ASTNode):
                 icc.add_instruction(ICAssign(dest, src))
                 icc.push_var(dest)
 
-    def to_stack(self):
-        return [self] + self.left.to_stack() + self.right.to_stack()
+    def children(self):
+        return [self.right, self.left]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, '=')
+        name = self.graph_name(counter, '=')
         counter += 1
-        left = "%s\n%s" % (counter, self.left.value)
+        left = self.left.graph_name(counter, self.left.value)
         graph.add_node(name, fillcolor=ASTAssign.COLOR)
         graph.add_edge(parent, name)
         # Left assign is always variable
@@ -581,6 +902,7 @@ class ASTAssign(ASTNode):
 
 class ASTBinaryOp(ASTNode):
     COLOR = NODE_COLORS['ASTBinaryOp']
+    __slots__ = ('left', 'right', 'b_type')
     TYPES = set(['+', '-', '*', '/', '%', '&&', '||', '==', '!=', '<', '<=',
                  '>', '>='])
 
@@ -595,13 +917,13 @@ class ASTBinaryOp(ASTNode):
         type - one of ASTBinaryOp.TYPES
 
         """
-        self.p = p
+        super(ASTBinaryOp, self).__init__(p)
         self.left, self.right = left, right
         self.b_type = type
         if self.b_type not in ASTBinaryOp.TYPES:
             raise TypeError('Binary operation: %r not supported')
 
-    def type(self, astc):
+    def compute_type(self, astc):
         left, right = self.left.type(astc), self.right.type(astc)
         integer, boolean = ('int', 0), ('bool', 0)
         if self.b_type in ('+', '-', '*', '/', '%') and left == integer and right == integer:
@@ -618,8 +940,8 @@ class ASTBinaryOp(ASTNode):
     def wellformed(self, astc):
         if not(self.left.wellformed(astc) and self.right.wellformed(astc)):
             return False
-        if self.type(astc) is None:
-            print 'Bad binary op type!'
+        if self.annotate(astc) is None:
+            astc.error('Bad binary op type!', node=self)
             return False
         return True
 
@@ -630,11 +952,11 @@ class ASTBinaryOp(ASTNode):
         icc.add_instruction(ICBinaryOp(var, arg1, arg2, self.b_type))
         icc.push_var(var)
 
-    def to_stack(self):
-        return [self] + self.right.to_stack() + self.left.to_stack()
+    def children(self):
+        return [self.left, self.right]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.b_type)
+        name = self.graph_name(counter, self.b_type)
         graph.add_node(name, fillcolor=ASTBinaryOp.COLOR)
         graph.add_edge(parent, name)
         counter = self.left.add_edges_to_graph(graph, name, counter + 1)
@@ -646,6 +968,7 @@ class ASTBinaryOp(ASTNode):
 
 class ASTBlock(ASTNode):
     COLOR = NODE_COLORS['ASTBlock']
+    __slots__ = ('declarations', 'statements')
 
     def __init__(self, p, declarations, statements):
         """AST block
@@ -656,32 +979,30 @@ class ASTBlock(ASTNode):
         statements - block statements
 
         """
-        self.p = p
+        super(ASTBlock, self).__init__(p)
         self.declarations = declarations
         self.statements = statements
 
     def wellformed(self, astc):
-        astc_clone = astc.clone()
+        # Left by the ASTEndBlock at the end of the statements
+        astc.enter_scope()
         for d in self.declarations:
-            if not d.wellformed(astc_clone):
+            if not d.wellformed(astc):
                 return False
         for s in self.statements:
-            if not s.wellformed(astc_clone):
+            if not s.wellformed(astc):
                 return False
         return True
 
     def gencode(self, icc):
-        for s in self.statements:
-            s.gencode(icc)
+        # The statements are generated before, look @children
+        pass
 
-    def to_stack(self):
-        stack = []
-        for s in self.statements:
-            stack = s.to_stack() + stack
-        return stack
+    def children(self):
+        return self.statements
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\nBLOCK" % (counter)
+        name = self.graph_name(counter, "BLOCK")
         graph.add_node(name, fillcolor=ASTBlock.COLOR)
         graph.add_edge(parent, name)
         for d in self.declarations:
@@ -696,6 +1017,7 @@ class ASTBlock(ASTNode):
 
 class ASTBoolean(ASTNode):
     COLOR = NODE_COLORS['ASTBoolean']
+    __slots__ = ('value',)
 
     def __init__(self, p, value):
         """AST integer
@@ -705,10 +1027,10 @@ class ASTBoolean(ASTNode):
         value - python boolean value
 
         """
-        self.p = p
+        super(ASTBoolean, self).__init__(p)
         self.value = value
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return ('bool', 0)
 
     def wellformed(self, astc):
@@ -720,11 +1042,8 @@ class ASTBoolean(ASTNode):
         else:
             icc.push_var(Integer(0))
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.value)
+        name = self.graph_name(counter, self.value)
         graph.add_node(name, fillcolor=ASTBoolean.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -735,11 +1054,12 @@ class ASTBoolean(ASTNode):
 
 class ASTDeclareClass(ASTNode):
     COLOR = NODE_COLORS['ASTDeclareClass']
+    __slots__ = ('name', 'prop_decl', 'fun_decl', 'super')
 
     def __init__(self, p, name, declarations, superclass=None):
         """AST Class Declaration
         """
-        self.p = p
+        super(ASTDeclareClass, self).__init__(p)
         self.name = name
         self.prop_decl = [d for d in declarations if isinstance(d, ASTDeclareList)]
         self.fun_decl = [d for d in declarations if isinstance(d, ASTFunctionDeclare)]
@@ -750,6 +1070,7 @@ class ASTDeclareClass(ASTNode):
         if self.super:
             self.prop_decl = astc.classes[self.super]['prop_decl'] + self.prop_decl
             astc.classes[self.name]['super'] = self.super
+        astc.add_class(self.name, self.super)
 
         # properties
         n = 0
@@ -757,7 +1078,8 @@ class ASTDeclareClass(ASTNode):
             for d in vl.declarations:
                 var_name, var_type = d.value, d.v_type
                 if var_name in astc.classes[self.name]['types']:
-                    print 'Redeclarations of variable name: %s in class: %s' % (var_name, self.name)
+                    astc.error('Redeclarations of variable name: %s in class: %s' % (var_name, self.name),
+                               node=d)
                     return False
                 astc.classes[self.name]['types'][var_name] = var_type
                 astc.classes[self.name]['positions'][var_name] = n
@@ -780,14 +1102,15 @@ class ASTDeclareClass(ASTNode):
 
             if d.name in astc.classes[self.name]['fun_decl']:
                 if new_name in astc.classes[self.name]['fun_decl'][d.name]:
-                    print 'Redeclaration of function: %s in class: %s' % (d.name, self.name)
+                    astc.error('Redeclaration of function: %s in class: %s' % (d.name, self.name),
+                               node=d)
                     return False
                 astc.classes[self.name]['fun_decl'][d.name] += [new_name]
             else:
                 astc.classes[self.name]['fun_decl'][d.name] = [new_name]
             d.name = new_name
             astc.functions[d.name] = d.formals
-            astc.types[d.name] = d.type(astc)
+            astc.set_type(d.name, d.type(astc))
             astc.debug_functions[d.name] = d
         return True
 
@@ -803,11 +1126,12 @@ class ASTDeclareClass(ASTNode):
     def gencode(self, icc):
         pass
 
-    def to_stack(self):
-        return [] + self.fun_decl
+    def children(self):
+        # Methods are generated last to first
+        return self.fun_decl[::-1]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\nclass: %s" % (counter, self.name)
+        name = self.graph_name(counter, "class: %s" % self.name)
         graph.add_node(name, fillcolor=ASTDeclareClass.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -815,6 +1139,7 @@ class ASTDeclareClass(ASTNode):
 
 class ASTDeclareList(ASTNode):
     COLOR = NODE_COLORS['ASTDeclareList']
+    __slots__ = ('dec_type', 'declarations')
 
     def __init__(self, p, dec_type, declarations):
         """AST Declaration list
@@ -824,31 +1149,28 @@ class ASTDeclareList(ASTNode):
         dec_type - declaration type (ignored for now)
         declarations - array of variable names
         """
-        self.p = p
+        super(ASTDeclareList, self).__init__(p)
         self.dec_type = dec_type
         self.declarations = declarations
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return self.dec_type
 
     def wellformed(self, astc):
         for d in self.declarations:
             if not d.wellformed(astc):
                 return False
-            astc.types[d.value] = d.v_type
+            astc.set_type(d.value, d.v_type)
         return True
 
     def gencode(self, icc):
         pass
 
-    def to_stack(self):
-        stack = []
-        for s in self.declarations:
-            stack = s.to_stack() + stack
-        return stack
+    def children(self):
+        return self.declarations
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.dec_type)
+        name = self.graph_name(counter, self.dec_type)
         graph.add_node(name, fillcolor=ASTDeclareList.COLOR)
         graph.add_edge(parent, name)
         for d in self.declarations:
@@ -861,6 +1183,7 @@ class ASTDeclareList(ASTNode):
 
 class ASTDeclareVariable(ASTNode):
     COLOR = NODE_COLORS['ASTDeclareVariable']
+    __slots__ = ('value', 'v_type')
 
     def __init__(self, p, value, mytype):
         """AST variable
@@ -871,32 +1194,29 @@ class ASTDeclareVariable(ASTNode):
         dimensions - number of dimensions
 
         """
-        self.p = p
+        super(ASTDeclareVariable, self).__init__(p)
         self.value = value
         self.v_type = mytype
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return self.v_type
 
     def wellformed(self, astc):
         if self.value not in astc.declared:
-            astc.declared.add(self.value)
+            astc.declare(self.value)
         else:
             new_name = astc.get_new_var_name(self.value)
-            astc.rename[self.value] = new_name
+            astc.set_rename(self.value, new_name)
             self.value = new_name
-            astc.declared.add(self.value)
-        astc.types[self.value] = self.v_type
+            astc.declare(self.value)
+        astc.set_type(self.value, self.v_type)
         return True
 
     def gencode(self, icc):
         pass
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, type_to_string(self.v_type))
+        name = self.graph_name(counter, type_to_string(self.v_type))
         graph.add_node(name, fillcolor=ASTDeclareVariable.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -907,6 +1227,7 @@ class ASTDeclareVariable(ASTNode):
 
 class ASTDoWhile(ASTNode):
     COLOR = NODE_COLORS['ASTDoWhile']
+    __slots__ = ('do_part', 'while_part')
 
     def __init__(self, p, do_part, while_part):
         """AST if statements
@@ -917,37 +1238,31 @@ class ASTDoWhile(ASTNode):
         while_part - condition while the loop runs
 
         """
-        self.p = p
+        super(ASTDoWhile, self).__init__(p)
         self.do_part = do_part
         self.while_part = while_part
 
     def wellformed(self, astc):
         # Can do part variables be used in while part?
         # This assumes so
-        stmt_astc = astc.clone()
-        if not self.do_part.wellformed(stmt_astc):
+        astc.enter_scope()
+        if not self.do_part.wellformed(astc):
             return False
-        if not self.while_part.wellformed(stmt_astc):
+        if not self.while_part.wellformed(astc):
             return False
+        astc.counter = astc.exit_scope().counter
         if self.while_part.type(astc) != ('bool', 0):
-            print 'while part is not a bool!'
+            astc.error('while part is not a bool!', node=self.while_part)
             return False
-        astc.counter = stmt_astc.counter
         return True
 
     def gencode(self, icc):
         # Build up do part
         do_part_block = icc.new_block()
-        do_part_stack = self.do_part.to_stack()
-        while len(do_part_stack) != 0:
-            s = do_part_stack.pop()
-            s.gencode(icc)
+        yield [self.do_part]
         # Build up while_part
         while_part_block = icc.new_block()
-        while_part_stack = self.while_part.to_stack()
-        while len(while_part_stack) != 0:
-            s = while_part_stack.pop()
-            s.gencode(icc)
+        yield [self.while_part]
         # The AE was just parsed and stored here
         while_var = icc.pop_var()
         # Next block after while loop
@@ -959,12 +1274,8 @@ class ASTDoWhile(ASTNode):
                             while_part_block, next_block),
                             while_part_block)
 
-    def to_stack(self):
-        # Self will handle other statements
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'do...while')
+        name = self.graph_name(counter, 'do...while')
         graph.add_node(name, fillcolor=ASTDoWhile.COLOR)
         graph.add_edge(parent, name)
         counter = self.do_part.add_edges_to_graph(graph, name, counter + 1)
@@ -977,36 +1288,29 @@ class ASTDoWhile(ASTNode):
 
 class ASTEndBlock(ASTNode):
     COLOR = NODE_COLORS['ASTEndBlock']
+    __slots__ = ()
 
     def __init__(self, p):
         """End of a Block
-        Restores ASTC
+        Leaves the scope of the block
 
         Arguments:
         p - pyl object
         """
-        self.p = p
+        super(ASTEndBlock, self).__init__(p)
 
     def wellformed(self, astc):
-        previous = astc.previous
-        previous.returns = astc.returns
-        for x in astc.defined:
-            if x in previous.declared:
-                previous.defined.add(x)
-        astc.defined = previous.defined
-        astc.declared = previous.declared
-        astc.used = previous.used
-        astc.rename = previous.rename
-        astc.counter = previous.counter
-        astc.previous = previous.previous
+        scope = astc.exit_scope()
+        astc.returns = scope.returns
+        # Variables of outer scopes stay defined
+        for x in scope.defined:
+            if x in astc.declared:
+                astc.define(x)
         return True
 
     def gencode(self, icc):
         pass
 
-    def to_stack(self):
-        return []
-
     def add_edges_to_graph(self, graph, parent, counter):
         return counter
 
@@ -1016,14 +1320,15 @@ class ASTEndBlock(ASTNode):
 
 class ASTFieldAccess(ASTNode):
     COLOR = NODE_COLORS['ASTFieldAccess']
+    __slots__ = ('value', 'field', 'offset')
 
     def __init__(self, p, value, field):
-        self.p = p
+        super(ASTFieldAccess, self).__init__(p)
         self.value = value
         self.field = field
         self.offset = 0
 
-    def type(self, astc):
+    def compute_type(self, astc):
         value_type, dimensions = self.value.type(astc)
         return astc.classes[value_type]['types'][self.field]
 
@@ -1032,15 +1337,18 @@ class ASTFieldAccess(ASTNode):
             return False
         value_type, dimensions = self.value.type(astc)
         if dimensions > 0:
-            print 'Filed access for arrays not allowed!'
+            astc.error('Filed access for arrays not allowed!', node=self.value)
             return False
         if value_type not in astc.classes:
-            print '%s is not a class type' % (value_type)
+            astc.error('%s is not a class type' % (value_type),
+                       node=self.value)
             return False
         if self.field not in astc.classes[value_type]['types']:
-            print 'Field %s not in class: %s' % (self.field, value_type)
+            astc.error('Field %s not in class: %s' % (self.field, value_type),
+                       node=self)
             return False
         self.offset = astc.classes[value_type]['positions'][self.field]
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
@@ -1048,14 +1356,13 @@ class ASTFieldAccess(ASTNode):
         val = icc.new_var()
         icc.add_instruction(ICLoadWord(val, base, Integer(0), Integer(self.offset)))
         icc.push_var(val)
-        val._base = base
-        val._elem = Integer(self.offset)
+        icc.element_addresses[val] = (base, Integer(self.offset))
 
-    def to_stack(self):
-        return [self] + self.value.to_stack()
+    def children(self):
+        return [self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s.%s" % (counter, self.value, self.field)
+        name = self.graph_name(counter, "%s.%s" % (self.value, self.field))
         graph.add_node(name, fillcolor=ASTFieldAccess.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -1063,6 +1370,7 @@ class ASTFieldAccess(ASTNode):
 
 class ASTFor(ASTNode):
     COLOR = NODE_COLORS['ASTFor']
+    __slots__ = ('init_part', 'cond_part', 'incr_part', 'stmt_part')
 
     def __init__(self, p, init_part, cond_part, incr_part, stmt_part):
         """AST if statements
@@ -1075,7 +1383,7 @@ class ASTFor(ASTNode):
         stmt_part - statement in for loop
 
         """
-        self.p = p
+        super(ASTFor, self).__init__(p)
         self.init_part = init_part
         self.cond_part = cond_part
         self.incr_part = incr_part
@@ -1087,7 +1395,8 @@ class ASTFor(ASTNode):
         if not self.cond_part.wellformed(astc):
             return False
         if self.cond_part.type(astc) != ('bool', 0):
-            print 'condition of for loop is not bool!'
+            astc.error('condition of for loop is not bool!',
+                       node=self.cond_part)
             return False
         if not self.incr_part.wellformed(astc):
             return False
@@ -1098,24 +1407,15 @@ class ASTFor(ASTNode):
     def gencode(self, icc):
         # Build up while_part
         cond_part_block = icc.new_block()
-        cond_part_stack = self.cond_part.to_stack()
-        while len(cond_part_stack) != 0:
-            s = cond_part_stack.pop()
-            s.gencode(icc)
+        yield [self.cond_part]
         # The AE was just parsed and stored here
         cond_var = icc.pop_var()
         # cond_part --> stmt_part
         stmt_part_block = icc.new_block()
-        stmt_part_stack = self.stmt_part.to_stack()
-        while len(stmt_part_stack) != 0:
-            s = stmt_part_stack.pop()
-            s.gencode(icc)
+        yield [self.stmt_part]
         # stmt_part --> incr_part
         incr_part_block = icc.new_block()
-        incr_part_stack = self.incr_part.to_stack()
-        while len(incr_part_stack) != 0:
-            s = incr_part_stack.pop()
-            s.gencode(icc)
+        yield [self.incr_part]
         # Block at the end of the stmt part
         # Might be different from incr_part, if other blocks added
         # Need this to tell this block to jump back to the cond_part
@@ -1131,12 +1431,12 @@ class ASTFor(ASTNode):
         icc.add_instruction(ICFor(cond_var, cond_part_block, end_for_block,
                             next_block), cond_part_block)
 
-    def to_stack(self):
+    def children(self):
         # Self will handle other statements
-        return [self] + self.init_part.to_stack()
+        return [self.init_part]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'for...')
+        name = self.graph_name(counter, 'for...')
         graph.add_node(name, fillcolor=ASTFor.COLOR)
         graph.add_edge(parent, name)
         counter = self.init_part.add_edges_to_graph(graph, name, counter + 1)
@@ -1152,6 +1452,7 @@ class ASTFor(ASTNode):
 
 class ASTFunctionCall(ASTNode):
     COLOR = NODE_COLORS['ASTFunctionCall']
+    __slots__ = ('name', 'arguments', 'cl')
 
     def __init__(self, p, name, arguments, cl=None):
         """AST function call
@@ -1162,12 +1463,12 @@ class ASTFunctionCall(ASTNode):
         arguments - list of arguments to pass
 
         """
-        self.p = p
+        super(ASTFunctionCall, self).__init__(p)
         self.name = name
         self.arguments = arguments
         self.cl = cl
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return astc.types[self.name]
 
     def wellformed(self, astc):
@@ -1176,47 +1477,45 @@ class ASTFunctionCall(ASTNode):
 
             f = astc.lookup_function(self.cl.type(astc)[0], self.name, self.arguments)
             if not f:
-                print "Missing function: %s.%s" % (self.cl.value, self.name)
+                astc.error("Missing function: %s.%s" % (self.cl.value, self.name),
+                           node=self)
                 return False
             else:
                 self.name = f
         else:
             if self.name not in astc.functions:
-                print "Missing function: %s" % self.name
+                astc.error("Missing function: %s" % self.name, node=self)
                 return False
 
         if len(self.arguments) != len(astc.functions[self.name]):
-            print 'Argument number does not match for calling %s' % self.name
+            astc.error('Argument number does not match for calling %s' % self.name,
+                       node=self)
             return False
         for i, (arg, formal) in enumerate(zip(self.arguments, astc.functions[self.name])):
             if not arg.wellformed(astc):
-                print 'Argument %s of function call to %s not well formed' % (i, self.name)
+                astc.error('Argument %s of function call to %s not well formed' % (i, self.name),
+                           node=arg)
                 return False
 
             if not astc.classes_castable(formal, arg):
-                print 'Argument %s of function call to %s does not match' % (i, self.name)
+                astc.error('Argument %s of function call to %s does not match' % (i, self.name),
+                           node=arg)
                 return False
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
         variable = icc.new_var()
-        argument_stack = []
-        for arg in self.arguments:
-            argument_stack = argument_stack + arg.to_stack()
-        while len(argument_stack) != 0:
-            s = argument_stack.pop()
-            s.gencode(icc)
+        # Last argument first, so the first one is on top of the stack
+        yield self.arguments[::-1]
         for i, arg in enumerate(self.arguments):
             icc.add_instruction(ICFunctionArgumentSave(icc.pop_var(), i))
 
         icc.push_var(variable)
         icc.add_instruction(ICFunctionCall(variable, self.name, self.arguments))
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'call %s' % self.name)
+        name = self.graph_name(counter, 'call %s' % self.name)
         graph.add_node(name, fillcolor=ASTFunctionCall.COLOR)
         graph.add_edge(parent, name)
         for a in self.arguments:
@@ -1229,6 +1528,7 @@ class ASTFunctionCall(ASTNode):
 
 class ASTFunctionDeclare(ASTNode):
     COLOR = NODE_COLORS['ASTFunctionDeclare']
+    __slots__ = ('f_type', 'name', 'formals', 'body')
 
     def __init__(self, p, f_type, name, formals, statement):
         """AST function declaration
@@ -1241,13 +1541,13 @@ class ASTFunctionDeclare(ASTNode):
         statement - function body
 
         """
-        self.p = p
+        super(ASTFunctionDeclare, self).__init__(p)
         self.f_type = f_type
         self.name = name
         self.formals = formals
         self.body = statement
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return self.f_type
 
     def wellformed(self, astc):
@@ -1259,52 +1559,42 @@ class ASTFunctionDeclare(ASTNode):
         #     astc.rename[self.name] = new_name
         #     self.name = new_name
         #     astc.declared.add(self.name)
-        astc.types[self.name] = self.f_type
-        rest_astc = astc.clone()
+        astc.set_type(self.name, self.f_type)
+        astc.enter_scope()
         # print self.formals
         for f in self.formals:
-            if not f.wellformed(rest_astc):
+            if not f.wellformed(astc):
                 return False
             # All will be defined
-            rest_astc.defined.add(f.value)
+            astc.define(f.value)
         # astc.functions[self.name] = self.formals
-        # rest_astc.functions[self.name] = self.formals
-        rest_astc.returns = False
-        if not self.body.wellformed(rest_astc):
+        astc.returns = False
+        if not self.body.wellformed(astc):
             return False
-        if not rest_astc.returns:
-            print "%s lacks an all-control flow return!" % self.name
+        if not astc.exit_scope().returns:
+            astc.error("%s lacks an all-control flow return!" % self.name,
+                       node=self)
             return False
         astc.returns = False
         astc.current_function = None
         return True
 
     def gencode(self, icc):
+        icc.set_function(self.name)
         function_block = icc.new_block(auto_follow=False)
         # Start function declaration
         icc.add_instruction(ICFunctionDeclare(self.name, function_block))
         # Declare variables
-        formal_stack = []
-        for f in self.formals:
-            formal_stack = formal_stack + f.to_stack()
-        while len(formal_stack) != 0:
-            s = formal_stack.pop()
-            s.gencode(icc)
+        yield self.formals[::-1]
         for i, arg in enumerate(self.formals):
             variable = Variable(arg.value)
             icc.add_instruction(ICFunctionArgumentLoad(variable, i))
 
-        body_stack = self.body.to_stack()
-        while len(body_stack) != 0:
-            s = body_stack.pop()
-            s.gencode(icc)
+        yield [self.body]
         body_end_block = icc.new_block()
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'fun %s' % self.name)
+        name = self.graph_name(counter, 'fun %s' % self.name)
         graph.add_node(name, fillcolor=ASTFunctionDeclare.COLOR)
         graph.add_edge(parent, name)
         for f in self.formals:
@@ -1317,6 +1607,7 @@ class ASTFunctionDeclare(ASTNode):
 
 class ASTFunctionReturn(ASTNode):
     COLOR = NODE_COLORS['ASTFunctionReturn']
+    __slots__ = ('value',)
 
     def __init__(self, p, value):
         """AST return from function
@@ -1326,17 +1617,18 @@ class ASTFunctionReturn(ASTNode):
         value - value to return (can be None)
 
         """
-        self.p = p
+        super(ASTFunctionReturn, self).__init__(p)
         self.value = value
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return self.value.type(astc)
 
     def wellformed(self, astc):
         if not self.value.wellformed(astc):
             return False
         if self.type(astc) != astc.types[astc.current_function]:
-            print 'Return type mismtch in function %s' % (astc.current_function)
+            astc.error('Return type mismtch in function %s' % (astc.current_function),
+                       node=self.value)
             return False
         astc.returns = True
         return True
@@ -1348,11 +1640,11 @@ class ASTFunctionReturn(ASTNode):
             icc.add_instruction(ICFunctionReturn(icc.pop_var()))
         # icc.new_block()
 
-    def to_stack(self):
-        return [self] + self.value.to_stack()
+    def children(self):
+        return [self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'return')
+        name = self.graph_name(counter, 'return')
         graph.add_node(name, fillcolor=ASTFunctionReturn.COLOR)
         graph.add_edge(parent, name)
         return self.value.add_edges_to_graph(graph, name, counter + 1)
@@ -1363,6 +1655,7 @@ class ASTFunctionReturn(ASTNode):
 
 class ASTIf(ASTNode):
     COLOR = NODE_COLORS['ASTIf']
+    __slots__ = ('if_part', 'then_part', 'else_part')
 
     def __init__(self, p, if_part, then_part, else_part=None):
         """AST if statements
@@ -1376,7 +1669,7 @@ class ASTIf(ASTNode):
         else_part - optional else statement for if then
 
         """
-        self.p = p
+        super(ASTIf, self).__init__(p)
         self.if_part = if_part
         self.then_part = then_part
         self.else_part = else_part
@@ -1385,28 +1678,30 @@ class ASTIf(ASTNode):
         if not self.if_part.wellformed(astc):
             return False
         if self.if_part.type(astc) != ('bool', 0):
-            print 'if is not bool type!'
-            print self.if_part.type(astc)
-            print self.if_part
+            astc.error('if is not bool type!', node=self.if_part)
+            astc.note(str(self.if_part.type(astc)))
+            astc.note(str(self.if_part))
             return False
         # Then part can only check for usage, and not defined new variables
         # because its path is uncertain
-        then_astc = astc.clone()
-        if not self.then_part.wellformed(then_astc):
+        astc.enter_scope()
+        if not self.then_part.wellformed(astc):
             return False
-        astc.counter = then_astc.counter
-        # If we have an else part then also make an astc clone
+        then_scope = astc.exit_scope()
+        astc.counter = then_scope.counter
+        # If we have an else part then also give it a scope
         if self.else_part is not None:
-            else_astc = astc.clone()
-            if not self.else_part.wellformed(else_astc):
+            astc.enter_scope()
+            if not self.else_part.wellformed(astc):
                 return False
-            astc.counter = else_astc.counter
+            else_scope = astc.exit_scope()
+            astc.counter = else_scope.counter
             # Add only those which are defined in *both* paths
-            for x in then_astc.defined.intersection(else_astc.defined):
+            for x in then_scope.defined.intersection(else_scope.defined):
                 # And make sure they weren't redefined
-                if x not in then_astc.rename and x not in else_astc.rename:
-                    astc.defined.add(x)
-            astc.returns = then_astc.returns and else_astc.returns
+                if x not in astc.rename:
+                    astc.define(x)
+            astc.returns = then_scope.returns and else_scope.returns
             # for x in then_astc.declared.intersection(else_astc.declared):
             #     astc.declared.add(x)
         return True
@@ -1416,14 +1711,11 @@ class ASTIf(ASTNode):
         if_var = icc.pop_var()
         # Store reference to current block
         current_block = icc.get_current_block()
-        # then_part -> to_stack, make extra block, after then_part finishes
+        # then_part -> gencode, make extra block, after then_part finishes
         # get next block which will be the follow
         # current_block --> then_block
         then_block = icc.new_block()
-        then_stack = self.then_part.to_stack()
-        while len(then_stack) != 0:
-            s = then_stack.pop()
-            s.gencode(icc)
+        yield [self.then_part]
         if self.else_part is None:
             # No else block, so make a new block for ending of if
             else_block = None
@@ -1446,10 +1738,7 @@ class ASTIf(ASTNode):
                 then_block = icc.get_current_block()
             # then_block !-> else_block
             else_block = icc.new_block(auto_follow=False)
-            else_stack = self.else_part.to_stack()
-            while len(else_stack) != 0:
-                s = else_stack.pop()
-                s.gencode(icc)
+            yield [self.else_part]
             # else_block --> end_if_block
             end_if_block = icc.new_block()
             # then_block --> end_if_block
@@ -1461,13 +1750,13 @@ class ASTIf(ASTNode):
         icc.add_instruction(ICIf(if_var, then_block, else_block, end_if_block),
                             current_block)
 
-    def to_stack(self):
+    def children(self):
         # Let the if part happen before, so we can get the final result
         # Self will then make the recursive blocks
-        return [self] + self.if_part.to_stack()
+        return [self.if_part]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'if then%s' % (
+        name = self.graph_name(counter, 'if then%s' % (
             '' if self.else_part is None else ' else'))
         graph.add_node(name, fillcolor=ASTIf.COLOR)
         graph.add_edge(parent, name)
@@ -1484,6 +1773,7 @@ class ASTIf(ASTNode):
 
 class ASTInput(ASTNode):
     COLOR = NODE_COLORS['ASTInput']
+    __slots__ = ()
 
     def __init__(self, p):
         """AST input
@@ -1492,9 +1782,9 @@ class ASTInput(ASTNode):
         p - pyl parser object
 
         """
-        self.p = p
+        super(ASTInput, self).__init__(p)
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return ('int', 0)
 
     def wellformed(self, astc):
@@ -1505,11 +1795,8 @@ class ASTInput(ASTNode):
         icc.add_instruction(ICInput(var))
         icc.push_var(var)
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'input')
+        name = self.graph_name(counter, 'input')
         graph.add_node(name, fillcolor=ASTInput.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -1520,6 +1807,7 @@ class ASTInput(ASTNode):
 
 class ASTInteger(ASTNode):
     COLOR = NODE_COLORS['ASTInteger']
+    __slots__ = ('value',)
 
     def __init__(self, p, value):
         """AST integer
@@ -1529,28 +1817,27 @@ class ASTInteger(ASTNode):
         value - python integer value
 
         """
-        self.p = p
+        super(ASTInteger, self).__init__(p)
         self.value = value
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return ('int', 0)
 
     def wellformed(self, astc):
         if isinstance(self.value, int) and \
            (-(2 ** 31) <= self.value <= (2 ** 31 - 1)):
+            self.annotate(astc)
             return True
         else:
-            raise ValueError('%s is out of bounds for 32 bit integer value' % (
-                self.value))
+            astc.error('%s is out of bounds for 32 bit integer value' % (
+                self.value), node=self)
+            return False
 
     def gencode(self, icc):
         icc.push_var(Integer(self.value))
 
-    def to_stack(self):
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.value)
+        name = self.graph_name(counter, self.value)
         graph.add_node(name, fillcolor=ASTInteger.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -1561,6 +1848,7 @@ class ASTInteger(ASTNode):
 
 class ASTNoOp(ASTNode):
     COLOR = NODE_COLORS['ASTNoOp']
+    __slots__ = ()
 
     def __init__(self, p):
         """AST NoOp - dosnt generate anything
@@ -1569,9 +1857,9 @@ class ASTNoOp(ASTNode):
         p - pyl parser object
 
         """
-        self.p = p
+        super(ASTNoOp, self).__init__(p)
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return ('void', 0)
 
     def wellformed(self, astc):
@@ -1580,11 +1868,8 @@ class ASTNoOp(ASTNode):
     def gencode(self, icc):
         pass
 
-    def to_stack(self):
-        return []
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'NOOP')
+        name = self.graph_name(counter, 'NOOP')
         graph.add_node(name, fillcolor=ASTStatement.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -1595,6 +1880,7 @@ class ASTNoOp(ASTNode):
 
 class ASTPrePostIncrement(ASTNode):
     COLOR = NODE_COLORS['ASTPrePostIncrement']
+    __slots__ = ('value', 'ptype', 'direction')
     PRE = 0
     POST = 1
 
@@ -1609,7 +1895,7 @@ class ASTPrePostIncrement(ASTNode):
         direction - 0 = pre (++i);
                     1 = post (i++);
         """
-        self.p = p
+        super(ASTPrePostIncrement, self).__init__(p)
         self.value = value
         self.ptype = mytype[0]
         self.direction = direction
@@ -1619,15 +1905,16 @@ class ASTPrePostIncrement(ASTNode):
         if self.direction not in (self.PRE, self.POST):
             raise TypeError('Increment operation: %s not supported' % self.ptype)
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return ('int', 0)
 
     def wellformed(self, astc):
         if not self.value.wellformed(astc):
             return False
         if self.value.type(astc) != ('int', 0):
-            print '++/-- on non integer!'
+            astc.error('++/-- on non integer!', node=self.value)
             return False
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
@@ -1637,18 +1924,19 @@ class ASTPrePostIncrement(ASTNode):
         icc.add_instruction(ICAssign(new_var, orig_var))
         icc.add_instruction(ICBinaryOp(orig_var, orig_var, Integer(1), self.ptype))
         if isinstance(self.value, ASTArray):
-            icc.add_instruction(ICStoreWord(orig_var, orig_var._base, Integer(0), orig_var._elem))
+            base, elem = icc.element_addresses[orig_var]
+            icc.add_instruction(ICStoreWord(orig_var, base, Integer(0), elem))
 
         if self.direction == self.PRE:
             icc.add_instruction(ICBinaryOp(new_var, new_var, Integer(1), self.ptype))
 
         icc.push_var(new_var)
 
-    def to_stack(self):
-        return [self] + self.value.to_stack()
+    def children(self):
+        return [self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.ptype)
+        name = self.graph_name(counter, self.ptype)
         graph.add_node(name, fillcolor=ASTUnaryOp.COLOR)
         graph.add_edge(parent, name)
         return self.value.add_edges_to_graph(graph, name, counter + 1)
@@ -1662,6 +1950,7 @@ class ASTPrePostIncrement(ASTNode):
 
 class ASTPrint(ASTNode):
     COLOR = NODE_COLORS['ASTPrint']
+    __slots__ = ('value',)
 
     def __init__(self, p, value):
         """AST print statement
@@ -1671,26 +1960,27 @@ class ASTPrint(ASTNode):
         value - stuff to print
 
         """
-        self.p = p
+        super(ASTPrint, self).__init__(p)
         self.value = value
 
     def wellformed(self, astc):
         if not self.value.wellformed(astc):
             return False
         if self.value.type(astc) != ('int', 0):
-            print self.value.type(astc)
-            print 'print statement does not have int type'
+            astc.error('print statement does not have int type',
+                       node=self.value)
+            astc.note(str(self.value.type(astc)))
             return False
         return True
 
     def gencode(self, icc):
         icc.add_instruction(ICPrint(icc.pop_var()))
 
-    def to_stack(self):
-        return [self] + self.value.to_stack()
+    def children(self):
+        return [self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'print')
+        name = self.graph_name(counter, 'print')
         graph.add_node(name, fillcolor=ASTPrint.COLOR)
         graph.add_edge(parent, name)
         return self.value.add_edges_to_graph(graph, name, counter + 1)
@@ -1701,6 +1991,7 @@ class ASTPrint(ASTNode):
 
 class ASTStatement(ASTNode):
     COLOR = NODE_COLORS['ASTStatement']
+    __slots__ = ('value',)
 
     def __init__(self, p, value):
         """AST statement
@@ -1710,23 +2001,24 @@ class ASTStatement(ASTNode):
         value - things this statement does
 
         """
-        self.p = p
+        super(ASTStatement, self).__init__(p)
         self.value = value
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return self.value.type(astc)
 
     def wellformed(self, astc):
         return self.value.wellformed(astc)
 
     def gencode(self, icc):
-        self.value.gencode(icc)
+        # The value is generated before, look @children
+        pass
 
-    def to_stack(self):
-        return self.value.to_stack()
+    def children(self):
+        return [self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'STMT')
+        name = self.graph_name(counter, 'STMT')
         graph.add_node(name, fillcolor=ASTStatement.COLOR)
         graph.add_edge(parent, name)
         return self.value.add_edges_to_graph(graph, name, counter + 1)
@@ -1737,6 +2029,7 @@ class ASTStatement(ASTNode):
 
 class ASTUnaryOp(ASTNode):
     COLOR = NODE_COLORS['ASTUnaryOp']
+    __slots__ = ('value', 'u_type')
     TYPES = set(['-', '!'])
 
     def __init__(self, p, value, type):
@@ -1749,13 +2042,13 @@ class ASTUnaryOp(ASTNode):
         type - one of ASTUnaryOp.TYPES
 
         """
-        self.p = p
+        super(ASTUnaryOp, self).__init__(p)
         self.value = value
         self.u_type = type
         if self.u_type not in ASTUnaryOp.TYPES:
             raise TypeError('Unary operation: %s not supported' % self.u_type)
 
-    def type(self, astc):
+    def compute_type(self, astc):
         if self.u_type == '-' and self.value.type(astc) == ('int', 0):
             return ('int', 0)
         elif self.u_type == '!' and self.value.type(astc) == ('bool', 0):
@@ -1766,8 +2059,8 @@ class ASTUnaryOp(ASTNode):
     def wellformed(self, astc):
         if not self.value.wellformed(astc):
             return False
-        if self.type(astc) is None:
-            print 'Invalid unrary types'
+        if self.annotate(astc) is None:
+            astc.error('Invalid unrary types', node=self)
             return False
         return True
 
@@ -1776,11 +2069,11 @@ class ASTUnaryOp(ASTNode):
         icc.add_instruction(ICUnaryOp(var, icc.pop_var(), self.u_type))
         icc.push_var(var)
 
-    def to_stack(self):
-        return [self] + self.value.to_stack()
+    def children(self):
+        return [self.value]
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.u_type)
+        name = self.graph_name(counter, self.u_type)
         graph.add_node(name, fillcolor=ASTUnaryOp.COLOR)
         graph.add_edge(parent, name)
         return self.value.add_edges_to_graph(graph, name, counter + 1)
@@ -1791,6 +2084,7 @@ class ASTUnaryOp(ASTNode):
 
 class ASTVariable(ASTNode):
     COLOR = NODE_COLORS['ASTVariable']
+    __slots__ = ('value', 'dimensions')
 
     def __init__(self, p, value, dimensions=0):
         """AST variable
@@ -1800,26 +2094,29 @@ class ASTVariable(ASTNode):
         value - name of variable
 
         """
-        self.p = p
+        super(ASTVariable, self).__init__(p)
         self.value = value
         self.dimensions = dimensions
 
-    def type(self, astc):
+    def compute_type(self, astc):
         return astc.types[self.value]
 
     def wellformed(self, astc):
         if self.value in astc.rename:
             self.value = astc.rename[self.value]
         if self.value in astc.declared and self.value not in astc.defined:
-            print '%s declared but used before definition!' % (self.value)
+            astc.error('%s declared but used before definition!' % (self.value),
+                       node=self)
             return False
         elif self.value not in astc.declared:
-            print '%s not declared!' % (self.value)
+            astc.error('%s not declared!' % (self.value), node=self)
             return False
         elif self.value not in astc.defined:
-            print '%s declared but not defined!' % (self.value)
+            astc.error('%s declared but not defined!' % (self.value),
+                       node=self)
             return False
-        astc.used.add(self.value)
+        astc.use(self.value)
+        self.annotate(astc)
         return True
 
     def gencode(self, icc):
@@ -1828,11 +2125,11 @@ class ASTVariable(ASTNode):
             icc.add_instruction(ICLoadGlobal(Variable(self.value)))
         icc.push_var(Variable(self.value))
 
-    def to_stack(self):
-        return [self] + ( self.value.to_stack() if isinstance(self.value, ASTArray) else [])
+    def children(self):
+        return [self.value] if isinstance(self.value, ASTArray) else []
 
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, self.value)
+        name = self.graph_name(counter, self.value)
         graph.add_node(name, fillcolor=ASTVariable.COLOR)
         graph.add_edge(parent, name)
         return counter
@@ -1843,6 +2140,7 @@ class ASTVariable(ASTNode):
 
 class ASTWhileDo(ASTNode):
     COLOR = NODE_COLORS['ASTWhileDo']
+    __slots__ = ('while_part', 'do_part')
 
     def __init__(self, p, while_part, do_part):
         """AST if statements
@@ -1853,7 +2151,7 @@ class ASTWhileDo(ASTNode):
         do_part - do_part to execute in while loop
 
         """
-        self.p = p
+        super(ASTWhileDo, self).__init__(p)
         self.while_part = while_part
         self.do_part = do_part
 
@@ -1862,31 +2160,26 @@ class ASTWhileDo(ASTNode):
         # because its path is uncertain
         if not self.while_part.wellformed(astc):
             return False
-        stmt_astc = astc.clone()
-        if not self.do_part.wellformed(stmt_astc):
+        astc.enter_scope()
+        if not self.do_part.wellformed(astc):
             return False
-        astc.counter = stmt_astc.counter
+        astc.counter = astc.exit_scope().counter
         if self.while_part.type(astc) != ('bool', 0):
             # print self.while_part.type(astc)
-            print 'While part of while do is not bool!'
+            astc.error('While part of while do is not bool!',
+                       node=self.while_part)
             return False
         return True
 
     def gencode(self, icc):
         # Build up while_part
         while_part_block = icc.new_block()
-        while_part_stack = self.while_part.to_stack()
-        while len(while_part_stack) != 0:
-            s = while_part_stack.pop()
-            s.gencode(icc)
+        yield [self.while_part]
         # The AE was just parsed and stored here
         while_var = icc.pop_var()
         # while_part --> do_part
         do_part_block = icc.new_block()
-        do_part_stack = self.do_part.to_stack()
-        while len(do_part_stack) != 0:
-            s = do_part_stack.pop()
-            s.gencode(icc)
+        yield [self.do_part]
         # Block at the end of the then statement
         # Might be different from do_part, if other blocks added
         # Need this to tell this block to jump back to the while_part_block
@@ -1896,18 +2189,14 @@ class ASTWhileDo(ASTNode):
         next_block = icc.new_block(auto_follow=False)
         # while_part --> next_block
         while_part_block.add_follow(next_block)
-        # do_part --> while_part (loop back)
-        do_part_block.add_follow(while_part_block)
+        # end of do_part --> while_part (loop back)
+        end_if_block.add_follow(while_part_block)
         # Add to original block
         icc.add_instruction(ICWhileDo(while_var, while_part_block,
                             end_if_block, next_block), while_part_block)
 
-    def to_stack(self):
-        # Self will handle other statements
-        return [self]
-
     def add_edges_to_graph(self, graph, parent, counter):
-        name = "%s\n%s" % (counter, 'while...do')
+        name = self.graph_name(counter, 'while...do')
         graph.add_node(name, fillcolor=ASTWhileDo.COLOR)
         graph.add_edge(parent, name)
         counter = self.while_part.add_edges_to_graph(graph, name, counter + 1)
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import sys
+import tempfile
+import types
+
+import ParallelBackend
+from TableCache import module_source
+
+_compiler_hash = None
+
+
+def compiler_modules():
+    """Return the modules whose code determines the generated assembly:
+    Compiler, and every module of the compiler directory it imports,
+    directly or through other modules
+
+    Return:
+    list of modules, by name
+
+    """
+    import Compiler
+    directory = os.path.dirname(os.path.abspath(__file__))
+    modules = {}
+    stack = [Compiler]
+    while len(stack) != 0:
+        module = stack.pop()
+        if module.__name__ in modules:
+            continue
+        modules[module.__name__] = module
+        # Imported modules, and the modules of imported classes and
+        # functions
+        for value in vars(module).values():
+            if not isinstance(value, types.ModuleType):
+                value = sys.modules.get(getattr(value, '__module__', None))
+            path = getattr(value, '__file__', None)
+            if path is not None and \
+               os.path.dirname(os.path.abspath(path)) == directory:
+                stack.append(value)
+    return [modules[name] for name in sorted(modules)]
+
+
+def compiler_hash():
+    """Hash the source code of the compiler, so that a changed compiler
+    never reuses assembly generated by an older one
+
+    Return:
+    hex digest string
+
+    """
+    global _compiler_hash
+    if _compiler_hash is None:
+        h = hashlib.sha1()
+        for module in compiler_modules():
+            h.update('%s\n' % module.__name__)
+            h.update(module_source(module))
+        _compiler_hash = h.hexdigest()
+    return _compiler_hash
+
+
+class CompileCache(object):
+
+    def __init__(self, cache_dir, flags):
+        """On disk cache of compiled programs, and of the assembly of each of
+        their functions. Entries are content addressed: named by a hash of
+        the compiler, its flags, and the program source or function code
+
+        Arguments:
+        cache_dir - directory of cached assembly
+        flags - list of strings of compiler flags that change the assembly
+
+        """
+        self.cache_dir = cache_dir
+        self.salt = '%s %s\n' % (compiler_hash(), ' '.join(sorted(flags)))
+        self.function_hits = 0
+        self.function_misses = 0
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # Somebody else might have just made it
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def path(self, kind, data):
+        """Return the file name of a cache entry
+
+        Arguments:
+        kind - 'program' or 'function'
+        data - program source or function fingerprint
+
+        """
+        h = hashlib.sha1()
+        h.update(self.salt)
+        h.update('%s\n' % kind)
+        h.update(data)
+        return os.path.join(self.cache_dir, '%s_%s.asm' % (kind, h.hexdigest()))
+
+    def get(self, kind, data):
+        """Look up a cache entry
+
+        Arguments:
+        kind - 'program' or 'function'
+        data - program source or function fingerprint
+
+        Return:
+        cached assembly string, or None if missing
+
+        """
+        try:
+            return open(self.path(kind, data), 'r').read()
+        except IOError:
+            return None
+
+    def put(self, kind, data, text):
+        """Save a cache entry
+
+        Arguments:
+        kind - 'program' or 'function'
+        data - program source or function fingerprint
+        text - assembly string
+
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            os.write(fd, text)
+        finally:
+            os.close(fd)
+        # Rename is atomic, so concurrent compiles never see a partial file
+        os.rename(tmp_path, self.path(kind, data))
+
+    def get_program(self, source):
+        """Return the cached assembly file of a program source, or None
+
+        """
+        return self.get('program', source)
+
+    def put_program(self, source, text):
+        """Save the assembly file of a program source
+
+        """
+        self.put('program', source, text)
+
+    def gencode(self, icc, ssa=False, jobs=1):
+        """Registerize and generate the assembly of a program, reusing the
+        cached assembly of every function whose code has not changed since
+        it was last compiled
+
+        Arguments:
+        icc - ICContext of the program
+
+        Keyword Arguments:
+        ssa - look @ICContext.registerize
+        jobs - look @ParallelBackend.gencode_functions
+
+        Return:
+        list of assembly lines
+
+        """
+        functions = icc.functions()
+        # Fingerprint before registerize changes the code
+        fingerprints = [icc.fingerprint(name, blocks)
+                        for name, blocks in functions]
+        cached = [self.get('function', f) for f in fingerprints]
+        texts = iter(ParallelBackend.gencode_functions(
+            icc, [f for f, text in zip(functions, cached) if text is None],
+            ssa=ssa, jobs=jobs))
+        asm = []
+        for (name, blocks), fingerprint, text in zip(functions, fingerprints,
+                                                     cached):
+            if text is None:
+                text = next(texts)
+                self.put('function', fingerprint, text)
+                self.function_misses += 1
+            else:
+                self.function_hits += 1
+            asm.extend(text.splitlines())
+        return asm
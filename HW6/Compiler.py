@@ -0,0 +1,349 @@
+import IRText
+import ParallelBackend
+import TableCache
+from AbstractSyntaxTree import count_nodes
+from ASMCode import asm_to_string, write_asm
+from CompileCache import CompileCache
+from Diagnostics import Diagnostics
+from IntermediateCode import ICContext
+from PassManager import DEFAULT_LEVEL, PassManager
+from proto5lexer import tokenize, token_function
+from Timings import Timings
+
+# Lexer and parser of this process, by table cache directory
+_frontends = {}
+
+
+class CompileOptions(object):
+
+    def __init__(self, nossa=False, cache=None, tablecache=None,
+                 timings=False, backend_jobs=1, graphs=False, stream=False,
+                 emit_ir=None, opt_level=DEFAULT_LEVEL, enable_passes=(),
+                 disable_passes=(), pass_order=None):
+        """Options of compile_source. Any object with these attributes can
+        be used instead, such as the parsed command line arguments
+
+        Keyword Arguments:
+        nossa - do NOT use SSA
+        cache - directory of the compile cache (None to disable)
+        tablecache - directory of the lexer and parser table cache
+        timings - also count the counters which cost extra time to collect
+        backend_jobs - number of worker processes which registerize and
+            generate the assembly of functions (1 to do it in process)
+        graphs - keep the interference graph of every function in
+            ICContext.all_graphs
+        stream - generate code, registerize and write out the assembly of
+            one function at a time, and drop its code before the next one,
+            so memory is bounded by the largest function (look
+            @stream_backend). Not with cache, backend_jobs or graphs
+        emit_ir - phase (one of IRText.PHASES) after which to write the
+            intermediate code to CompileResult.ir. Compiles in process,
+            without the cache or stream
+        opt_level - optimization level (look @PassManager)
+        enable_passes - names of passes to run above their level
+        disable_passes - names of passes not to run
+        pass_order - names of the passes to run, in order, instead of the
+            passes of the level
+
+        """
+        self.nossa = nossa
+        self.cache = cache
+        self.tablecache = tablecache
+        self.timings = timings
+        self.backend_jobs = backend_jobs
+        self.graphs = graphs
+        self.stream = stream
+        self.emit_ir = emit_ir
+        self.opt_level = opt_level
+        self.enable_passes = enable_passes
+        self.disable_passes = disable_passes
+        self.pass_order = pass_order
+
+
+class CompileResult(object):
+
+    def __init__(self, diagnostics):
+        """Output of compile_source
+
+        Arguments:
+        diagnostics - Diagnostics of the compile
+
+        """
+        # Assembly string ('' if written to out), or None on errors
+        self.asm = None
+        self.diagnostics = diagnostics
+        # Time of each phase and counters, look @Timings
+        self.timings = Timings()
+        # ASTProgram and ICContext (None if not reached, or cached)
+        self.program = None
+        self.icc = None
+        # Intermediate code text, with the emit_ir option, look @IRText
+        self.ir = None
+
+    @property
+    def ok(self):
+        return self.asm is not None
+
+
+def load_frontend(tablecache=None):
+    """Return the (lexer, parser) of this process, building them once
+
+    Keyword Arguments:
+    tablecache - directory of cached tables, look @TableCache.load
+
+    """
+    if tablecache not in _frontends:
+        _frontends[tablecache] = TableCache.load(tablecache)
+    return _frontends[tablecache]
+
+
+def pass_manager(options):
+    """Return the PassManager of the pass options of CompileOptions
+
+    Raises:
+    ValueError for bad pass options, look @PassManager
+
+    """
+    return PassManager(getattr(options, 'opt_level', DEFAULT_LEVEL),
+                       getattr(options, 'enable_passes', ()),
+                       getattr(options, 'disable_passes', ()),
+                       getattr(options, 'pass_order', None))
+
+
+def record_code(timings, functions):
+    """Record the size of the intermediate code of a program
+
+    Arguments:
+    timings - Timings
+    functions - look @ICContext.functions
+
+    """
+    timings.record('functions', len(functions))
+    timings.record('basic_blocks', sum([len(b) for f, b in functions]))
+    timings.record('ic_instructions', sum([len(x.instructions) for f, b in
+                                           functions for x in b]))
+
+
+def output_asm(asm, icc, out):
+    """Make the text of an assembly program, or write it out as it is
+    generated
+
+    Arguments:
+    asm - iterable of AsmInstruction (or assembly line strings)
+    icc - ICContext of the program
+    out - file like object, or None
+
+    Return:
+    assembly string, or '' if written to out
+
+    """
+    if out is None:
+        return asm_to_string(asm, icc)
+    write_asm(out, asm, icc)
+    return ''
+
+
+def stream_backend(program, icc, ssa, timings):
+    """Generate the assembly of a program one function at a time: each
+    function is generated, registerized and turned into assembly before
+    the next one is generated, and its code is dropped once its assembly is
+    consumed
+
+    Arguments:
+    program - well formed ASTProgram
+    icc - ICContext to generate code in
+    ssa - look @ICContext.registerize
+    timings - Timings
+
+    Return:
+    iterator of AsmInstruction
+
+    """
+    functions = program.gencode_functions(icc)
+    while True:
+        with timings.phase('gencode'):
+            function = next(functions, None)
+        if function is None:
+            return
+        name, blocks = function
+        timings.count('functions')
+        timings.count('basic_blocks', len(blocks))
+        timings.count('ic_instructions',
+                      sum([len(b.instructions) for b in blocks]))
+        with timings.phase('registerize'):
+            icc.registerize(ssa=ssa, functions=[function])
+        for a in icc.gencode_function(name, blocks):
+            yield a
+
+
+def compile_source(text, options=None, filename='<string>', frontend=None,
+                   out=None):
+    """Compile a proto program to assembly, without printing or exiting.
+    Errors in the program are returned as diagnostics
+
+    Arguments:
+    text - program source string
+
+    Keyword Arguments:
+    options - CompileOptions (default: CompileOptions())
+    filename - name of the program in diagnostics
+    frontend - (lexer, parser) to use (default: look @load_frontend)
+    out - file like object to write the assembly to as it is generated,
+        instead of keeping it in CompileResult.asm. Not with the cache,
+        which needs the whole text. Nothing is written if the program has
+        errors
+
+    Return:
+    CompileResult
+
+    """
+    if options is None:
+        options = CompileOptions()
+    diagnostics = Diagnostics(filename, text)
+    result = CompileResult(diagnostics)
+    timings = result.timings
+    passes = pass_manager(options)
+    cache = None
+    emit_ir = getattr(options, 'emit_ir', None)
+    if options.cache is not None and emit_ir is None:
+        with timings.phase('cache'):
+            flags = ['passes=%s' % ','.join(passes.names())]
+            cache = CompileCache(options.cache,
+                                 flags + (['nossa'] if options.nossa else []))
+            result.asm = cache.get_program(text)
+        if result.asm is not None:
+            timings.record('cached_program', 1)
+            return result
+    if frontend is None:
+        frontend = load_frontend(options.tablecache)
+    lexer, parser = frontend
+    lexer.proto_classes = set()
+    lexer.proto_file = filename
+    lexer.proto_errors = 0
+    lexer.proto_diagnostics = diagnostics
+    # Line numbers are counted from 0
+    lexer.lineno = 0
+    # Tokenize the source once, and parse from the token list
+    with timings.phase('lex'):
+        tokens = tokenize(lexer, text)
+    timings.record('tokens', len(tokens))
+    parser.proto_errors = 0
+    # Parse program
+    try:
+        with timings.phase('parse'):
+            program = parser.parse(lexer=lexer,
+                                   tokenfunc=token_function(tokens))
+    except SyntaxError as e:
+        diagnostics.error(str(e))
+        return result
+    except:
+        # Exception probably because of errors
+        if parser.proto_errors > 0 or lexer.proto_errors > 0:
+            diagnostics.error('Could not continue parsing due to previous errors')
+            return result
+        else:  # Idk
+            raise
+    if parser.proto_errors > 0 or lexer.proto_errors > 0:
+        diagnostics.error('Could not continue parsing due to previous errors')
+        return result
+    result.program = program
+    if getattr(options, 'timings', False):
+        timings.record('ast_nodes', count_nodes(program))
+    with timings.phase('wellformed'):
+        wellformed = program.wellformed(diagnostics)
+    if not wellformed:
+        diagnostics.error('Program not well formed!')
+        return result
+    if getattr(options, 'stream', False) and emit_ir is None:
+        icc = ICContext(program.astc.globals)
+        icc.timings = timings
+        icc.passes = passes
+        result.icc = icc
+        with timings.phase('asm'):
+            asm = stream_backend(program, icc, not(options.nossa), timings)
+            result.asm = output_asm(asm, icc, out)
+        return result
+    # Generate three address code
+    with timings.phase('gencode'):
+        tac = program.gencode()
+    tac.timings = timings
+    tac.passes = passes
+    tac.keep_graphs = getattr(options, 'graphs', False)
+    result.icc = tac
+    functions = tac.functions()
+    record_code(timings, functions)
+    # Optimize, assign registers, and generate assembly
+    jobs = getattr(options, 'backend_jobs', 1)
+    if cache is None and jobs > 1 and emit_ir is None:
+        # Phases of the workers are only timed as a whole
+        with timings.phase('registerize'):
+            texts = ParallelBackend.gencode_functions(
+                tac, functions, ssa=not(options.nossa), jobs=jobs)
+        with timings.phase('asm'):
+            result.asm = output_asm(
+                [l for t in texts for l in t.splitlines()], tac, out)
+    elif cache is None:
+        if emit_ir == 'gencode':
+            with timings.phase('emit_ir'):
+                result.ir = IRText.dump_ir(tac, emit_ir)
+        with timings.phase('registerize'):
+            tac.registerize(ssa=not(options.nossa))
+        if emit_ir == 'registerize':
+            with timings.phase('emit_ir'):
+                result.ir = IRText.dump_ir(tac, emit_ir)
+        with timings.phase('asm'):
+            result.asm = output_asm(tac.gencode(), tac, out)
+    else:
+        # Only registerize and generate changed functions
+        with timings.phase('asm'):
+            asm = cache.gencode(tac, ssa=not(options.nossa), jobs=jobs)
+            result.asm = asm_to_string(asm, tac)
+        timings.record('cached_functions', cache.function_hits)
+        with timings.phase('cache'):
+            cache.put_program(text, result.asm)
+    return result
+
+
+def compile_ir(text, options=None, filename='<string>', out=None):
+    """Compile intermediate code written with the emit_ir option to
+    assembly, running only the phases after the one it was written at. The
+    nossa option must be the same as when it was written
+
+    Arguments:
+    text - intermediate code string, look @IRText
+
+    Keyword Arguments:
+    options - CompileOptions (default: CompileOptions()). Only nossa, the
+        pass options, and emit_ir (to write it out again after registerize)
+        are used
+    filename - name of the intermediate code in diagnostics
+    out - file like object to write the assembly to, look @compile_source
+
+    Return:
+    CompileResult
+
+    """
+    if options is None:
+        options = CompileOptions()
+    diagnostics = Diagnostics(filename, text)
+    result = CompileResult(diagnostics)
+    timings = result.timings
+    try:
+        with timings.phase('load_ir'):
+            icc, phase = IRText.load_ir(text)
+    except IRText.IRError as e:
+        diagnostics.error(e.message, lineno=e.lineno, column=0, caret=0)
+        return result
+    icc.timings = timings
+    icc.passes = pass_manager(options)
+    result.icc = icc
+    record_code(timings, icc.functions())
+    if phase == 'gencode':
+        with timings.phase('registerize'):
+            icc.registerize(ssa=not(options.nossa))
+        if getattr(options, 'emit_ir', None) == 'registerize':
+            with timings.phase('emit_ir'):
+                result.ir = IRText.dump_ir(icc, 'registerize')
+    with timings.phase('asm'):
+        result.asm = output_asm(icc.gencode(), icc, out)
+    return result
@@ -0,0 +1,200 @@
+from bisect import bisect_right
+from proto5lexer import colorize
+
+SEVERITY_COLORS = {
+    'error': 'red',
+    'warning': 'yellow',
+    'note': 'white',
+}
+
+
+class Diagnostic(object):
+
+    def __init__(self, severity, message, filename=None, lineno=None,
+                 column=None, source_line=None, caret=None, missing=None):
+        """An error, warning, or note about a program
+
+        Arguments:
+        severity - 'error', 'warning', or 'note'
+        message - description string
+
+        Keyword Arguments:
+        filename - name of the program file
+        lineno - line number (counted from 0, like the lexer)
+        column - column number
+        source_line - line of source code to show
+        caret - indentation of the ^ under source_line
+        missing - text which was expected at the caret
+
+        """
+        self.severity = severity
+        self.message = message
+        self.filename = filename
+        self.lineno = lineno
+        self.column = column
+        self.source_line = source_line
+        self.caret = caret
+        self.missing = missing
+
+    def to_dict(self):
+        """Return this diagnostic as a dictionary (for json)
+
+        """
+        return {'severity': self.severity, 'message': self.message,
+                'filename': self.filename, 'lineno': self.lineno,
+                'column': self.column}
+
+    def __str__(self):
+        if self.severity == 'note':
+            return self.message
+        if self.lineno is not None:
+            where = '%s:%s:%s' % (self.filename, self.lineno, self.column)
+        else:
+            where = '%s:' % self.filename
+        lines = ['%s %s %s' % (
+            colorize(where, 'white'),
+            colorize('%s:' % self.severity, SEVERITY_COLORS[self.severity]),
+            colorize(self.message, 'white'))]
+        if self.source_line is not None:
+            lines.append(self.source_line.rstrip())
+            lines.append('%s%s' % (' ' * self.caret, colorize('^', 'green')))
+            if self.missing:
+                lines.append('%s%s' % (' ' * self.caret,
+                                       colorize(self.missing, 'green')))
+        return '\n'.join(lines)
+
+
+class LineIndex(object):
+
+    def __init__(self, source):
+        """Offsets of the start of every line of a source, for finding the
+        line and column of a position by binary search
+
+        Arguments:
+        source - program source string
+
+        """
+        self.source = source
+        self.starts = [0]
+        i = source.find('\n')
+        while i >= 0:
+            self.starts.append(i + 1)
+            i = source.find('\n', i + 1)
+
+    def lineno(self, lexpos):
+        """Return the line number (counted from 0) of a position
+
+        """
+        return bisect_right(self.starts, lexpos) - 1
+
+    def position(self, lexpos):
+        """Return the (line number, column) of a position. Columns are
+        counted from 1 on the first line, and from 2 on the others
+
+        """
+        lineno = self.lineno(lexpos)
+        if lineno == 0:
+            return lineno, lexpos + 1
+        return lineno, lexpos - self.starts[lineno] + 2
+
+    def line(self, lineno):
+        """Return the text of a line, without its newline
+
+        """
+        start = self.starts[lineno]
+        if lineno + 1 < len(self.starts):
+            return self.source[start:self.starts[lineno + 1] - 1]
+        return self.source[start:]
+
+
+class Diagnostics(object):
+
+    def __init__(self, filename='<string>', source=''):
+        """Collects the diagnostics of compiling a program, instead of
+        printing them
+
+        Keyword Arguments:
+        filename - name of the program file
+        source - program source string
+
+        """
+        self.filename = filename
+        self.source = source
+        self.diagnostics = []
+        # LineIndex of the source, built on first use
+        self.index = None
+
+    def lines(self):
+        """Return the LineIndex of the source
+
+        """
+        if self.index is None:
+            self.index = LineIndex(self.source)
+        return self.index
+
+    def position(self, lexpos):
+        """Return the (line number, column) of a position in the source.
+        Look @LineIndex.position
+
+        """
+        return self.lines().position(lexpos)
+
+    def add(self, severity, message, lineno=None, column=None, caret=None,
+            missing=None):
+        """Add a diagnostic. If a line number is given, the source line is
+        attached to it
+
+        Arguments:
+        severity - 'error', 'warning', or 'note'
+        message - description string
+
+        Keyword Arguments:
+        lineno - line number (counted from 0)
+        column - column number
+        caret - indentation of the ^ under the source line
+        missing - text which was expected at the caret
+
+        Return:
+        Diagnostic
+
+        """
+        source_line = None
+        if lineno is not None and caret is not None:
+            source_line = self.lines().line(lineno)
+        d = Diagnostic(severity, message, self.filename, lineno, column,
+                       source_line, caret, missing)
+        self.diagnostics.append(d)
+        return d
+
+    def error(self, message, **kwargs):
+        """Add an error. Look @Diagnostics.add
+
+        """
+        return self.add('error', message, **kwargs)
+
+    def warning(self, message, **kwargs):
+        """Add a warning. Look @Diagnostics.add
+
+        """
+        return self.add('warning', message, **kwargs)
+
+    def note(self, message):
+        """Add a note (more detail for the previous diagnostic)
+
+        """
+        return self.add('note', message)
+
+    def errors(self):
+        """Return the list of error diagnostics
+
+        """
+        return [d for d in self.diagnostics if d.severity == 'error']
+
+    def __iter__(self):
+        return iter(self.diagnostics)
+
+    def __len__(self):
+        return len(self.diagnostics)
+
+    def __str__(self):
+        return '\n'.join([str(d) for d in self.diagnostics])
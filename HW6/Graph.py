@@ -1,11 +1,42 @@
+import heapq
+
+
+def bit_indices(bits):
+    """Return the positions of the set bits of an integer bitset
+
+    Arguments:
+    bits - integer bitset
+
+    Return:
+    list of integers, lowest first
+
+    """
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+
 class UndirectedGraph(object):
     DEFAULT_COLOR = '#FFFFFF'
 
     def __init__(self):
-        """New undirected graph
+        """New undirected graph.
+        Nodes are numbered in the order they are first added, and the
+        neighbors of every node are kept as a bitset of node numbers,
+        along with its degree
 
         """
-        self.edges = {}
+        self.numbers = {}
+        self.node_list = []
+        self.adjacency = []
+        self.degrees = []
+        # Bitset of the nodes in the graph (removed nodes keep their number)
+        self.present = 0
+        self.size = 0
+        self.edge_count = 0
         self.node_colors = {}
 
     def add_node(self, node):
@@ -15,11 +46,25 @@ class UndirectedGraph(object):
         node - node
 
         """
-        if node not in self.edges:
-            self.edges[node] = set()
+        n = self.numbers.get(node)
+        if n is None:
+            n = self.numbers[node] = len(self.node_list)
+            self.node_list.append(node)
+            self.adjacency.append(0)
+            self.degrees.append(0)
+        if not (self.present >> n) & 1:
+            self.present |= 1 << n
+            self.size += 1
         if node not in self.node_colors:
             self.node_colors[node] = UndirectedGraph.DEFAULT_COLOR
 
+    def number(self, node):
+        """Return the number of a node, adding it if new
+
+        """
+        self.add_node(node)
+        return self.numbers[node]
+
     def colorize(self, node, color):
         """Set a node to a color
 
@@ -38,22 +83,39 @@ class UndirectedGraph(object):
         """
         return self.node_colors[node]
 
+    def neighbors(self, node):
+        """Return the neighbors of a node
+
+        Return:
+        list of nodes
+
+        """
+        return [self.node_list[m] for m in
+                bit_indices(self.adjacency[self.numbers[node]])]
+
     def remove_node(self, node):
-        """Remove a node and return its set of edges
+        """Remove a node and return its neighbors
 
         Arguments:
         node - node
 
         Return:
-        set of nodes
+        list of nodes
 
         """
-        for x in self.edges[node]:
-            self.edges[x].remove(node)
-        edges = self.edges[node]
-        del self.edges[node]
+        n = self.numbers[node]
+        neighbors = bit_indices(self.adjacency[n])
+        bit = ~(1 << n)
+        for m in neighbors:
+            self.adjacency[m] &= bit
+            self.degrees[m] -= 1
+        self.edge_count -= self.degrees[n]
+        self.adjacency[n] = 0
+        self.degrees[n] = 0
+        self.present &= bit
+        self.size -= 1
         del self.node_colors[node]
-        return edges
+        return [self.node_list[m] for m in neighbors]
 
     def add_edge(self, nodeA, nodeB):
         """Add an edge between two nodes.
@@ -69,8 +131,30 @@ class UndirectedGraph(object):
         if nodeA == nodeB:
             return
         self.add_node(nodeB)
-        self.edges[nodeA].add(nodeB)
-        self.edges[nodeB].add(nodeA)
+        self.add_edge_bits(nodeA, 1 << self.numbers[nodeB])
+
+    def add_edge_bits(self, nodeA, bits):
+        """Add edges between nodeA and every node in the graph whose
+        number is in a bitset. Adds nodeA if it doesn't yet exist
+
+        Arguments:
+        nodeA - node
+        bits - integer bitset of node numbers
+
+        """
+        n = self.number(nodeA)
+        new = bits & self.present & ~self.adjacency[n] & ~(1 << n)
+        if new == 0:
+            return
+        self.adjacency[n] |= new
+        bit = 1 << n
+        count = 0
+        for m in bit_indices(new):
+            self.adjacency[m] |= bit
+            self.degrees[m] += 1
+            count += 1
+        self.degrees[n] += count
+        self.edge_count += count
 
     def add_edges(self, nodeA, other_nodes):
         """Add edges between nodeA to other_nodes
@@ -88,8 +172,14 @@ class UndirectedGraph(object):
         """Remove an edge between nodes A and B
 
         """
-        self.edges[nodeA].remove(nodeB)
-        self.edges[nodeB].remove(nodeA)
+        a, b = self.numbers[nodeA], self.numbers[nodeB]
+        if not (self.adjacency[a] >> b) & 1:
+            raise KeyError((nodeA, nodeB))
+        self.adjacency[a] &= ~(1 << b)
+        self.adjacency[b] &= ~(1 << a)
+        self.degrees[a] -= 1
+        self.degrees[b] -= 1
+        self.edge_count -= 1
 
     def degree(self, node):
         """Return the degree of a node
@@ -98,30 +188,44 @@ class UndirectedGraph(object):
         integer of number of edges incident on node
 
         """
-        return len(self.edges[node])
+        return self.degrees[self.numbers[node]]
 
     def nodes(self):
-        """Return a set of all node names
+        """Return a list of all nodes, in the order they were numbered
+
+        """
+        return [self.node_list[m] for m in bit_indices(self.present)]
+
+    def num_edges(self):
+        """Return the number of edges
 
         """
-        return set(self.edges.keys())
+        return self.edge_count
+
+    def __len__(self):
+        return self.size
 
     def smallest_degree_node(self):
-        """Return a node of smallest degree
+        """Return a node of smallest degree (the first one numbered if
+        there are several)
 
         Return:
         node - node of smallest degree
 
         """
-        return min(self.edges, key=self.edges.get)
+        return self.node_list[min(bit_indices(self.present),
+                                  key=self.degrees.__getitem__)]
 
     def copy(self):
         g = UndirectedGraph()
-        for nodeA in self.edges:
-            g.add_node(nodeA)
-            g.colorize(nodeA, self.color(nodeA))
-            for nodeB in self.edges[nodeA]:
-                g.add_edge(nodeA, nodeB)
+        g.numbers = dict(self.numbers)
+        g.node_list = list(self.node_list)
+        g.adjacency = list(self.adjacency)
+        g.degrees = list(self.degrees)
+        g.present = self.present
+        g.size = self.size
+        g.edge_count = self.edge_count
+        g.node_colors = dict(self.node_colors)
         return g
 
     def to_png(self, program_name):
@@ -141,7 +245,101 @@ class UndirectedGraph(object):
         graph.node_attr['style'] = 'filled'
         for node in self.nodes():
             graph.add_node(node, fillcolor=self.node_colors[node])
-        for nodeA in self.edges:
-            for nodeB in self.edges[nodeA]:
+        for nodeA in self.nodes():
+            for nodeB in self.neighbors(nodeA):
                 graph.add_edge(nodeA, nodeB)
         graph.draw('%s_coloring.png' % program_name, prog='circo')
+
+
+class SimplifyQueue(object):
+
+    def __init__(self, graph, k, weight):
+        """Removes the nodes of a graph in the order of the simplify phase
+        of graph coloring: nodes of degree < k first, smallest degree first,
+        and otherwise the spill candidate with the smallest degree - weight.
+        Nodes are kept in buckets by degree, and spill candidates in a heap
+
+        Arguments:
+        graph - UndirectedGraph
+        k - number of colors
+        weight - function of node -> number, the cost of spilling it
+
+        """
+        self.graph = graph
+        self.k = k
+        degrees = graph.degrees
+        present = bit_indices(graph.present)
+        self.weights = [0] * len(graph.node_list)
+        self.buckets = [set() for d in xrange(max([0] + [degrees[n] for n
+                                                          in present]) + 1)]
+        self.spill_heap = []
+        for n in present:
+            self.weights[n] = weight(graph.node_list[n])
+            self.buckets[degrees[n]].add(n)
+            if degrees[n] >= k:
+                self.spill_heap.append((degrees[n] - self.weights[n], n))
+        heapq.heapify(self.spill_heap)
+        # No bucket below this one has any nodes
+        self.low = 0
+
+    def low_degree_node(self):
+        """Return a node of smallest degree, if it is less than k
+
+        Return:
+        node, or None
+
+        """
+        while self.low < self.k and self.low < len(self.buckets):
+            bucket = self.buckets[self.low]
+            if len(bucket) != 0:
+                return self.graph.node_list[next(iter(bucket))]
+            self.low += 1
+        return None
+
+    def spill_candidate(self, exclude):
+        """Return the node with the smallest degree - weight, which is not
+        excluded. Excluded nodes are never returned again
+
+        Arguments:
+        exclude - set of nodes
+
+        Return:
+        node, or None
+
+        """
+        graph = self.graph
+        while len(self.spill_heap) != 0:
+            priority, n = heapq.heappop(self.spill_heap)
+            # Skip removed nodes, and entries of an older degree
+            if not (graph.present >> n) & 1 or \
+               priority != graph.degrees[n] - self.weights[n]:
+                continue
+            node = graph.node_list[n]
+            if node not in exclude:
+                return node
+        return None
+
+    def remove(self, node):
+        """Remove a node from the graph
+
+        Arguments:
+        node - node
+
+        Return:
+        list of its neighbors
+
+        """
+        graph = self.graph
+        n = graph.numbers[node]
+        self.buckets[graph.degrees[n]].discard(n)
+        neighbors = graph.remove_node(node)
+        for v in neighbors:
+            m = graph.numbers[v]
+            d = graph.degrees[m]
+            self.buckets[d + 1].discard(m)
+            self.buckets[d].add(m)
+            if d < self.low:
+                self.low = d
+            if d >= self.k:
+                heapq.heappush(self.spill_heap, (d - self.weights[m], m))
+        return neighbors
@@ -0,0 +1,263 @@
+import re
+
+import IntermediateCode
+from IntermediateCode import (IC, ICContext, ICContextBasicBlock, Integer,
+                              Label, Variable)
+
+# Phases after which the intermediate code can be written out
+PHASES = ['gencode', 'registerize']
+
+HEADER = '# protoplasm IR after %s'
+
+# Operand names and strings are written as they are, so they can not have
+# any of the separators
+NAME = re.compile(r'^[^\s,()]+$')
+
+INSTRUCTION = re.compile(r'^    (\w+)\((.*)\) used\((.*)\) defined\((.*)\)'
+                         r'(?: registers: (\d+) offset: (-?\d+))?$')
+
+# IC class name -> class
+_classes = dict((name, c) for name, c in IntermediateCode.__dict__.items()
+                if isinstance(c, type) and issubclass(c, IC))
+
+
+class IRError(ValueError):
+
+    def __init__(self, message, lineno):
+        """Malformed intermediate code text
+
+        Arguments:
+        message - description string
+        lineno - line number (counted from 0)
+
+        """
+        super(IRError, self).__init__(message)
+        self.lineno = lineno
+
+
+def name_text(name):
+    name = str(name)
+    if not NAME.match(name):
+        raise ValueError('can not write name: %r' % name)
+    return name
+
+
+def operand_text(operand, block_ids):
+    """Write an instruction operand
+
+    Arguments:
+    operand - Variable, Integer, Label, ICContextBasicBlock, number, string,
+        list of call arguments, or None
+    block_ids - dictionary of ICContextBasicBlock -> block number
+
+    Return:
+    string
+
+    """
+    if operand is None:
+        return '-'
+    elif isinstance(operand, Variable):
+        return 'v:%s' % name_text(operand.value)
+    elif isinstance(operand, Integer):
+        return 'i:%s' % operand.value
+    elif isinstance(operand, Label):
+        return 'l:%s' % name_text(operand.name)
+    elif isinstance(operand, ICContextBasicBlock):
+        return 'b:%s' % block_ids[operand]
+    elif isinstance(operand, (int, long)):
+        return 'n:%s' % operand
+    elif isinstance(operand, basestring):
+        return 's:%s' % name_text(operand)
+    elif isinstance(operand, list):
+        # The ASTNode arguments of a call, of which only the number is used
+        return 'a:%s' % len(operand)
+    raise ValueError('can not write operand: %r' % (operand,))
+
+
+def parse_operand(text, blocks, lineno):
+    """Read an instruction operand, look @operand_text
+
+    Arguments:
+    text - operand string
+    blocks - list of ICContextBasicBlock, by number
+    lineno - line number, for errors
+
+    """
+    if text == '-':
+        return None
+    kind, _, value = text.partition(':')
+    try:
+        if kind == 'v':
+            return Variable(value)
+        elif kind == 'i':
+            return Integer(int(value))
+        elif kind == 'l':
+            return Label(value)
+        elif kind == 'b':
+            return blocks[int(value)]
+        elif kind == 'n':
+            return int(value)
+        elif kind == 's':
+            return value
+        elif kind == 'a':
+            return [None] * int(value)
+    except (ValueError, IndexError):
+        pass
+    raise IRError('bad operand: %r' % text, lineno)
+
+
+def dump_ir(icc, phase):
+    """Write the intermediate code of a program as text: its globals, and
+    for every function its temporary counter, register maps (after
+    registerize), and blocks with their follow edges and instructions.
+    Loading the text (look @load_ir) and compiling it gives the same
+    assembly as compiling the program
+
+    Arguments:
+    icc - ICContext of the program
+    phase - name of the last phase run, one of PHASES
+
+    Return:
+    string
+
+    """
+    block_ids = dict((b, i) for i, b in enumerate(icc.blocks))
+    lines = [HEADER % phase,
+             ' '.join(['globals:'] + [name_text(g) for g in icc.globals])]
+    # Register maps are shared by the instructions of a function
+    register_ids = {}
+    function = None
+    for block in icc.blocks:
+        if block.function != function:
+            function = block.function
+            icc.set_function(function)
+            lines.append('function: %s counter: %s' % (name_text(function),
+                                                       icc.counter))
+        for ins in block.instructions:
+            if ins.register_map is None or \
+               id(ins.register_map) in register_ids:
+                continue
+            register_ids[id(ins.register_map)] = len(register_ids)
+            lines.append(' '.join(
+                ['registers', '%s:' % (len(register_ids) - 1)] +
+                ['%s=%s' % (operand_text(v, block_ids), r)
+                 for v, r in ins.register_map.iteritems()]))
+        lines.append(' '.join(
+            ['block', str(block_ids[block]), 'follow:'] +
+            [str(block_ids[f]) for f in block.follow] +
+            ['start:', name_text(block.start_label or '-'),
+             'branch:', name_text(block.branch_label or '-')]))
+        for ins in block.instructions:
+            line = '    %s(%s) used(%s) defined(%s)' % (
+                type(ins).__name__,
+                ', '.join([operand_text(getattr(ins, f), block_ids)
+                           for f in ins.FIELDS]),
+                ', '.join([operand_text(v, block_ids) for v in ins.used]),
+                ', '.join([operand_text(v, block_ids) for v in ins.defined]))
+            if ins.register_map is not None:
+                line += ' registers: %s offset: %s' % (
+                    register_ids[id(ins.register_map)], ins.stack_offset)
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def split_operands(text):
+    return [] if text == '' else text.split(', ')
+
+
+def load_ir(text):
+    """Read intermediate code written by dump_ir
+
+    Arguments:
+    text - intermediate code string
+
+    Return:
+    (ICContext, name of the last phase run)
+
+    Raises:
+    IRError for malformed text
+
+    """
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    phase = None
+    for p in PHASES:
+        if len(lines) != 0 and lines[0] == HEADER % p:
+            phase = p
+    if phase is None:
+        raise IRError('not intermediate code, expected: %r' % (
+            HEADER % '<phase>'), 0)
+    if len(lines) < 2 or not lines[1].startswith('globals:'):
+        raise IRError('expected: globals:', 1)
+    icc = ICContext(set(lines[1][len('globals:'):].split()))
+    # Blocks are numbered in order, so follow edges are made once all of
+    # the blocks exist
+    blocks = []
+    follows = []
+    register_maps = {}
+    instructions = []
+    function = None
+    for lineno, line in enumerate(lines[2:], 2):
+        words = line.split()
+        if line.startswith('    '):
+            m = INSTRUCTION.match(line)
+            if m is None or len(blocks) == 0:
+                raise IRError('bad instruction', lineno)
+            instructions.append((lineno, blocks[-1], m.groups()))
+        elif len(words) == 4 and words[0] == 'function:' and \
+                words[2] == 'counter:':
+            function = words[1]
+            icc.function_counters[function] = int(words[3])
+        elif len(words) >= 2 and words[0] == 'registers':
+            registers = {}
+            register_maps[words[1].rstrip(':')] = registers
+            for pair in words[2:]:
+                variable, _, register = pair.rpartition('=')
+                registers[parse_operand(variable, blocks, lineno)] = register
+        elif len(words) >= 7 and words[0] == 'block' and \
+                words[2] == 'follow:' and words[-4] == 'start:' and \
+                words[-2] == 'branch:':
+            if words[1] != str(len(blocks)):
+                raise IRError('expected block %s' % len(blocks), lineno)
+            block = ICContextBasicBlock()
+            block.function = function
+            if words[-3] != '-':
+                block.start_label = words[-3]
+            if words[-1] != '-':
+                block.branch_label = words[-1]
+            blocks.append(block)
+            follows.append((lineno, block, words[3:-4]))
+        else:
+            raise IRError('bad line', lineno)
+    if len(blocks) == 0:
+        raise IRError('no blocks', len(lines))
+    for lineno, block, follow in follows:
+        for f in follow:
+            if not f.isdigit() or int(f) >= len(blocks):
+                raise IRError('bad follow block: %r' % f, lineno)
+            block.add_follow(blocks[int(f)])
+    for lineno, block, (name, fields, used, defined, registers,
+                        offset) in instructions:
+        cls = _classes.get(name)
+        fields = split_operands(fields)
+        if cls is None or len(fields) != len(cls.FIELDS):
+            raise IRError('bad instruction: %s' % name, lineno)
+        # Fields are set as they were, without the checks of __init__
+        ins = cls.__new__(cls)
+        IC.__init__(ins)
+        for field, value in zip(cls.FIELDS, fields):
+            setattr(ins, field, parse_operand(value, blocks, lineno))
+        ins.used = tuple([parse_operand(v, blocks, lineno)
+                          for v in split_operands(used)])
+        ins.defined = tuple([parse_operand(v, blocks, lineno)
+                             for v in split_operands(defined)])
+        if registers is not None:
+            if registers not in register_maps:
+                raise IRError('bad registers: %s' % registers, lineno)
+            ins.set_register_map(register_maps[registers])
+            ins.set_stack_offset(int(offset))
+        block.instructions.append(ins)
+        ins.set_context(icc, block)
+    icc.blocks = blocks
+    return icc, phase
@@ -1,65 +1,327 @@
-from Graph import UndirectedGraph
+from collections import deque
+from weakref import WeakValueDictionary
+
+from Graph import SimplifyQueue, UndirectedGraph, bit_indices
 from ASMCode import AsmInstruction
+from PassManager import PassManager
+from Timings import Timings
+
 
+class Operand(object):
+    __slots__ = ('value', '__weakref__')
 
-class Variable(object):
-    def __init__(self, value):
-        self.value = value
-        self.is_pointer = False
+    def __new__(cls, value):
+        """Interned operand: there is only one object of each class for a
+        value, so operands are compared and hashed by identity. Tables only
+        hold operands weakly, so they do not grow from compile to compile
+
+        Arguments:
+        value - name or number
+
+        """
+        table = cls._table
+        operand = table.get(value)
+        if operand is None:
+            operand = object.__new__(cls)
+            operand.value = value
+            table[value] = operand
+        return operand
+
+    def __reduce__(self):
+        # Unpickled operands are interned in the process loading them
+        return (type(self), (self.value,))
 
     def __str__(self):
+        return str(self.value)
+
+
+class Variable(Operand):
+    __slots__ = ()
+    # value -> Variable
+    _table = WeakValueDictionary()
+
+
+class Integer(Operand):
+    __slots__ = ()
+    # value -> Integer
+    _table = WeakValueDictionary()
+
+
+class Label(Operand):
+    __slots__ = ()
+    # name -> Label
+    _table = WeakValueDictionary()
+
+    @property
+    def name(self):
         return self.value
 
-    def __eq__(self, other):
-        return self.value == other.value
 
-    def __hash__(self):
-        return hash(self.value)
+class VariableNumbering(object):
+    def __init__(self):
+        """Numbering of the variables of a function, so that sets of them
+        can be kept as integer bitsets: variable number n is bit 1 << n
 
+        """
+        self.numbers = {}
+        self.variables = []
 
-class Integer(object):
-    def __init__(self, value):
-        self.value = value
+    def bit(self, variable):
+        """Return the bitset of a single variable, numbering it if new
 
-    def __str__(self):
-        return str(self.value)
+        Arguments:
+        variable - Variable object
 
-    def __eq__(self, other):
-        return self.value == other.value
+        """
+        n = self.numbers.get(variable)
+        if n is None:
+            n = self.numbers[variable] = len(self.variables)
+            self.variables.append(variable)
+        return 1 << n
 
-    def __hash__(self):
-        return hash(self.value)
+    def bits(self, variables):
+        """Return the bitset of a collection of variables
 
+        Arguments:
+        variables - iterable of Variable objects
 
-class Label(object):
-    def __init__(self, name):
-        self.name = name
+        """
+        bits = 0
+        for v in variables:
+            bits |= self.bit(v)
+        return bits
 
-    def __str__(self):
-        return self.name
+    def members(self, bits):
+        """Return the variables of a bitset
+
+        Arguments:
+        bits - integer bitset
+
+        Return:
+        list of Variable objects, in order of their numbers
+
+        """
+        return [self.variables[n] for n in bit_indices(bits)]
+
+
+class Liveness(object):
+    def __init__(self):
+        """Liveness of the instructions of a function, kept by the analysis
+        instead of on the instructions. Bitsets are over a numbering of the
+        variables of the function, and are kept in a list per block, in the
+        order of its instructions
+
+        """
+        self.numbering = VariableNumbering()
+        # ICContextBasicBlock -> list of bitsets, one per instruction
+        self.used = {}
+        self.defined = {}
+        self.live_out = {}
+
+    def add_block(self, block):
+        """Number the used and defined variables of the instructions of a
+        block, and summarize it (look @ICContextBasicBlock.summarize)
+
+        Arguments:
+        block - ICContextBasicBlock
+
+        """
+        bits = self.numbering.bits
+        used = self.used[block] = [bits(ins.used)
+                                   for ins in block.instructions]
+        defined = self.defined[block] = [bits(ins.defined)
+                                         for ins in block.instructions]
+        block.summarize(used, defined)
 
-    def __eq__(self, other):
-        return self.name == other.name
+    def update_block(self, block):
+        """Set the out bitset of every instruction of a block from the out
+        bitset of the block, in a single backward pass
 
-    def __hash__(self):
-        return hash(self.name)
+        Arguments:
+        block - ICContextBasicBlock
+
+        """
+        used, defined = self.used[block], self.defined[block]
+        live_out = [0] * len(used)
+        live = block.live_out
+        for i in xrange(len(used) - 1, -1, -1):
+            live_out[i] = live
+            # In(n) = Used(n) U (Out(n) - Defined(n))
+            live = used[i] | (live & ~defined[i])
+        self.live_out[block] = live_out
+
+    def live_in(self, block):
+        """Return the in bitsets of the instructions of a block
+
+        Arguments:
+        block - ICContextBasicBlock
+
+        Return:
+        list of bitsets, one per instruction
+
+        """
+        return [u | (o & ~d) for u, d, o in zip(
+            self.used[block], self.defined[block], self.live_out[block])]
+
+
+def to_word(n):
+    """Return a number as a signed 32 bit word, as registers hold it"""
+    n &= 0xFFFFFFFF
+    return n - (1 << 32) if n & 0x80000000 else n
+
+
+def fold_binary_op(op, arg1, arg2):
+    """Compute a binary operation on constants, as its assembly would
+
+    Arguments:
+    op - ICBinaryOp operator
+    arg1, arg2 - Variable or Integer operands
+
+    Return:
+    Integer, the operand it equals (for && and || on a constant arg1), or
+    None if it is not constant (or division by zero, which is left to fail
+    when run)
+
+    """
+    if op in ('&&', '||') and isinstance(arg1, Integer):
+        if (arg1.value == 0) == (op == '&&'):
+            return Integer(0) if op == '&&' else arg1
+        return arg2
+    if not(isinstance(arg1, Integer) and isinstance(arg2, Integer)):
+        return None
+    a, b = to_word(arg1.value), to_word(arg2.value)
+    if op in ('/', '%'):
+        if b == 0 or (a == -(1 << 31) and b == -1):
+            return None
+        # Quotients are truncated toward zero
+        q = abs(a) // abs(b)
+        if (a < 0) != (b < 0):
+            q = -q
+        value = q if op == '/' else a - b * q
+    elif op == '+':
+        value = a + b
+    elif op == '-':
+        value = a - b
+    elif op == '*':
+        value = a * b
+    else:
+        value = int({'==': a == b, '!=': a != b, '<': a < b, '<=': a <= b,
+                     '>': a > b, '>=': a >= b}[op])
+    return Integer(to_word(value))
+
+
+def fold_unary_op(op, arg1):
+    """Compute a unary operation on a constant, look @fold_binary_op"""
+    if not isinstance(arg1, Integer):
+        return None
+    if op == '-':
+        return Integer(to_word(-arg1.value))
+    return Integer(int(to_word(arg1.value) == 0))
+
+
+def is_pure(ins):
+    """Return whether an instruction only sets its destination, so it can
+    be removed when the destination is not used
+
+    """
+    if isinstance(ins, ICBinaryOp):
+        pure = ins.op not in ('/', '%')
+    else:
+        pure = isinstance(ins, (ICAssign, ICUnaryOp))
+    return pure and ins.dest not in IC.REGISTER_CONSTANTS
+
+
+def reverse_postorder(blocks, successors):
+    """Order blocks so that every block comes before its successors,
+    except along back edges of loops
+
+    Arguments:
+    blocks - list of ICContextBasicBlock, the first one is the entry
+    successors - dictionary of ICContextBasicBlock -> list of successors
+
+    Return:
+    list of ICContextBasicBlock
+
+    """
+    postorder = []
+    visited = set()
+    # Unreachable blocks are started from after the entry
+    for root in blocks:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(successors[root]))]
+        while len(stack) != 0:
+            block, children = stack[-1]
+            for child in children:
+                if child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                stack.pop()
+                postorder.append(block)
+    postorder.reverse()
+    return postorder
+
+
+def operand_fingerprint(operand, block_ids):
+    """Describe an instruction operand as a string
+
+    Arguments:
+    operand - Variable, Integer, Label, ICContextBasicBlock, list, constant,
+        or other object
+    block_ids - dictionary of ICContextBasicBlock -> number within function
+
+    Return:
+    string
+
+    """
+    if isinstance(operand, Variable):
+        return 'var:%s' % operand.value
+    elif isinstance(operand, Integer):
+        return 'int:%s' % operand.value
+    elif isinstance(operand, Label):
+        return 'label:%s' % operand.name
+    elif isinstance(operand, ICContextBasicBlock):
+        return 'block:%s' % block_ids[operand]
+    elif isinstance(operand, list):
+        return '[%s]' % ', '.join(
+            [operand_fingerprint(x, block_ids) for x in operand])
+    elif operand is None or isinstance(operand, (basestring, int, long)):
+        return repr(operand)
+    # Other objects (such as the ASTNode arguments of a call) only by type
+    return type(operand).__name__
+
+
+# Variables of the stack and frame pointers
+STACK = Variable('@stack')
+FRAME = Variable('@frame')
 
 
 class IC(object):
     # Constant registers
     REGISTER_CONSTANTS = {
-        Variable('@stack'): '$sp',
-        Variable('@frame'): '$fp'
+        STACK: '$sp',
+        FRAME: '$fp'
     }
+    # Attributes which completely describe the instruction
+    FIELDS = ()
+    # Instructions keep only their fields: liveness is kept by the analysis
+    # (look @Liveness), and the register map is shared by the function
+    __slots__ = ('used', 'defined', 'register_map', 'context', 'block',
+                 'stack_offset')
 
     def __init__(self):
         """Intermediate Code object
 
         """
-        self.liveliness = {'in': set(), 'out': set(), 'used': set(),
-                           'defined': set()}
-        self.register_map = {}
+        # Variables used and defined by the instruction
+        self.used = ()
+        self.defined = ()
+        self.register_map = None
         self.context = None
+        self.block = None
         self.stack_offset = 0
 
     def set_stack_offset(self, offset):
@@ -73,6 +335,21 @@ class IC(object):
         """
         self.stack_offset = offset
 
+    def __getstate__(self):
+        """Pickle without the context, which holds the code of the whole
+        program. Look @ParallelBackend.backend_worker
+
+        """
+        return dict((name, getattr(self, name))
+                    for c in type(self).__mro__
+                    for name in c.__dict__.get('__slots__', ())
+                    if name != 'context' and hasattr(self, name))
+
+    def __setstate__(self, state):
+        self.context = None
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
     def set_context(self, context, block):
         """Set the context and block of this instruction
 
@@ -93,30 +370,6 @@ class IC(object):
         """
         self.register_map = reg_map
 
-    def update_variable_sets(self, next_ic=None):
-        """Update in and out sets.
-
-        Keyword Arguments:
-        next_ic - the intermediate code after this one (used to update out set)
-            if None given, then Out not updated (good for last statement)
-
-        Return:
-        boolean of whether something was changed or not
-
-        """
-        changed = False
-        if next_ic:
-            # Out(n) = U In(n + 1)
-            old_out = self.liveliness['out']
-            self.liveliness['out'] = self.liveliness['out'].union(next_ic.liveliness['in'])
-            changed = changed or not(old_out == self.liveliness['out'])
-        # In(n) = Used(n) U (Out(n) - Defined(n))
-        new_in = self.liveliness['used'].union(
-            self.liveliness['out'].difference(self.liveliness['defined']))
-        changed, self.liveliness['in'] = (
-            (changed or not(self.liveliness['in'] == new_in)), new_in)
-        return changed
-
     def get_register_or_value(self, variable):
         """Get the register or Integer value of a variable
 
@@ -154,8 +407,9 @@ class IC(object):
         variable - Variable object, others passed up on
 
         """
-        if isinstance(variable, Variable) and variable not in IC.REGISTER_CONSTANTS:
-            self.liveliness['used'].add(variable)
+        if isinstance(variable, Variable) and variable not in IC.REGISTER_CONSTANTS \
+           and variable not in self.used:
+            self.used += (variable,)
 
     def remove_used(self, variable):
         """Remove a variable from the set of used variables
@@ -165,8 +419,8 @@ class IC(object):
         variable - Variable object to be remove
 
         """
-        if variable in self.liveliness['used']:
-            self.liveliness['used'].remove(variable)
+        if variable in self.used:
+            self.used = tuple([v for v in self.used if v != variable])
 
     def add_defined(self, dest):
         """Add a variable that is defined. Automatically filters out Integers
@@ -175,8 +429,8 @@ class IC(object):
         variable - Variable object, others passed up on
 
         """
-        if isinstance(dest, Variable):
-            self.liveliness['defined'].add(dest)
+        if isinstance(dest, Variable) and dest not in self.defined:
+            self.defined += (dest,)
 
     def remove_defined(self, dest):
         """Remove a variable from the set of defined variables
@@ -186,8 +440,25 @@ class IC(object):
         variable - Variable object to be remove
 
         """
-        if dest in self.liveliness['defined']:
-            self.liveliness['defined'].remove(dest)
+        if dest in self.defined:
+            self.defined = tuple([v for v in self.defined if v != dest])
+
+    def fingerprint(self, block_ids):
+        """Describe this instruction exactly: its type, fields, and
+        variable sets
+
+        Arguments:
+        block_ids - dictionary of ICContextBasicBlock -> number within function
+
+        Return:
+        string
+
+        """
+        return '%s(%s) used: %s defined: %s' % (type(self).__name__,
+            ', '.join([operand_fingerprint(getattr(self, f), block_ids)
+                       for f in self.FIELDS]),
+            ' '.join(sorted([str(v) for v in self.used])),
+            ' '.join(sorted([str(v) for v in self.defined])))
 
     def rename_used(self, old, new):
         """Rename a used variable. Should check for existance,
@@ -215,6 +486,9 @@ class IC(object):
 class ICAssign(IC):
     """Assign variable to variable, or Integer to variable
     """
+    FIELDS = ('dest', 'arg1')
+    __slots__ = FIELDS
+
     def __init__(self, dest, arg1):
         super(ICAssign, self).__init__()
         if not(isinstance(dest, Variable) and (isinstance(arg1, Variable) or
@@ -254,6 +528,9 @@ class ICAssign(IC):
 class ICBinaryOp(IC):
     """Binary operations
     """
+    FIELDS = ('dest', 'arg1', 'arg2', 'op')
+    __slots__ = FIELDS
+
     ASM_OPS = {'+': 'add', '-': 'sub', '*': 'mul', '/': 'div', '%': 'rem',
                '&&': None, '||': None, '==': 'seq', '!=': 'sne', '<': 'slt',
                '<=': 'sle', '>': 'sgt', '>=': 'sge'}
@@ -337,6 +614,8 @@ class ICBinaryOp(IC):
 class ICFunctionArgumentLoad(IC):
     """Load an argument at the start of a function call
     """
+    FIELDS = ('dest', 'number')
+    __slots__ = FIELDS
 
     def __init__(self, dest, number):
         super(ICFunctionArgumentLoad, self).__init__()
@@ -360,6 +639,8 @@ class ICFunctionArgumentLoad(IC):
 class ICFunctionArgumentSave(IC):
     """Save an argument for a function call
     """
+    FIELDS = ('src', 'number')
+    __slots__ = FIELDS
 
     def __init__(self, src, number):
         super(ICFunctionArgumentSave, self).__init__()
@@ -390,6 +671,8 @@ class ICFunctionArgumentSave(IC):
 class ICFunctionCall(IC):
     """Call a function
     """
+    FIELDS = ('dest', 'name', 'arguments')
+    __slots__ = FIELDS
 
     def __init__(self, dest, name, arguments):
         super(ICFunctionCall, self).__init__()
@@ -420,6 +703,8 @@ class ICFunctionCall(IC):
 class ICFunctionDeclare(IC):
     """Declare a function and its body code
     """
+    FIELDS = ('name', 'body_block')
+    __slots__ = FIELDS
 
     def __init__(self, name, body_block):
         super(ICFunctionDeclare, self).__init__()
@@ -449,6 +734,8 @@ class ICFunctionDeclare(IC):
 class ICFunctionReturn(IC):
     """Return from a function
     """
+    FIELDS = ('variable',)
+    __slots__ = FIELDS
 
     def __init__(self, variable):
         super(ICFunctionReturn, self).__init__()
@@ -487,6 +774,9 @@ class ICFunctionReturn(IC):
 class ICDoWhile(IC):
     """Assign variable to variable, or Integer to variable
     """
+    FIELDS = ('do_part_block', 'while_var', 'while_part_block', 'next_block')
+    __slots__ = FIELDS + ('do_label',)
+
     def __init__(self, do_part_block, while_var, while_part_block, next_block):
         super(ICDoWhile, self).__init__()
         if not(isinstance(while_var, Variable) or
@@ -537,6 +827,9 @@ class ICDoWhile(IC):
 class ICFor(IC):
     """Assign variable to variable, or Integer to variable
     """
+    FIELDS = ('cond_var', 'cond_part_block', 'end_for_block', 'next_block')
+    __slots__ = FIELDS + ('cond_label',)
+
     def __init__(self, cond_var, cond_part_block, end_for_block, next_block):
         super(ICFor, self).__init__()
         if not(isinstance(cond_var, Variable) or
@@ -586,6 +879,9 @@ class ICFor(IC):
 class ICIf(IC):
     """Assign variable to variable, or Integer to variable
     """
+    FIELDS = ('if_var', 'then_block', 'else_block', 'end_if_block')
+    __slots__ = FIELDS
+
     def __init__(self, if_var, then_block, else_block, end_if_block):
         super(ICIf, self).__init__()
         if not(isinstance(if_var, Variable) or isinstance(if_var, Integer)):
@@ -637,6 +933,8 @@ class ICIf(IC):
 class ICInput(IC):
     """Do an input statement for an integer
     """
+    FIELDS = ('dest',)
+    __slots__ = FIELDS
 
     def __init__(self, dest):
         super(ICInput, self).__init__()
@@ -674,6 +972,9 @@ class ICInput(IC):
 class ICLoadWord(IC):
     """Load a word
     """
+    FIELDS = ('dest', 'base', 'offset', 'elem')
+    __slots__ = FIELDS
+
     def __init__(self, dest, base=None, offset=None, elem=None):
         """
         Arguments:
@@ -768,6 +1069,9 @@ class ICLoadWord(IC):
 class ICLoadGlobal(ICLoadWord):
     """Load a global argument
     """
+    FIELDS = ICLoadWord.FIELDS + ('variable',)
+    __slots__ = ('variable',)
+
     def __init__(self, variable):
         super(ICLoadGlobal, self).__init__(variable, base=Label('global_%s' % variable))
         self.variable = variable
@@ -779,6 +1083,8 @@ class ICLoadGlobal(ICLoadWord):
 class ICAllocMemory(IC):
     """Allocate memory
     """
+    FIELDS = ('dest', 'length')
+    __slots__ = FIELDS
 
     def __init__(self, dest, length):
         super(ICAllocMemory, self).__init__()
@@ -836,6 +1142,8 @@ class ICAllocMemory(IC):
 class ICPrint(IC):
     """Do a print statement for an integer
     """
+    FIELDS = ('arg1',)
+    __slots__ = FIELDS
 
     def __init__(self, arg1):
         super(ICPrint, self).__init__()
@@ -879,6 +1187,8 @@ class ICPrint(IC):
 class ICBoundCheck(IC):
     """Do a print statement for an integer
     """
+    FIELDS = ('base', 'elem')
+    __slots__ = FIELDS
 
     def __init__(self, base, elem):
         super(ICBoundCheck, self).__init__()
@@ -919,6 +1229,9 @@ class ICBoundCheck(IC):
 class ICStoreWord(IC):
     """Store a word
     """
+    FIELDS = ('src', 'base', 'offset', 'elem')
+    __slots__ = FIELDS
+
     def __init__(self, src, base=None, offset=None, elem=None):
         """
         Arguments:
@@ -1012,6 +1325,8 @@ class ICStoreWord(IC):
 class ICStoreGlobal(ICStoreWord):
     """Store a global
     """
+    FIELDS = ICStoreWord.FIELDS + ('dest',)
+    __slots__ = ('dest',)
 
     def __init__(self, src, dest):
         super(ICStoreGlobal, self).__init__(src, base=Label('global_%s' % dest))
@@ -1024,6 +1339,9 @@ class ICStoreGlobal(ICStoreWord):
 class ICUnaryOp(IC):
     """Unary operations
     """
+    FIELDS = ('dest', 'arg1', 'op')
+    __slots__ = FIELDS
+
     ASM_OPS = {'-': 'neg', '!': None}
 
     def __init__(self, dest, arg1, op):
@@ -1076,6 +1394,9 @@ class ICUnaryOp(IC):
 class ICWhileDo(IC):
     """Assign variable to variable, or Integer to variable
     """
+    FIELDS = ('while_var', 'while_part_block', 'end_if_block', 'next_block')
+    __slots__ = FIELDS + ('condition_label',)
+
     def __init__(self, while_var, while_part_block, end_if_block, next_block):
         super(ICWhileDo, self).__init__()
         if not(isinstance(while_var, Variable) or
@@ -1131,10 +1452,27 @@ class ICContextBasicBlock(object):
         """
         self.start_label = None
         self.branch_label = None
+        self.function = None
         self.instructions = []
         self.follow = []
         self.precede = []
-        self.liveliness = {'in': set(), 'out': set()}
+        # Liveness bitsets of the whole block, look @summarize
+        self.live_in = 0
+        self.live_out = 0
+        self.gen = 0
+        self.kill = 0
+
+    def __getstate__(self):
+        """Pickle without the instructions and follow edges, which link to
+        the rest of the code: pickling them would recurse once per block.
+        They are pickled as flat lists, look @ParallelBackend.function_job
+
+        """
+        state = dict(self.__dict__)
+        state['instructions'] = []
+        state['follow'] = []
+        state['precede'] = []
+        return state
 
     def get_root_and_children(self):
         visited = set()
@@ -1169,45 +1507,66 @@ class ICContextBasicBlock(object):
             return [AsmInstruction('b', self.branch_label)]
         return []
 
-    def update_liveliness(self):
-        if len(self.instructions) == 0:
-            return
-        # Keep looping while one of the sets has changed
-        block_changed = False
-        changed = True
-        while changed:
-            changed = False
-            # The last one might not have a next so we have to do this first
-            changed = changed or self.instructions[-1].update_variable_sets()
-
-            # Get all followers and loop through empty's
-            # BFS like traversal
-            # Should not loop indefinitely...in case of two emptys in a loop
-            follower_blocks = []
-            candidates = [x for x in self.follow]
-            visited = set()
-            while len(candidates) != 0:
-                c = candidates.pop()
-                if c not in visited:
-                    visited.add(c)
-                else:
-                    continue
-                if len(c.instructions) == 0:
-                    for x in c.follow:
-                        if x not in visited:
-                            candidates.append(x)
-                else:
-                    follower_blocks.append(c)
-
-            # Then loop through its follows
-            for follow in follower_blocks:
-                changed = changed or self.instructions[-1].update_variable_sets(next_ic=follow.instructions[0])
-            # Bottom up, update in's and out's, using next statement
-            for i in xrange(len(self.instructions) - 2, -1, -1):
-                changed = changed or self.instructions[i].update_variable_sets(
-                    next_ic=self.instructions[i + 1])
-            block_changed = block_changed or changed
-        return block_changed
+    def generate_assembly(self):
+        """Generate the assembly of the block, its instructions, and its
+        branch to the next block
+
+        Return:
+        iterator of AsmInstruction
+
+        """
+        for a in self.generate_start_assembly():
+            yield a
+        for ins in self.instructions:
+            for a in ins.generate_assembly():
+                yield a
+        for a in self.generate_end_assembly():
+            yield a
+
+    def follower_blocks(self):
+        """Return the blocks whose first instruction may be run after the
+        last instruction of this one. Empty blocks are looked through
+
+        Return:
+        list of non empty ICContextBasicBlock
+
+        """
+        # Should not loop indefinitely...in case of two emptys in a loop
+        follower_blocks = []
+        candidates = [x for x in self.follow]
+        visited = set()
+        while len(candidates) != 0:
+            c = candidates.pop()
+            if c not in visited:
+                visited.add(c)
+            else:
+                continue
+            if len(c.instructions) == 0:
+                for x in c.follow:
+                    if x not in visited:
+                        candidates.append(x)
+            else:
+                follower_blocks.append(c)
+        return follower_blocks
+
+    def summarize(self, used, defined):
+        """Compute the gen (used before being defined) and kill (defined)
+        bitsets of the block, from those of its instructions
+
+        Arguments:
+        used - list of bitsets, one per instruction, look @Liveness
+        defined - list of bitsets, one per instruction
+
+        """
+        gen = 0
+        kill = 0
+        for i in xrange(len(used) - 1, -1, -1):
+            gen = used[i] | (gen & ~defined[i])
+            kill |= defined[i]
+        self.gen = gen
+        self.kill = kill
+        self.live_in = gen
+        self.live_out = 0
 
     def graph_label(self):
         s = ''
@@ -1251,13 +1610,26 @@ class ICContext(object):
         """
         self.blocks = [ICContextBasicBlock()]
         self.variables = []
+        # Temporary -> (base, element) of the array element or class field
+        # it was loaded from, for assignments to it
+        self.element_addresses = {}
         self.counter = 0
+        self.function = None
+        self.function_counters = {}
         self.liveliness_graph = UndirectedGraph()
+        # Liveness of the last function analyzed, look @update_liveliness
+        self.liveness = None
+        # (block index, interference graph) of every function, only kept
+        # with keep_graphs (look @ICContext.registerize)
         self.all_graphs = []
+        self.keep_graphs = False
         self.variable_usage = {}
         self.spilled_variables = set()
         self.stack_pointer = 0
         self.globals = globals
+        self.timings = Timings()
+        # Passes run by registerize
+        self.passes = PassManager()
 
     def new_block(self, auto_follow=True):
         """Create a new instruction block
@@ -1268,6 +1640,7 @@ class ICContext(object):
         """
         # Make new block
         a = ICContextBasicBlock()
+        a.function = self.function
         # Add it as a follow of previous
         if auto_follow:
             self.blocks[-1].add_follow(a)
@@ -1297,6 +1670,77 @@ class ICContext(object):
             block.instructions.append(ins)
             ins.set_context(self, block)
 
+    def set_function(self, name):
+        """Switch to the function whose code is being generated.
+        Temporaries and labels are numbered separately for each function,
+        so that the code of a function does not depend on any other one
+
+        Arguments:
+        name - function name
+
+        """
+        self.function_counters[self.function] = self.counter
+        self.function = name
+        # Temporaries are numbered per function
+        self.element_addresses = {}
+        self.counter = self.function_counters.get(name, 0)
+
+    def functions(self):
+        """Group the blocks by the function they belong to. Blocks outside of
+        any function (the empty first block) are left out
+
+        Return:
+        list of (function name, list of ICContextBasicBlock), in program order
+
+        """
+        functions = []
+        for block in self.blocks:
+            if block.function is None:
+                continue
+            if len(functions) == 0 or functions[-1][0] != block.function:
+                functions.append((block.function, []))
+            functions[-1][1].append(block)
+        return functions
+
+    def pop_functions(self):
+        """Remove the code of the functions generated so far, so that it
+        is dropped once the caller is done with it. The first (empty) block
+        is kept, and the next function is generated after it as before
+
+        Return:
+        list of (function name, list of ICContextBasicBlock), look @functions
+
+        """
+        functions = self.functions()
+        self.blocks = self.blocks[:1]
+        # Values left on the stack (such as the results of expression
+        # statements) are never used outside of their function
+        self.variables = []
+        return functions
+
+    def fingerprint(self, name, blocks):
+        """Describe the code of a function exactly, without referring to
+        anything outside of it. Two functions with the same fingerprint
+        compile to the same assembly
+
+        Arguments:
+        name - function name
+        blocks - list of ICContextBasicBlock of the function
+
+        Return:
+        string
+
+        """
+        self.set_function(name)
+        block_ids = dict((b, i) for i, b in enumerate(blocks))
+        lines = ['function: %s counter: %s' % (name, self.counter)]
+        for i, block in enumerate(blocks):
+            lines.append('block %s -> %s' % (
+                i, ' '.join([str(block_ids[f]) for f in block.follow])))
+            for ins in block.instructions:
+                lines.append(ins.fingerprint(block_ids))
+        return '\n'.join(lines)
+
     def new_var(self):
         """Create a new temporary variable.
         Autoincremented.
@@ -1320,7 +1764,7 @@ class ICContext(object):
         Autoincremented.
 
         """
-        name = 'l_%s_%s' % (self.counter, suffix)
+        name = 'l_%s_%s_%s' % (self.function, self.counter, suffix)
         self.counter += 1
         return name
 
@@ -1343,34 +1787,68 @@ class ICContext(object):
         return self.variables.pop()
 
     def gencode(self):
-        """Converts the list of IC objects to ASMInstruction Objects,
-           Returns AsmInstructionContext
+        """Converts the list of IC objects to ASMInstruction Objects.
+        Instructions are generated lazily, one function at a time
+
+        Return:
+        iterator of AsmInstruction
+
         """
-        for block in self.blocks:
+        for name, blocks in self.functions():
+            for a in self.gencode_function(name, blocks):
+                yield a
+
+    def gencode_function(self, name, blocks):
+        """Converts the IC objects of one function to ASMInstruction Objects
+
+        Arguments:
+        name - function name
+        blocks - list of ICContextBasicBlock of the function
+
+        Return:
+        iterator of AsmInstruction
+
+        """
+        self.set_function(name)
+        for block in blocks:
             for ins in block.instructions:
                 ins.first_pass()
-        asm = []
-        for block in self.blocks:
-            asm = asm + block.generate_start_assembly()
-            for ins in block.instructions:
-                asm = asm + ins.generate_assembly()
-            asm = asm + block.generate_end_assembly()
-        return asm
+        for block in blocks:
+            for a in block.generate_assembly():
+                yield a
 
-    def registerize(self, ssa=False):
+    def registerize(self, ssa=False, functions=None):
         """Perform optimization procedures and translate variables
-        to use registers.
+        to use registers, by running the passes of ICContext.passes (look
+        @PassManager) on every function.
 
         Keyword Arguments:
-        flatten_temp - look @ICContext.flatten_temporary_assignments
-        ssa - look @ICContext.update_ssa
+        ssa - not used: there is no SSA pass, kept for -nossa
+        functions - list of (name, blocks) to registerize, from
+            ICContext.functions (default: all of them)
+
+        """
+        if functions is None:
+            functions = self.functions()
+        for name, function_blocks in functions:
+            self.set_function(name)
+            self.timings.record('basic_blocks', len(function_blocks), function=name)
+            self.timings.record('ic_instructions', sum(
+                [len(b.instructions) for b in function_blocks]), function=name)
+            self.timings.record('spill_rounds', 0, function=name)
+            self.passes.run(self, function_blocks)
+
+    def allocate(self, function_blocks):
+        """Assign registers to the variables of a function, spilling
+        variables to the stack until they fit
+
+        Arguments:
+        function_blocks - list of ICContextBasicBlock of the function
 
         """
-        self.mipsify()
-        starter_blocks = filter(lambda x: len(x.precede) == 0, self.blocks)
+        starter_blocks = filter(lambda x: len(x.precede) == 0, function_blocks)
         starter_blocks = map(lambda x: x.get_root_and_children(), starter_blocks)
 
-        # self.update_liveliness()
         # Keep looping until we allocated
         # will loop multiple times if not enough registers and we spill
         for blocks in starter_blocks:
@@ -1379,11 +1857,80 @@ class ICContext(object):
             self.stack_pointer = 0
             allocated = False
             while not allocated:
-                self.update_liveliness(blocks)
-                allocated = self.allocate_registers(blocks)
-            self.all_graphs.append((self.blocks.index(blocks[0]), self.liveliness_graph))
+                with self.timings.phase('update_liveliness'):
+                    self.update_liveliness(blocks)
+                with self.timings.phase('allocate_registers'):
+                    allocated = self.allocate_registers(blocks)
+                if not allocated:
+                    self.timings.count('spill_rounds', function=self.function)
+            if self.keep_graphs:
+                self.all_graphs.append((self.blocks.index(blocks[0]), self.liveliness_graph))
+
+    def fold_constants(self, blocks):
+        """Replace operations on constants by their result. Variables
+        assigned a constant are known until the end of their block, or
+        until they are defined again. Operands are only replaced by
+        constants when that makes the whole operation constant, since
+        mipsify puts constant operands back in registers
+
+        Arguments:
+        blocks - list of ICContextBasicBlock of a function
+
+        """
+        for block in blocks:
+            # Variable -> Integer it holds
+            known = {}
+            for i, ins in enumerate(block.instructions):
+                if isinstance(ins, ICAssign):
+                    if ins.arg1 in known:
+                        ins.rename_used(ins.arg1, known[ins.arg1])
+                elif isinstance(ins, (ICBinaryOp, ICUnaryOp)):
+                    arg1 = known.get(ins.arg1, ins.arg1)
+                    if isinstance(ins, ICBinaryOp):
+                        value = fold_binary_op(ins.op, arg1,
+                                               known.get(ins.arg2, ins.arg2))
+                    else:
+                        value = fold_unary_op(ins.op, arg1)
+                    if value is not None:
+                        ins = ICAssign(ins.dest, value)
+                        ins.set_context(self, block)
+                        block.instructions[i] = ins
+                for v in ins.defined:
+                    known.pop(v, None)
+                if isinstance(ins, ICAssign) and isinstance(ins.arg1, Integer):
+                    known[ins.dest] = ins.arg1
+
+    def eliminate_dead_code(self, blocks):
+        """Remove assignments and operations (except division, which may
+        fail) whose result is not live after them. Blocks are swept
+        backward, so an operation only used by a dead one is removed with
+        it, and liveness is solved again until nothing is removed
 
-    def mipsify(self):
+        Arguments:
+        blocks - list of ICContextBasicBlock of a function
+
+        """
+        removed = True
+        while removed:
+            removed = False
+            liveness = self.solve_liveness(blocks)
+            for block in blocks:
+                if len(block.instructions) == 0:
+                    continue
+                live = block.live_out
+                kept = []
+                for ins, used, defined in reversed(zip(
+                        block.instructions, liveness.used[block],
+                        liveness.defined[block])):
+                    if defined & live == 0 and is_pure(ins):
+                        removed = True
+                        continue
+                    kept.append(ins)
+                    live = used | (live & ~defined)
+                kept.reverse()
+                block.instructions[:] = kept
+
+    def mipsify(self, blocks=None):
         """Convert from generic intermediate code to mips three address
         compatible. Some operations only accept registers: such as =*/%, while
         others, like +, cannot add two numbers > 16 bits each. This function
@@ -1392,8 +1939,13 @@ class ICContext(object):
         For all binary ops, put Integers into registers
         For if statements, make sure condition is in a variable
 
+        Keyword Arguments:
+        blocks - list of ICContextBasicBlock to convert (default: all)
+
         """
-        for block in self.blocks:
+        if blocks is None:
+            blocks = self.blocks
+        for block in blocks:
             i = 0
             while i < len(block.instructions):
                 ins = block.instructions[i]
@@ -1412,42 +1964,101 @@ class ICContext(object):
                         i += 1
                 i += 1
 
-    def update_liveliness(self, blocks):
-        """Loop through all instructions and update their in and out sets.
-        Calculate how many times a variable is used.
+    def solve_liveness(self, blocks):
+        """Update the in and out sets of all instructions, by solving
+        liveness over whole blocks (look @ICContextBasicBlock.summarize)
+        and then going through each block once.
+
+        Sets are kept as bitsets over a numbering of the variables of the
+        blocks, in ICContext.liveness (look @Liveness)
+
+        Return:
+        Liveness
 
         """
+        liveness = Liveness()
+        numbering = liveness.numbering
+        # Only blocks with instructions take part in the dataflow
+        blocks = [b for b in blocks if len(b.instructions) != 0]
+        successors = {}
+        predecessors = dict((b, []) for b in blocks)
         for block in blocks:
-            block.liveliness['out'] = set()
-            block.liveliness['in'] = set()
-            for ins in block.instructions:
-                # Clear up outs and ins
-                ins.liveliness['out'] = set()
-                ins.liveliness['in'] = set()
-        # Update block liveliness
-        # Last statement of each block sets its out to union of all follows
-        changed = True
-        while changed:
-            changed = False
-            for i in xrange(len(blocks) - 1, -1, -1):
-                changed = changed or blocks[i].update_liveliness()
+            liveness.add_block(block)
+            successors[block] = block.follower_blocks()
+            for follow in successors[block]:
+                predecessors[follow].append(block)
+        # Liveness flows backward, so blocks are first visited in postorder
+        # (reverse of reverse postorder), and a block is only visited again
+        # when the in bitset of one of its successors changes
+        worklist = deque(reversed(reverse_postorder(blocks, successors)))
+        queued = set(worklist)
+        iterations = 0
+        while len(worklist) != 0:
+            block = worklist.popleft()
+            queued.discard(block)
+            iterations += 1
+            # Out(b) = U In(s) for all successors s
+            live_out = 0
+            for follow in successors[block]:
+                live_out |= follow.live_in
+            block.live_out = live_out
+            # In(b) = Gen(b) U (Out(b) - Kill(b))
+            live_in = block.gen | (live_out & ~block.kill)
+            if live_in != block.live_in:
+                block.live_in = live_in
+                for precede in predecessors[block]:
+                    if precede not in queued:
+                        queued.add(precede)
+                        worklist.append(precede)
+        for block in blocks:
+            liveness.update_block(block)
+        self.liveness = liveness
+        self.timings.count('liveness_iterations', iterations,
+                           function=self.function)
+        return liveness
+
+    def update_liveliness(self, blocks):
+        """Update the in and out sets of all instructions, and build the
+        interference graph of their variables (look @solve_liveness)
+
+        Sets are kept as bitsets over a numbering of the variables of the
+        blocks, in ICContext.liveness (look @Liveness)
+
+        """
+        liveness = self.solve_liveness(blocks)
+        numbering = liveness.numbering
+        # Only blocks with instructions take part in the dataflow
+        blocks = [b for b in blocks if len(b.instructions) != 0]
         # Now build up a graph of which variables need to be alive at the
-        # same time
-        self.liveliness_graph = UndirectedGraph()
+        # same time. Nodes are added in the order of the numbering, so that
+        # liveness bitsets are also bitsets of graph nodes
+        graph = UndirectedGraph()
+        for v in numbering.variables:
+            graph.add_node(v)
+        # Two variables are alive at the same time iff one of them is
+        # defined while the other one is live out
         for block in blocks:
-            for ins in block.instructions:
-                # Add defined variables
-                for i in ins.liveliness['defined']:
-                    self.liveliness_graph.add_node(i)
-                    # Need to still add this
-                    for j in ins.liveliness['out']:
-                        self.liveliness_graph.add_edge(i, j)
-                # All the in variables that conflict with each other
-                for i in ins.liveliness['in']:
-                    self.liveliness_graph.add_node(i)
-                    for j in ins.liveliness['in']:
-                        if i != j:
-                            self.liveliness_graph.add_edge(i, j)
+            for ins, used, defined, live_out in zip(
+                    block.instructions, liveness.used[block],
+                    liveness.defined[block], liveness.live_out[block]):
+                if defined == 0:
+                    continue
+                # The source of a move can share the register of its
+                # destination
+                if isinstance(ins, ICAssign) and \
+                   isinstance(ins.arg1, Variable):
+                    live_out &= ~used
+                for v in numbering.members(defined):
+                    graph.add_edge_bits(v, live_out)
+        # Except for variables which are live without being defined first
+        if len(blocks) != 0:
+            live_in = blocks[0].live_in
+            for v in numbering.members(live_in):
+                graph.add_edge_bits(v, live_in)
+        self.liveliness_graph = graph
+        self.timings.record('interference_edges',
+                            self.liveliness_graph.num_edges(),
+                            function=self.function)
         # Calculate how many times each variable is used
         # doesn't take any consideration of ifs nor whiles
         self.variable_usage = {}
@@ -1455,9 +2066,9 @@ class ICContext(object):
             for ins in block.instructions:
                 # TODO: why does this break liveliness, but
                 # get(x, 0) in lambda key does not?
-                #for v in ins.liveliness['defined']:
+                #for v in ins.defined:
                 #    self.variable_usage[v] = 0
-                for v in ins.liveliness['used']:
+                for v in ins.used:
                     if v not in self.variable_usage:
                         self.variable_usage[v] = 1
                     else:
@@ -1471,26 +2082,19 @@ class ICContext(object):
         stack = []
         # Build up graph
         graph = self.liveliness_graph
+        queue = SimplifyQueue(graph, len(ICContext.TEMP_REGS),
+                              lambda x: self.variable_usage.get(x, 0))
         # Loop through all nodes
-        while len(graph.nodes()) > 0:
+        while len(graph) > 0:
             # Get the smallest degree node
-            node = graph.smallest_degree_node()
             # If its less than amount of registers: we're okay
-            if graph.degree(node) < len(ICContext.TEMP_REGS):
-                # node, set of edges
-                stack.append((node, graph.remove_node(node)))
+            node = queue.low_degree_node()
             # Else we need to look through and find a good candidate
-            else:
+            if node is None:
                 # Find the node which has the
                 # highest degree - amount of times used
                 # get its value, or 0, not used
-                nodes = sorted(graph.nodes(),
-                    key=lambda x: graph.degree(x) - self.variable_usage.get(x, 0))
-                node = None
-                for n in nodes:
-                    if n not in self.spilled_variables:
-                        node = n
-                        break
+                node = queue.spill_candidate(self.spilled_variables)
                 if node is None:
                     # Shit nothing else to spill right now
                     # So select one that hasnt been spilled yet
@@ -1500,9 +2104,11 @@ class ICContext(object):
                         raise RuntimeError('Already spilled all the variables!')
                     node = max(possible_nodes,
                         key=lambda x: self.variable_usage.get(x, 0))
-                    self.spill_variable(node, blocks)
+                    with self.timings.phase('spill_variable'):
+                        self.spill_variable(node, blocks)
                     return False
-                stack.append((node, graph.remove_node(node)))
+            # node, list of neighbors
+            stack.append((node, queue.remove(node)))
         # Now add back the nodes
         while len(stack) != 0:
             # Remove a node, edges from stack
@@ -1517,7 +2123,8 @@ class ICContext(object):
             # return false, and wait to be called again
             if len(possible_regs) == 0:
                 # raise ValueError("NOT ENOUGH REGISTERS")
-                self.spill_variable(node, blocks)
+                with self.timings.phase('spill_variable'):
+                    self.spill_variable(node, blocks)
                 return False
             # Get one
             reg = possible_regs.pop()
@@ -1549,23 +2156,23 @@ class ICContext(object):
             while i < len(block.instructions):
                 ins = block.instructions[i]
                 # If its being defined now
-                if var in ins.liveliness['defined']:
+                if var in ins.defined:
                     # Its also used, so restore it
-                    if var in ins.liveliness['used']:
+                    if var in ins.used:
                         # Restore before instruction
-                        load = ICLoadWord(var, base=Variable('@stack'), offset=Integer(stack_counter))
+                        load = ICLoadWord(var, base=STACK, offset=Integer(stack_counter))
                         load.set_context(self, block)
                         block.instructions.insert(i, load)   
                         i += 1
                     # Now save it back again
-                    store = ICStoreWord(var, base=Variable('@stack'), offset=Integer(stack_counter))
+                    store = ICStoreWord(var, base=STACK, offset=Integer(stack_counter))
                     store.set_context(self, block)
                     block.instructions.insert(i + 1, store)
                     i += 2
                     continue
                 # Restore before instruction
-                elif var in ins.liveliness['used']:
-                    load = ICLoadWord(var, base=Variable('@stack'), offset=Integer(stack_counter))
+                elif var in ins.used:
+                    load = ICLoadWord(var, base=STACK, offset=Integer(stack_counter))
                     load.set_context(self, block)
                     block.instructions.insert(i, load)
                     i += 2
@@ -0,0 +1,111 @@
+import cPickle
+import multiprocessing
+
+from IntermediateCode import ICContext
+
+# Worker pools of this process, by number of jobs
+_pools = {}
+
+
+def backend_pool(jobs):
+    """Return the worker pool of this process with a number of jobs,
+    starting it once
+
+    """
+    if jobs not in _pools:
+        _pools[jobs] = multiprocessing.Pool(jobs)
+    return _pools[jobs]
+
+
+def function_job(icc, name, blocks, ssa):
+    """Package the code of a function for a worker process. Instructions
+    are pickled without their context (look @IC.__getstate__), and the
+    worker rebuilds one with the temporary counter of the function. Blocks
+    are pickled without their instructions and follow edges (look
+    @ICContextBasicBlock.__getstate__), which are sent as a list per block,
+    with follow edges as block indices, so pickling does not recurse along
+    the code
+
+    Arguments:
+    icc - ICContext of the program
+    name - function name
+    blocks - list of ICContextBasicBlock of the function
+    ssa - look @ICContext.registerize
+
+    Return:
+    pickled string
+
+    """
+    icc.set_function(name)
+    block_ids = dict((b, i) for i, b in enumerate(blocks))
+    follows = [[block_ids[f] for f in b.follow] for b in blocks]
+    instructions = [b.instructions for b in blocks]
+    return cPickle.dumps((name, icc.counter, icc.globals, blocks, follows,
+                          instructions, ssa, icc.passes),
+                         cPickle.HIGHEST_PROTOCOL)
+
+
+def backend_worker(job):
+    """Registerize and generate the assembly of one function
+
+    Arguments:
+    job - look @function_job
+
+    Return:
+    (assembly string, dictionary of per function counters, pass
+        statistics)
+
+    """
+    (name, counter, globals, blocks, follows, instructions, ssa,
+     passes) = cPickle.loads(job)
+    icc = ICContext(globals)
+    icc.passes = passes
+    icc.blocks = blocks
+    icc.function_counters[name] = counter
+    for block, follow, block_instructions in zip(blocks, follows,
+                                                 instructions):
+        for i in follow:
+            block.add_follow(blocks[i])
+        block.instructions = block_instructions
+        for ins in block_instructions:
+            ins.set_context(icc, block)
+    icc.registerize(ssa=ssa, functions=[(name, blocks)])
+    text = ''.join(['%s\n' % a for a in icc.gencode_function(name, blocks)])
+    return (text, dict(icc.timings.function_counters(name)),
+            icc.timings.passes)
+
+
+def gencode_functions(icc, functions, ssa=False, jobs=1):
+    """Registerize and generate the assembly of functions. With more than
+    one job, functions are compiled in worker processes, and their
+    assembly is put back together in the order of the functions. The
+    assembly is the same either way
+
+    Arguments:
+    icc - ICContext of the program
+    functions - list of (name, blocks), from ICContext.functions
+
+    Keyword Arguments:
+    ssa - look @ICContext.registerize
+    jobs - number of worker processes
+
+    Return:
+    list of assembly strings, one per function
+
+    """
+    if jobs <= 1 or len(functions) <= 1:
+        icc.registerize(ssa=ssa, functions=functions)
+        return [''.join(['%s\n' % a for a in icc.gencode_function(name,
+                                                                  blocks)])
+                for name, blocks in functions]
+    results = backend_pool(jobs).map(
+        backend_worker,
+        [function_job(icc, name, blocks, ssa) for name, blocks in functions],
+        chunksize=1)
+    texts = []
+    for (name, blocks), (text, counters, passes) in zip(functions, results):
+        for counter, value in counters.iteritems():
+            icc.timings.record(counter, value, function=name)
+        icc.timings.add_passes(passes)
+        texts.append(text)
+    return texts
@@ -0,0 +1,119 @@
+import time
+
+
+class Pass(object):
+
+    def __init__(self, name, method, level, description, required=False):
+        """A named pass over the blocks of one function
+
+        Arguments:
+        name - pass name, used on the command line and in timings
+        method - name of the ICContext method running it on a list of
+            ICContextBasicBlock
+        level - lowest optimization level it runs at
+        description - one line description
+
+        Keyword Arguments:
+        required - needed to generate assembly, so it can not be disabled
+
+        """
+        self.name = name
+        self.method = method
+        self.level = level
+        self.description = description
+        self.required = required
+
+
+# Passes in the order they run by default. Registers are allocated last,
+# after everything that changes the code
+PASSES = [
+    Pass('fold', 'fold_constants', 1,
+         'fold operations on constants known in a block'),
+    Pass('dce', 'eliminate_dead_code', 2,
+         'remove operations whose result is never used'),
+    Pass('mipsify', 'mipsify', 0,
+         'put constant operands of binary operations in registers',
+         required=True),
+    Pass('allocate', 'allocate', 0,
+         'allocate registers, spilling variables to the stack',
+         required=True),
+]
+PASS_NAMES = [p.name for p in PASSES]
+_passes = dict((p.name, p) for p in PASSES)
+
+# Optimization levels (-O0, -O1, -O2)
+LEVELS = [0, 1, 2]
+DEFAULT_LEVEL = 0
+
+
+class PassManager(object):
+
+    def __init__(self, level=DEFAULT_LEVEL, enable=(), disable=(),
+                 order=None):
+        """Passes run on every function by ICContext.registerize
+
+        Keyword Arguments:
+        level - optimization level, runs the passes of this level and below
+        enable - names of passes to run above their level
+        disable - names of passes not to run
+        order - names of the passes to run, in order, instead of the
+            passes of the level and enable. disable still applies
+
+        Raises:
+        ValueError for unknown passes, disabled required passes, or an order
+            which does not allocate registers last
+
+        """
+        if level not in LEVELS:
+            raise ValueError('unknown optimization level: %r' % (level,))
+        for name in list(enable) + list(disable) + list(order or []):
+            if name not in _passes:
+                raise ValueError('unknown pass: %r' % name)
+        if order is None:
+            names = [p.name for p in PASSES
+                     if p.level <= level or p.name in enable]
+        else:
+            names = list(order)
+        for name in disable:
+            if _passes[name].required:
+                raise ValueError('pass can not be disabled: %s' % name)
+        names = [n for n in names if n not in disable]
+        for p in PASSES:
+            if p.required and names.count(p.name) != 1:
+                raise ValueError('pass must run once: %s' % p.name)
+        if names[-1] != 'allocate':
+            raise ValueError('allocate must run last')
+        self.level = level
+        self.passes = [_passes[n] for n in names]
+
+    def names(self):
+        return [p.name for p in self.passes]
+
+    def run(self, icc, blocks):
+        """Run the passes on the blocks of the current function of an
+        ICContext, timing each one (look @Timings.count_pass)
+
+        Arguments:
+        icc - ICContext
+        blocks - list of ICContextBasicBlock of the function
+
+        """
+        for p in self.passes:
+            instructions, nonempty = code_size(blocks)
+            start = time.time()
+            with icc.timings.phase(p.name):
+                getattr(icc, p.method)(blocks)
+            seconds = time.time() - start
+            icc.timings.count_pass(p.name, seconds, (instructions, nonempty),
+                                   code_size(blocks))
+
+
+def code_size(blocks):
+    """Return the number of instructions and of non empty blocks
+
+    Arguments:
+    blocks - list of ICContextBasicBlock
+
+    """
+    sizes = [len(b.instructions) for b in blocks]
+    return sum(sizes), len(sizes) - sizes.count(0)
@@ -0,0 +1,127 @@
+import hashlib
+import imp
+import os
+import shutil
+import tempfile
+
+import ply.lex as lex
+import ply.yacc as yacc
+import proto5lexer
+import proto5parser
+
+def module_source(module):
+    """Return the source code of a python module
+
+    Arguments:
+    module - imported python module
+
+    Return:
+    string contents of the module's .py file
+
+    """
+    path = os.path.splitext(module.__file__)[0] + '.py'
+    return open(path, 'r').read()
+
+
+def grammar_hash():
+    """Hash the lexer and parser modules together with the ply table
+    versions, so tables built for an older grammar are never loaded
+
+    Return:
+    hex digest string
+
+    """
+    h = hashlib.sha1()
+    h.update('lex %s %s\n' % (lex.__version__, lex.__tabversion__))
+    h.update('yacc %s %s\n' % (yacc.__version__, yacc.__tabversion__))
+    h.update(module_source(proto5lexer))
+    h.update(module_source(proto5parser))
+    return h.hexdigest()
+
+
+def load_lexer(cache_dir=None):
+    """Build the proto5 lexer. If a cache directory is given, the master
+    regular expression is loaded from a table module in that directory,
+    and built and saved there on a miss
+
+    Keyword Arguments:
+    cache_dir - directory of cached tables (None to always rebuild)
+
+    Return:
+    ply lexer
+
+    """
+    if cache_dir is None:
+        return lex.lex(module=proto5lexer)
+    name = 'lextab_%s' % grammar_hash()
+    path = os.path.join(cache_dir, '%s.py' % name)
+    if os.path.exists(path):
+        try:
+            lextab = imp.load_source(name, path)
+            return lex.lex(module=proto5lexer, optimize=1, lextab=lextab)
+        except Exception:
+            # Broken table file - rebuild it below
+            pass
+    # Build with full validation, then save the tables
+    lexer = lex.lex(module=proto5lexer)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        lexer.writetab(name, tmp_dir)
+        # Rename is atomic, so concurrent compiles never see a partial file
+        os.rename(os.path.join(tmp_dir, '%s.py' % name), path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return lexer
+
+
+def load_parser(cache_dir=None):
+    """Build the proto5 parser. If a cache directory is given, the LALR
+    tables are loaded from a pickle in that directory, and generated and
+    saved there on a miss
+
+    Keyword Arguments:
+    cache_dir - directory of cached tables (None to use ply's defaults)
+
+    Return:
+    ply parser
+
+    """
+    if cache_dir is None:
+        return yacc.yacc(module=proto5parser)
+    path = os.path.join(cache_dir, 'parsetab_%s.pickle' % grammar_hash())
+    if os.path.exists(path):
+        try:
+            return yacc.yacc(module=proto5parser, picklefile=path,
+                             optimize=True, debug=False)
+        except Exception:
+            # Broken table file - rebuild it below
+            pass
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        tmp_path = os.path.join(tmp_dir, os.path.basename(path))
+        parser = yacc.yacc(module=proto5parser, picklefile=tmp_path,
+                           debug=False)
+        os.rename(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return parser
+
+
+def load(cache_dir=None):
+    """Build the proto5 lexer and parser
+
+    Keyword Arguments:
+    cache_dir - directory of cached tables (None to disable the cache)
+
+    Return:
+    (lexer, parser)
+
+    """
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # Somebody else might have just made it
+            if not os.path.isdir(cache_dir):
+                raise
+    return load_lexer(cache_dir), load_parser(cache_dir)
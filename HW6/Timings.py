@@ -0,0 +1,205 @@
+import json
+import time
+from collections import OrderedDict
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Timings(object):
+
+    def __init__(self):
+        """Wall time of each compiler phase, and counters of the size of
+        the program and of the work done, in total and per function
+
+        """
+        # phase name -> seconds (excluding nested phases)
+        self.phases = OrderedDict()
+        # phase name -> peak memory of the process so far, at the end of
+        # the phase (KB on linux, only if the resource module exists)
+        self.memory = OrderedDict()
+        # counter name -> value
+        self.counters = OrderedDict()
+        # function name -> counter name -> value
+        self.functions = OrderedDict()
+        # pass name -> statistic name -> value, look @count_pass
+        self.passes = OrderedDict()
+        # Stack of [phase name, start time, time spent in nested phases]
+        self.running = []
+
+    def start(self, name):
+        """Start timing a phase. Phases can be nested: the time spent in
+        a nested phase is only counted for the nested one
+
+        Arguments:
+        name - phase name
+
+        """
+        # Keep phases in the order they started
+        self.phases.setdefault(name, 0.0)
+        self.running.append([name, time.time(), 0.0])
+
+    def stop(self):
+        """Stop timing the last started phase
+
+        """
+        name, start, nested = self.running.pop()
+        elapsed = time.time() - start
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed - nested
+        if resource is not None:
+            self.memory[name] = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+        if len(self.running) != 0:
+            self.running[-1][2] += elapsed
+
+    def phase(self, name):
+        """Time a phase in a with statement
+
+        Arguments:
+        name - phase name
+
+        """
+        return TimedPhase(self, name)
+
+    def count(self, name, n=1, function=None):
+        """Add to a counter
+
+        Arguments:
+        name - counter name
+
+        Keyword Arguments:
+        n - amount to add
+        function - function name for a per function counter
+
+        """
+        counters = self.function_counters(function)
+        counters[name] = counters.get(name, 0) + n
+
+    def record(self, name, value, function=None):
+        """Set a counter
+
+        Arguments:
+        name - counter name
+        value - value
+
+        Keyword Arguments:
+        function - function name for a per function counter
+
+        """
+        self.function_counters(function)[name] = value
+
+    def count_pass(self, name, seconds, before, after, runs=1):
+        """Add a run of a pass (look @PassManager) to its statistics
+
+        Arguments:
+        name - pass name
+        seconds - run time, including its nested phases
+        before - (instructions, non empty blocks) before it ran
+        after - (instructions, non empty blocks) after it ran
+
+        Keyword Arguments:
+        runs - number of runs added up in the statistics
+
+        """
+        if name not in self.passes:
+            self.passes[name] = OrderedDict([
+                ('runs', 0), ('seconds', 0.0), ('instructions_before', 0),
+                ('instructions_after', 0), ('blocks_before', 0),
+                ('blocks_after', 0)])
+        stats = self.passes[name]
+        stats['runs'] += runs
+        stats['seconds'] += seconds
+        stats['instructions_before'] += before[0]
+        stats['instructions_after'] += after[0]
+        stats['blocks_before'] += before[1]
+        stats['blocks_after'] += after[1]
+
+    def add_passes(self, passes):
+        """Add the pass statistics of another Timings, such as of a worker
+        process
+
+        Arguments:
+        passes - Timings.passes
+
+        """
+        for name, stats in passes.iteritems():
+            self.count_pass(name, stats['seconds'],
+                            (stats['instructions_before'],
+                             stats['blocks_before']),
+                            (stats['instructions_after'],
+                             stats['blocks_after']), runs=stats['runs'])
+
+    def function_counters(self, function):
+        if function is None:
+            return self.counters
+        if function not in self.functions:
+            self.functions[function] = OrderedDict()
+        return self.functions[function]
+
+    def total(self):
+        return sum(self.phases.values())
+
+    def to_dict(self):
+        return OrderedDict([('phases', self.phases),
+                            ('total', self.total()),
+                            ('memory', self.memory),
+                            ('counters', self.counters),
+                            ('functions', self.functions),
+                            ('passes', self.passes)])
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def __str__(self):
+        lines = ['%-24s %10s %12s' % ('phase', 'seconds', 'peak memory')]
+        for name, seconds in self.phases.iteritems():
+            lines.append('%-24s %10.6f %12s' % (name, seconds,
+                                                self.memory.get(name, '-')))
+        lines.append('%-24s %10.6f' % ('total', self.total()))
+        if len(self.counters) != 0:
+            lines.append('')
+            for name, value in self.counters.iteritems():
+                lines.append('%-24s %10s' % (name, value))
+        if len(self.functions) != 0:
+            # One column per counter used by any function
+            names = []
+            for counters in self.functions.itervalues():
+                names.extend([n for n in counters if n not in names])
+            width = max([len(f) for f in self.functions] + [len('function')])
+            lines.append('')
+            lines.append('%-*s %s' % (width, 'function',
+                                      ' '.join(['%s' % n for n in names])))
+            for function, counters in self.functions.iteritems():
+                lines.append('%-*s %s' % (width, function, ' '.join(
+                    ['%*s' % (len(n), counters.get(n, '-')) for n in names])))
+        if len(self.passes) != 0:
+            lines.append('')
+            lines.append('%-12s %6s %10s %14s %10s' % (
+                'pass', 'runs', 'seconds', 'instructions', 'blocks'))
+            for name, stats in self.passes.iteritems():
+                lines.append('%-12s %6s %10.6f %14s %10s' % (
+                    name, stats['runs'], stats['seconds'],
+                    '%s->%s' % (stats['instructions_before'],
+                                stats['instructions_after']),
+                    '%s->%s' % (stats['blocks_before'],
+                                stats['blocks_after'])))
+        return '\n'.join(lines)
+
+
+class TimedPhase(object):
+
+    def __init__(self, timings, name):
+        """Context manager timing a phase. Look @Timings.phase
+
+        """
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.timings.start(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings.stop()
+        return False
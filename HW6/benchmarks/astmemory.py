@@ -0,0 +1,95 @@
+"""Measure the memory taken by the AST of large programs.
+
+Usage:
+    python benchmarks/astmemory.py [-sizes N,N,...] [-functions F]
+                                   [-tree DIR]
+
+Every size is a generated program (look @genproto) with F functions
+(default: 20) of N statements each. It is parsed and checked in a fresh
+interpreter, and the growth of the peak memory (KB) over parsing and the
+wellformed checks is printed, with the number of AST nodes and the bytes
+per node. -tree DIR measures the compiler in another checkout of HW6 (such
+as a git worktree of an older commit), to compare against.
+"""
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HW6 = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+from genproto import generate
+
+# Child process: parse and check a program read from stdin, then report
+# the peak memory before and after, and the number of AST nodes
+CHILD = '''
+import gc, json, resource, sys
+sys.path.insert(0, '.')
+from AbstractSyntaxTree import count_nodes
+from Compiler import load_frontend
+from Diagnostics import Diagnostics
+from proto5lexer import tokenize, token_function
+text = sys.stdin.read()
+lexer, parser = load_frontend()
+diagnostics = Diagnostics('<generated>', text)
+lexer.proto_classes = set()
+lexer.proto_errors = 0
+lexer.proto_diagnostics = diagnostics
+lexer.lineno = 0
+parser.proto_errors = 0
+gc.collect()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+program = parser.parse(lexer=lexer,
+                       tokenfunc=token_function(tokenize(lexer, text)))
+if not program.wellformed(diagnostics):
+    raise SystemExit(str(diagnostics))
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print json.dumps([count_nodes(program), after - before])
+'''
+
+
+def measure(text, tree):
+    """Parse and check a program in a new interpreter
+
+    Arguments:
+    text - program source string
+    tree - directory of the compiler to run
+
+    Return:
+    (number of AST nodes, peak memory growth in KB)
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD], cwd=tree,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    out, err = p.communicate(text)
+    if p.returncode != 0:
+        raise RuntimeError(out + err)
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def main(sizes, functions, tree):
+    print '%12s %12s %12s %12s' % ('statements', 'ast nodes', 'peak KB',
+                                   'bytes/node')
+    for size in sizes:
+        text = generate(functions=functions, statements=size, classes=0)
+        nodes, kb = measure(text, tree)
+        print '%12s %12s %12s %12.1f' % (size, nodes, kb,
+                                         kb * 1024.0 / max(nodes, 1))
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, functions, tree = [250, 500, 1000, 2000], 20, HW6
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-functions':
+            functions = int(value)
+        elif flag == '-tree':
+            tree = os.path.abspath(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, functions, tree)
@@ -0,0 +1,81 @@
+"""Measure how the backend scales with worker processes.
+
+Usage:
+    python benchmarks/backend.py [-jobs N,N,...] [-functions F]
+                                 [-statements S] [-live L] [-repeat R]
+
+Compiles a generated program (look @genproto) of F functions (default:
+32) of S statements (default: 40) over L variables (default: 12) with
+each number of backend jobs, and prints the fastest wall time of the
+backend (every phase after gencode) of R compiles (default: 3), and the speedup
+over the first number of jobs. The assembly must be the same for all.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from genproto import generate
+from Compiler import CompileOptions, compile_source
+
+# Phases before the backend, the rest are summed
+FRONTEND = ['cache', 'lex', 'parse', 'wellformed', 'gencode']
+
+
+def backend_time(text, jobs, repeat):
+    """Compile a program and time its backend
+
+    Arguments:
+    text - program source string
+    jobs - number of backend jobs
+    repeat - number of compiles
+
+    Return:
+    (seconds, assembly string)
+
+    """
+    best = None
+    for i in xrange(repeat):
+        result = compile_source(text, CompileOptions(backend_jobs=jobs))
+        if not result.ok:
+            raise SystemExit(str(result.diagnostics))
+        # Phases are timed without the phases nested in them
+        seconds = sum([t for name, t in result.timings.phases.iteritems()
+                       if name not in FRONTEND])
+        best = seconds if best is None else min(best, seconds)
+    return best, result.asm
+
+
+def main(jobs, functions, statements, live, repeat):
+    text = generate(functions=functions, statements=statements, live=live,
+                    classes=0)
+    print '%8s %12s %8s' % ('jobs', 'seconds', 'speedup')
+    first, asm = None, None
+    for n in jobs:
+        seconds, out = backend_time(text, n, repeat)
+        if asm is not None and out != asm:
+            raise SystemExit('different assembly with %s jobs' % n)
+        first, asm = first or seconds, out
+        print '%8s %12.4f %8.2f' % (n, seconds, first / seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    jobs, functions, statements, live, repeat = [1, 2, 4], 32, 40, 12, 3
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-jobs':
+            jobs = [int(x) for x in value.split(',')]
+        elif flag == '-functions':
+            functions = int(value)
+        elif flag == '-statements':
+            statements = int(value)
+        elif flag == '-live':
+            live = int(value)
+        elif flag == '-repeat':
+            repeat = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(jobs, functions, statements, live, repeat)
@@ -0,0 +1,76 @@
+"""Measure how the well formed checks scale with class hierarchy depth.
+
+Usage:
+    python benchmarks/classes.py [-sizes N,N,...] [-calls C]
+
+Every size is a program with a chain of N classes, each extending the last
+one, where only the first class declares a method taking an object. main
+makes C calls (default: 2000) of the method on an object of the last
+class, so every call is resolved through the whole chain. Only the
+wellformed phase is timed.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from scaling import growth
+from scopes import wellformed_time
+
+
+def generate(depth, calls):
+    """Generate a program with a deep class hierarchy
+
+    Arguments:
+    depth - number of classes
+    calls - number of method calls in main
+
+    Return:
+    program source string
+
+    """
+    lines = ['class C0 {', 'int x0;', 'int get(C0 o) {',
+             'return o.x0 + this.x0;', '}', '}']
+    for n in xrange(1, depth):
+        lines.append('class C%s extends C%s {' % (n, n - 1))
+        lines.append('int x%s;' % n)
+        lines.append('}')
+    last = depth - 1
+    lines.append('void main() {')
+    lines.append('C%s c;' % last)
+    lines.append('int s;')
+    lines.append('c = new C%s();' % last)
+    lines.append('c.x0 = 1;')
+    lines.append('s = 0;')
+    lines.extend(['s = s + c.get(c);'] * calls)
+    lines.append('print(s);')
+    lines.append('return;')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def main(sizes, calls):
+    print '%12s %12s %8s' % ('classes', 'seconds', 'growth')
+    last = None
+    for size in sizes:
+        seconds = wellformed_time(generate(size, calls))
+        k = None
+        if last is not None:
+            k = growth(last[0], last[1], size, seconds)
+        print '%12s %12.4f %8s' % (size, seconds,
+                                   '-' if k is None else '%.2f' % k)
+        last = (size, seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, calls = [25, 50, 100, 200], 2000
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-calls':
+            calls = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, calls)
@@ -0,0 +1,65 @@
+"""Measure how the well formed checks scale with expression depth.
+
+Usage:
+    python benchmarks/expressions.py [-sizes N,N,...] [-statements S]
+
+Every size is a program whose main has S (default: 20) assignments of an
+arithmetic expression nested N operators deep. Only the wellformed phase is
+timed.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from scaling import growth
+from scopes import wellformed_time
+
+
+def generate(depth, statements):
+    """Generate a program with deeply nested expressions
+
+    Arguments:
+    depth - number of operators in every expression
+    statements - number of assignments
+
+    Return:
+    program source string
+
+    """
+    e = 'a'
+    for n in xrange(depth):
+        e = '(%s %s %s)' % (e, '+-*'[n % 3], 'b' if n % 2 == 0 else n)
+    lines = ['void main() {', 'int a, b, c;', 'a = 1;', 'b = 2;']
+    lines.extend(['c = %s;' % e] * statements)
+    lines.extend(['print(c);', 'return;', '}'])
+    return '\n'.join(lines) + '\n'
+
+
+def main(sizes, statements):
+    print '%12s %12s %8s' % ('depth', 'seconds', 'growth')
+    last = None
+    for size in sizes:
+        seconds = wellformed_time(generate(size, statements))
+        k = None
+        if last is not None:
+            k = growth(last[0], last[1], size, seconds)
+        print '%12s %12.4f %8s' % (size, seconds,
+                                   '-' if k is None else '%.2f' % k)
+        last = (size, seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, statements = [100, 200, 400, 800], 20
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-statements':
+            statements = int(value)
+        else:
+            raise SystemExit(__doc__)
+    # The checks recurse once per operator
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * max(sizes)))
+    main(sizes, statements)
@@ -0,0 +1,230 @@
+"""Generate synthetic proto programs for compile time benchmarks.
+
+Usage:
+    python benchmarks/genproto.py [-functions N] [-statements M] [-depth D]
+                                  [-live L] [-classes C] [-seed S]
+
+The program is written to stdout. Every size knob stresses a different
+part of the compiler:
+
+    -functions   number of functions (each calls the ones before it)
+    -statements  statements per function
+    -depth       nesting depth of for/if/while blocks
+    -live        variables per function which are all live until the return
+    -classes     depth of a chain of classes, each extending the last one
+"""
+import random
+import sys
+
+DEFAULTS = {
+    'functions': 4,
+    'statements': 20,
+    'depth': 2,
+    'live': 6,
+    'classes': 2,
+    'seed': 0,
+}
+
+
+class Generator(object):
+
+    def __init__(self, functions=4, statements=20, depth=2, live=6,
+                 classes=2, seed=0):
+        """Synthetic proto program generator. Look @generate
+
+        """
+        self.functions = functions
+        self.statements = statements
+        self.depth = depth
+        self.live = max(live, 1)
+        self.classes = classes
+        self.random = random.Random(seed)
+        self.lines = []
+        self.indent = 0
+        # Counter for unique loop / block variable names
+        self.counter = 0
+
+    def emit(self, line):
+        self.lines.append('%s%s' % ('    ' * self.indent, line))
+
+    def variable(self):
+        return 'v%s' % self.random.randrange(self.live)
+
+    def expression(self, size=3):
+        """Return a random integer expression over the live variables
+
+        """
+        e = self.variable()
+        for i in xrange(self.random.randrange(1, size + 1)):
+            operand = self.random.choice([self.variable(),
+                                          str(self.random.randrange(100))])
+            e = '%s %s %s' % (e, self.random.choice('+-*'), operand)
+        return e
+
+    def statement(self, function, depth):
+        """Emit one statement, nesting blocks until depth is 0
+
+        Arguments:
+        function - number of the function being generated
+        depth - how many more blocks may be nested
+
+        """
+        kinds = ['assign', 'assign', 'assign']
+        if function > 0:
+            kinds.append('call')
+        if depth > 0:
+            kinds.extend(['for', 'if', 'while', 'block'])
+        kind = self.random.choice(kinds)
+        if kind == 'assign':
+            self.emit('%s = %s;' % (self.variable(), self.expression()))
+        elif kind == 'call':
+            callee = self.random.randrange(function)
+            self.emit('%s = f%s(%s, %s);' % (self.variable(), callee,
+                                             self.variable(), self.variable()))
+        elif kind == 'for':
+            i = 'i%s' % self.counter
+            self.counter += 1
+            self.emit('{')
+            self.indent += 1
+            self.emit('int %s;' % i)
+            self.emit('for (%s = 0; %s < %s; %s = %s + 1) {' % (
+                i, i, self.random.randrange(2, 5), i, i))
+            self.nested(function, depth)
+            self.emit('}')
+            self.indent -= 1
+            self.emit('}')
+        elif kind == 'if':
+            self.emit('if %s < %s then {' % (self.variable(), self.expression(1)))
+            self.nested(function, depth)
+            self.emit('} else {')
+            self.nested(function, depth)
+            self.emit('}')
+        elif kind == 'while':
+            w = 'w%s' % self.counter
+            self.counter += 1
+            self.emit('{')
+            self.indent += 1
+            self.emit('int %s;' % w)
+            self.emit('%s = %s;' % (w, self.random.randrange(1, 4)))
+            self.emit('while %s > 0 do {' % w)
+            self.nested(function, depth)
+            self.indent += 1
+            self.emit('%s = %s - 1;' % (w, w))
+            self.indent -= 1
+            self.emit('}')
+            self.indent -= 1
+            self.emit('}')
+        else:
+            t = 't%s' % self.counter
+            self.counter += 1
+            self.emit('{')
+            self.indent += 1
+            self.emit('int %s;' % t)
+            self.emit('%s = %s;' % (t, self.expression()))
+            self.emit('%s = %s + %s;' % (self.variable(), t, self.variable()))
+            self.indent -= 1
+            self.emit('}')
+
+    def nested(self, function, depth):
+        self.indent += 1
+        for i in xrange(self.random.randrange(1, 3)):
+            self.statement(function, depth - 1)
+        self.indent -= 1
+
+    def function(self, n):
+        self.emit('int f%s(int a, int b) {' % n)
+        self.indent += 1
+        self.emit('int %s;' % ', '.join(['v%s' % i for i in xrange(self.live)]))
+        for i in xrange(self.live):
+            self.emit('v%s = %s;' % (i, 'a' if i % 2 == 0 else 'b'))
+        for i in xrange(self.statements):
+            self.statement(n, self.depth)
+        # Keep every variable live until the end
+        self.emit('return %s;' % ' + '.join(['v%s' % i for i in xrange(self.live)]))
+        self.indent -= 1
+        self.emit('}')
+        self.emit('')
+
+    def hierarchy(self):
+        for n in xrange(self.classes):
+            if n == 0:
+                self.emit('class C0 {')
+            else:
+                self.emit('class C%s extends C%s {' % (n, n - 1))
+            self.indent += 1
+            self.emit('int x%s;' % n)
+            self.emit('int get%s(int a) {' % n)
+            self.indent += 1
+            if n == 0:
+                self.emit('return this.x0 + a;')
+            else:
+                self.emit('return this.get%s(a) + this.x%s;' % (n - 1, n))
+            self.indent -= 1
+            self.emit('}')
+            self.indent -= 1
+            self.emit('}')
+            self.emit('')
+
+    def main(self):
+        self.emit('void main() {')
+        self.indent += 1
+        if self.classes > 0:
+            last = self.classes - 1
+            self.emit('C%s c;' % last)
+            self.emit('c = new C%s();' % last)
+            for n in xrange(self.classes):
+                self.emit('c.x%s = %s;' % (n, n))
+            self.emit('print(c.get%s(1));' % last)
+        for n in xrange(self.functions):
+            self.emit('print(f%s(%s, %s));' % (n, n, n + 1))
+        self.emit('return;')
+        self.indent -= 1
+        self.emit('}')
+
+    def generate(self):
+        """Generate a program
+
+        Return:
+        program source string
+
+        """
+        self.lines = []
+        self.hierarchy()
+        for n in xrange(self.functions):
+            self.function(n)
+        self.main()
+        return '\n'.join(self.lines) + '\n'
+
+
+def generate(**kwargs):
+    """Generate a program, look @Generator for the size keywords
+
+    Return:
+    program source string
+
+    """
+    return Generator(**kwargs).generate()
+
+
+def parse_args(argv, defaults):
+    """Parse -name value pairs
+
+    Arguments:
+    argv - list of arguments
+    defaults - dictionary of name -> default integer value
+
+    Return:
+    dictionary of name -> value
+
+    """
+    values = dict(defaults)
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if not flag.startswith('-') or flag[1:] not in defaults:
+            raise SystemExit(__doc__)
+        values[flag[1:]] = type(defaults[flag[1:]])(value)
+    return values
+
+if __name__ == '__main__':
+    sys.stdout.write(generate(**parse_args(sys.argv[1:], DEFAULTS)))
@@ -0,0 +1,92 @@
+"""Time the backend phases on their own, from written intermediate code.
+
+Usage:
+    python benchmarks/irphases.py [-functions F] [-statements S] [-live L]
+                                  [-repeat R]
+
+Writes the intermediate code of a generated program (look @genproto) of F
+functions (default: 32) of S statements (default: 40) over L variables
+(default: 12) after each phase of IRText.PHASES, and compiles it R times
+(default: 3) from there. Prints the fastest time of every phase, next to
+the same phases of a compile from source. The assembly must be the same
+for all.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from genproto import generate
+from Compiler import CompileOptions, compile_ir, compile_source
+import IRText
+
+
+def best_phases(compile, repeat):
+    """Compile R times and keep the fastest time of every phase
+
+    Arguments:
+    compile - function returning a CompileResult
+    repeat - number of compiles
+
+    Return:
+    (dictionary of phase -> seconds, assembly string)
+
+    """
+    best = {}
+    for i in xrange(repeat):
+        result = compile()
+        if not result.ok:
+            raise SystemExit(str(result.diagnostics))
+        for name, seconds in result.timings.phases.iteritems():
+            best[name] = min(best.get(name, seconds), seconds)
+    return best, result.asm
+
+
+def main(functions, statements, live, repeat):
+    text = generate(functions=functions, statements=statements, live=live,
+                    classes=0)
+    runs = [('source', lambda: compile_source(text))]
+    for phase in IRText.PHASES:
+        ir = compile_source(text, CompileOptions(emit_ir=phase)).ir
+        print 'after %-12s %8d bytes of intermediate code' % (phase, len(ir))
+        runs.append((phase, lambda ir=ir: compile_ir(ir)))
+    timings = []
+    asm = None
+    for name, compile in runs:
+        best, out = best_phases(compile, repeat)
+        if asm is not None and out != asm:
+            raise SystemExit('different assembly from %s' % name)
+        asm = out
+        timings.append(best)
+    phases = sorted(set([p for best in timings for p in best]))
+    print
+    print '%-20s' % 'phase' + ''.join(['%14s' % n for n, c in runs])
+    for phase in phases + ['total']:
+        row = []
+        for best in timings:
+            if phase == 'total':
+                row.append('%14.4f' % sum(best.values()))
+            elif phase in best:
+                row.append('%14.4f' % best[phase])
+            else:
+                row.append('%14s' % '-')
+        print '%-20s' % phase + ''.join(row)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    functions, statements, live, repeat = 32, 40, 12, 3
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-functions':
+            functions = int(value)
+        elif flag == '-statements':
+            statements = int(value)
+        elif flag == '-live':
+            live = int(value)
+        elif flag == '-repeat':
+            repeat = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(functions, statements, live, repeat)
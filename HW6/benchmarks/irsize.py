@@ -0,0 +1,104 @@
+"""Measure the memory taken by the intermediate code of large programs.
+
+Usage:
+    python benchmarks/irsize.py [-functions N,N,...] [-statements S]
+                                [-live L] [-tree DIR]
+
+Every size is a generated program (look @genproto) of N functions
+(default: 10 and 40) of S statements (default: 40) over L variables
+(default: 12). In a fresh interpreter it is parsed and checked, and the
+growth of the peak memory over generating the intermediate code, and over
+registerizing it (liveness, interference graphs and spills) is printed in
+bytes per instruction. -tree DIR measures the compiler in another checkout
+of HW6 (such as a git worktree of an older commit), to compare against.
+"""
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HW6 = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+from genproto import generate
+
+# Child process: generate and registerize the code of a program read from
+# stdin, and report the number of instructions and the peak memory growth
+# of both
+CHILD = '''
+import gc, json, resource, sys
+sys.path.insert(0, '.')
+from Compiler import load_frontend
+from Diagnostics import Diagnostics
+from proto5lexer import tokenize, token_function
+text = sys.stdin.read()
+lexer, parser = load_frontend()
+diagnostics = Diagnostics('<generated>', text)
+lexer.proto_classes = set()
+lexer.proto_errors = 0
+lexer.proto_diagnostics = diagnostics
+lexer.lineno = 0
+parser.proto_errors = 0
+program = parser.parse(lexer=lexer,
+                       tokenfunc=token_function(tokenize(lexer, text)))
+if not program.wellformed(diagnostics):
+    raise SystemExit(str(diagnostics))
+gc.collect()
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+before = peak()
+icc = program.gencode()
+generated = peak()
+count = sum([len(b.instructions) for b in icc.blocks])
+icc.registerize(ssa=True)
+print json.dumps([count, generated - before, peak() - generated])
+'''
+
+
+def measure(text, tree):
+    """Generate and registerize a program in a new interpreter
+
+    Arguments:
+    text - program source string
+    tree - directory of the compiler to run
+
+    Return:
+    (number of instructions, gencode KB, registerize KB)
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD], cwd=tree,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    out, err = p.communicate(text)
+    if p.returncode != 0:
+        raise RuntimeError(out + err)
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def main(sizes, statements, live, tree):
+    print '%10s %14s %14s %16s' % ('functions', 'instructions',
+                                   'gencode B/ins', 'registerize B/ins')
+    for n in sizes:
+        text = generate(functions=n, statements=statements, live=live,
+                        classes=0)
+        count, gencode, registerize = measure(text, tree)
+        print '%10s %14s %14.0f %16.0f' % (n, count, gencode * 1024.0 / count,
+                                           registerize * 1024.0 / count)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, statements, live, tree = [10, 40], 40, 12, HW6
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-functions':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-statements':
+            statements = int(value)
+        elif flag == '-live':
+            live = int(value)
+        elif flag == '-tree':
+            tree = os.path.abspath(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, statements, live, tree)
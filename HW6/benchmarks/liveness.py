@@ -0,0 +1,120 @@
+"""Measure liveness analysis on functions with many temporaries.
+
+Usage:
+    python benchmarks/liveness.py [-sizes N,N,...] [-live L] [-depth D]
+                                  [-tree DIR]
+
+Every size is a generated program (look @genproto) with one function of N
+statements over L variables (default: 50), nested up to D blocks deep
+(default: 2). Its intermediate code is generated and mipsified in a fresh
+interpreter, and only ICContext.update_liveliness is run and timed, with
+the growth of the peak memory (KB) while it runs. -tree DIR measures the
+compiler in another checkout of HW6, to compare against.
+"""
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HW6 = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+from genproto import generate
+from scaling import growth
+
+# Child process: generate the code of a program read from stdin, and
+# report its size, and the time and peak memory growth of liveness
+CHILD = '''
+import gc, json, resource, sys, time
+sys.path.insert(0, '.')
+from Compiler import load_frontend
+from Diagnostics import Diagnostics
+from proto5lexer import tokenize, token_function
+text = sys.stdin.read()
+lexer, parser = load_frontend()
+diagnostics = Diagnostics('<generated>', text)
+lexer.proto_classes = set()
+lexer.proto_errors = 0
+lexer.proto_diagnostics = diagnostics
+lexer.lineno = 0
+parser.proto_errors = 0
+program = parser.parse(lexer=lexer,
+                       tokenfunc=token_function(tokenize(lexer, text)))
+if not program.wellformed(diagnostics):
+    raise SystemExit(str(diagnostics))
+icc = program.gencode()
+runs = []
+for name, blocks in icc.functions():
+    icc.set_function(name)
+    icc.mipsify(blocks)
+    runs.extend([(name, b.get_root_and_children()) for b in blocks
+                 if len(b.precede) == 0])
+instructions = sum([len(b.instructions) for n, r in runs for b in r])
+variables = 0
+gc.collect()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.time()
+for name, blocks in runs:
+    icc.set_function(name)
+    icc.update_liveliness(blocks)
+    variables = max(variables, len(icc.liveliness_graph.nodes()))
+seconds = time.time() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print json.dumps([instructions, variables, seconds, after - before])
+'''
+
+
+def measure(text, tree):
+    """Run liveness on a program in a new interpreter
+
+    Arguments:
+    text - program source string
+    tree - directory of the compiler to run
+
+    Return:
+    (IC instructions, variables, seconds, peak memory growth in KB)
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD], cwd=tree,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    out, err = p.communicate(text)
+    if p.returncode != 0:
+        raise RuntimeError(out + err)
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def main(sizes, live, depth, tree):
+    print '%12s %12s %10s %10s %10s %8s' % ('statements', 'instructions',
+                                            'variables', 'seconds',
+                                            'peak KB', 'growth')
+    last = None
+    for size in sizes:
+        text = generate(functions=1, statements=size, live=live,
+                        depth=depth, classes=0)
+        instructions, variables, seconds, kb = measure(text, tree)
+        k = None
+        if last is not None:
+            k = growth(last[0], last[1], size, seconds)
+        print '%12s %12s %10s %10.4f %10s %8s' % (
+            size, instructions, variables, seconds, kb,
+            '-' if k is None else '%.2f' % k)
+        last = (size, seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, live, depth, tree = [50, 100, 200, 400], 50, 2, HW6
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-live':
+            live = int(value)
+        elif flag == '-depth':
+            depth = int(value)
+        elif flag == '-tree':
+            tree = os.path.abspath(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, live, depth, tree)
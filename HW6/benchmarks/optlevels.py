@@ -0,0 +1,99 @@
+"""Trade compile time against code size over the optimization levels.
+
+Usage:
+    python benchmarks/optlevels.py [-functions F] [-statements S]
+                                   [-live L] [-repeat R]
+
+Compiles a generated program (look @genproto) of F functions (default:
+16) of S statements (default: 40) over L variables (default: 12) at every
+optimization level (look @PassManager), and prints the fastest backend
+time (every phase after gencode) of R compiles (default: 3), the number of
+assembly instructions, and the time and instructions before and after each
+pass of the last compile.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from genproto import generate
+from Compiler import CompileOptions, compile_source
+from PassManager import LEVELS
+
+# Phases before the backend, the rest are summed
+FRONTEND = ['cache', 'lex', 'parse', 'wellformed', 'gencode']
+
+
+def count_instructions(asm):
+    """Return the number of instructions of an assembly string, without
+    labels, directives and comments
+
+    """
+    count = 0
+    for line in asm.splitlines():
+        line = line.split('#')[0].strip()
+        if line and not line.endswith(':') and not line.startswith('.'):
+            count += 1
+    return count
+
+
+def compile_level(text, level, repeat):
+    """Compile a program at an optimization level
+
+    Arguments:
+    text - program source string
+    level - optimization level
+    repeat - number of compiles
+
+    Return:
+    (fastest backend seconds, CompileResult of the last compile)
+
+    """
+    best = None
+    for i in xrange(repeat):
+        result = compile_source(text, CompileOptions(opt_level=level))
+        if not result.ok:
+            raise SystemExit(str(result.diagnostics))
+        # Phases are timed without the phases nested in them
+        seconds = sum([t for name, t in result.timings.phases.iteritems()
+                       if name not in FRONTEND])
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def main(functions, statements, live, repeat):
+    text = generate(functions=functions, statements=statements, live=live,
+                    classes=0)
+    results = []
+    print '%6s %12s %14s' % ('level', 'seconds', 'instructions')
+    for level in LEVELS:
+        seconds, result = compile_level(text, level, repeat)
+        results.append(result)
+        print '%6s %12.4f %14s' % ('-O%s' % level, seconds,
+                                   count_instructions(result.asm))
+    for level, result in zip(LEVELS, results):
+        print
+        print '-O%s' % level
+        print '%-12s %10s %20s' % ('pass', 'seconds', 'instructions')
+        for name, stats in result.timings.passes.iteritems():
+            print '%-12s %10.4f %20s' % (name, stats['seconds'], '%s -> %s' % (
+                stats['instructions_before'], stats['instructions_after']))
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    functions, statements, live, repeat = 16, 40, 12, 3
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-functions':
+            functions = int(value)
+        elif flag == '-statements':
+            statements = int(value)
+        elif flag == '-live':
+            live = int(value)
+        elif flag == '-repeat':
+            repeat = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(functions, statements, live, repeat)
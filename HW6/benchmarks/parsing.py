@@ -0,0 +1,101 @@
+"""Measure parser throughput on long lists.
+
+Usage:
+    python benchmarks/parsing.py [-sizes N,N,...] [-shape SHAPE]
+
+Every size is a program made of one long list, by SHAPE (default: all):
+    body - a function of N statements (look @genproto)
+    globals - N global variable declarations
+    varlist - a single global declaration of N variables
+The program is lexed first, and only the parse is timed. Prints the tokens
+parsed per second, and how fast the parse time grows.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+import genproto
+from Compiler import load_frontend
+from Diagnostics import Diagnostics
+from proto5lexer import tokenize, token_function
+from scaling import growth
+
+MAIN = 'void main() {\nreturn;\n}\n'
+
+
+def generate(shape, size):
+    """Generate a program with one long list
+
+    Arguments:
+    shape - 'body', 'globals' or 'varlist'
+    size - length of the list
+
+    Return:
+    program source string
+
+    """
+    if shape == 'body':
+        return genproto.generate(functions=1, statements=size, classes=0)
+    if shape == 'globals':
+        return ''.join(['int g%s;\n' % i for i in xrange(size)]) + MAIN
+    if shape == 'varlist':
+        return 'int %s;\n' % ', '.join(['g%s' % i
+                                        for i in xrange(size)]) + MAIN
+    raise ValueError(shape)
+
+
+def parse_time(text):
+    """Lex a program, and time its parse
+
+    Arguments:
+    text - program source string
+
+    Return:
+    (number of tokens, seconds)
+
+    """
+    lexer, parser = load_frontend()
+    lexer.proto_classes = set()
+    lexer.proto_errors = 0
+    lexer.proto_diagnostics = Diagnostics('<generated>', text)
+    lexer.lineno = 0
+    parser.proto_errors = 0
+    tokens = tokenize(lexer, text)
+    start = time.time()
+    parser.parse(lexer=lexer, tokenfunc=token_function(tokens))
+    return len(tokens), time.time() - start
+
+
+def main(sizes, shapes):
+    print '%8s %12s %12s %12s %12s %8s' % ('shape', 'size', 'tokens',
+                                           'seconds', 'tokens/sec',
+                                           'growth')
+    for shape in shapes:
+        last = None
+        for size in sizes:
+            tokens, seconds = parse_time(generate(shape, size))
+            k = None
+            if last is not None:
+                k = growth(last[0], last[1], size, seconds)
+            print '%8s %12s %12s %12.4f %12.0f %8s' % (
+                shape, size, tokens, seconds, tokens / max(seconds, 1e-9),
+                '-' if k is None else '%.2f' % k)
+            last = (size, seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, shapes = [5000, 10000, 20000, 40000], ['body', 'globals',
+                                                   'varlist']
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-shape':
+            shapes = [value]
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, shapes)
@@ -0,0 +1,128 @@
+"""Measure how compile time and memory scale with program size.
+
+Usage:
+    python benchmarks/scaling.py [-vary KNOB] [-sizes N,N,...] [-json FILE]
+                                 [-functions N] [-statements M] [-depth D]
+                                 [-live L] [-classes C] [-seed S]
+
+Programs are made by benchmarks/genproto.py. KNOB (default: statements) is
+set to each of the sizes in turn, while the other knobs keep their values.
+Every size is compiled in a fresh interpreter, so the peak memory of each
+phase is not hidden by the previous compiles.
+
+Prints the seconds and peak memory (KB) after each phase for every size,
+and the growth exponent of each phase between the last two sizes: about 1
+is linear, 2 quadratic. -json FILE also saves all timings and counters.
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HW6 = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+import genproto
+
+# Child process: generate a program and compile it with timings
+CHILD = '''
+import json, sys
+sys.path.insert(0, 'benchmarks')
+import genproto
+from Compiler import CompileOptions, compile_source
+text = genproto.generate(**json.loads(sys.argv[1]))
+result = compile_source(text, CompileOptions(timings=True))
+if not result.ok:
+    raise SystemExit(str(result.diagnostics))
+timings = result.timings.to_dict()
+timings['lines'] = text.count('\\n')
+print json.dumps(timings)
+'''
+
+
+def measure(knobs):
+    """Compile a generated program in a new interpreter
+
+    Arguments:
+    knobs - dictionary of genproto size knobs
+
+    Return:
+    dictionary of timings, look @Timings.to_dict
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD, json.dumps(knobs)],
+                         cwd=HW6, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0:
+        raise RuntimeError(out + err)
+    return json.loads(out.strip().split('\n')[-1],
+                      object_pairs_hook=OrderedDict)
+
+
+def growth(x1, y1, x2, y2):
+    """Exponent k of y = c * x^k through two points (None if unknown)
+
+    """
+    if x1 <= 0 or x2 <= x1 or y1 <= 0 or y2 <= 0:
+        return None
+    return math.log(y2 / y1) / math.log(float(x2) / x1)
+
+
+def main(vary, sizes, knobs, json_file=None):
+    results = []
+    for size in sizes:
+        knobs = dict(knobs)
+        knobs[vary] = size
+        sys.stderr.write('%s = %s\n' % (vary, size))
+        results.append(measure(knobs))
+    # Phases in order of first appearance
+    phases = []
+    for r in results:
+        phases.extend([p for p in r['phases'] if p not in phases])
+    header = '%-20s' % vary + ''.join(['%12s' % s for s in sizes]) + '%8s' % 'growth'
+    print header
+    print '%-20s' % 'lines' + ''.join(['%12s' % r['lines'] for r in results])
+    print '%-20s' % 'ic_instructions' + ''.join(
+        ['%12s' % r['counters'].get('ic_instructions', '-') for r in results])
+    print
+    print 'seconds'
+    for phase in phases + ['total']:
+        if phase == 'total':
+            times = [r['total'] for r in results]
+        else:
+            times = [r['phases'].get(phase, 0.0) for r in results]
+        k = None
+        if len(sizes) > 1:
+            k = growth(sizes[-2], times[-2], sizes[-1], times[-1])
+        print '%-20s' % phase + ''.join(['%12.4f' % t for t in times]) + (
+            '%8.2f' % k if k is not None else '%8s' % '-')
+    print
+    print 'peak memory (KB)'
+    for phase in phases:
+        print '%-20s' % phase + ''.join(
+            ['%12s' % r['memory'].get(phase, '-') for r in results])
+    if json_file is not None:
+        out = open(json_file, 'w')
+        out.write(json.dumps({'vary': vary, 'sizes': sizes, 'knobs': knobs,
+                              'results': results}, indent=2))
+        out.close()
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    vary, sizes, json_file = 'statements', [10, 20, 40, 80], None
+    rest = []
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-vary':
+            vary = value
+        elif flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-json':
+            json_file = value
+        else:
+            rest.extend([flag, value])
+    if len(argv) % 2 != 0 or vary not in genproto.DEFAULTS:
+        raise SystemExit(__doc__)
+    main(vary, sizes, genproto.parse_args(rest, genproto.DEFAULTS), json_file)
@@ -0,0 +1,100 @@
+"""Measure how the well formed checks scale with the number of scopes.
+
+Usage:
+    python benchmarks/scopes.py [-sizes N,N,...] [-variables V] [-depth D]
+
+Every size is a program whose main declares V variables (default: 500)
+followed by N blocks, each nesting D blocks (default: 4) which shadow one
+of the variables. Only the wellformed phase is timed.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from Compiler import load_frontend
+from Diagnostics import Diagnostics
+from proto5lexer import tokenize, token_function
+from scaling import growth
+
+
+def generate(blocks, variables, depth):
+    """Generate a program with many scopes
+
+    Arguments:
+    blocks - number of outer blocks
+    variables - variables declared in main
+    depth - nesting depth of every block
+
+    Return:
+    program source string
+
+    """
+    lines = ['void main() {']
+    lines.append('int %s;' % ', '.join(['v%s' % i for i in xrange(variables)]))
+    lines.extend(['v%s = %s;' % (i, i) for i in xrange(variables)])
+    for b in xrange(blocks):
+        v = 'v%s' % (b % variables)
+        for d in xrange(depth):
+            lines.append('{ int %s; %s = %s;' % (v, v, d))
+        lines.append('print(%s);' % v)
+        lines.append('}' * depth)
+    lines.append('return;')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def wellformed_time(text):
+    """Parse a program and time its wellformed checks
+
+    Arguments:
+    text - program source string
+
+    Return:
+    seconds
+
+    """
+    lexer, parser = load_frontend()
+    diagnostics = Diagnostics('<generated>', text)
+    lexer.proto_classes = set()
+    lexer.proto_errors = 0
+    lexer.proto_diagnostics = diagnostics
+    lexer.lineno = 0
+    parser.proto_errors = 0
+    program = parser.parse(lexer=lexer,
+                           tokenfunc=token_function(tokenize(lexer, text)))
+    start = time.time()
+    if not program.wellformed(diagnostics):
+        raise SystemExit(str(diagnostics))
+    return time.time() - start
+
+
+def main(sizes, variables, depth):
+    print '%12s %12s %8s' % ('blocks', 'seconds', 'growth')
+    last = None
+    for size in sizes:
+        seconds = wellformed_time(generate(size, variables, depth))
+        k = None
+        if last is not None:
+            k = growth(last[0], last[1], size, seconds)
+        print '%12s %12.4f %8s' % (size, seconds,
+                                   '-' if k is None else '%.2f' % k)
+        last = (size, seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, variables, depth = [250, 500, 1000, 2000], 500, 4
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-variables':
+            variables = int(value)
+        elif flag == '-depth':
+            depth = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, variables, depth)
@@ -0,0 +1,106 @@
+"""Measure register allocation of programs which spill.
+
+Usage:
+    python benchmarks/spilling.py [-repeat R] [-tree DIR] [FILE ...]
+
+Every program (default: tests/spill_many.proto, and generated programs
+with 30 and 60 variables live at once) is compiled R times (default: 3) in
+a fresh interpreter, and the fastest time of the liveness, allocation and
+spill phases is printed, with the interference edges and spill rounds
+summed over all functions. -tree DIR measures the compiler in another
+checkout of HW6, to compare against.
+"""
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HW6 = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+from genproto import generate
+
+PHASES = ['update_liveliness', 'allocate_registers', 'spill_variable']
+
+# Child process: compile a program read from stdin with timings, and
+# report the fastest time of every phase, and the register allocation
+# counters of the last compile
+CHILD = '''
+import json, sys
+sys.path.insert(0, '.')
+from Compiler import CompileOptions, compile_source
+text = sys.stdin.read()
+repeat = int(sys.argv[1])
+best = {}
+for i in xrange(repeat):
+    result = compile_source(text, CompileOptions(timings=True))
+    if not result.ok:
+        raise SystemExit(str(result.diagnostics))
+    timings = result.timings.to_dict()
+    for name, seconds in timings['phases'].iteritems():
+        best[name] = min(best.get(name, seconds), seconds)
+counters = {}
+for function in timings['functions'].itervalues():
+    for name, value in function.iteritems():
+        counters[name] = counters.get(name, 0) + value
+print json.dumps([best, counters])
+'''
+
+
+def measure(text, repeat, tree):
+    """Compile a program in a new interpreter
+
+    Arguments:
+    text - program source string
+    repeat - number of compiles
+    tree - directory of the compiler to run
+
+    Return:
+    (dictionary of phase -> seconds, dictionary of counter -> value)
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD, str(repeat)],
+                         cwd=tree, stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate(text)
+    if p.returncode != 0:
+        raise RuntimeError(out + err)
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def main(programs, repeat, tree):
+    width = max([len(name) for name, text in programs])
+    print '%-*s %s %12s %12s' % (width, 'program', ' '.join(
+        ['%18s' % p for p in PHASES]), 'edges', 'spill rounds')
+    for name, text in programs:
+        phases, counters = measure(text, repeat, tree)
+        print '%-*s %s %12s %12s' % (width, name, ' '.join(
+            ['%18.4f' % phases.get(p, 0.0) for p in PHASES]),
+            counters.get('interference_edges', 0),
+            counters.get('spill_rounds', 0))
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    repeat, tree, files = 3, HW6, []
+    while len(argv) != 0:
+        if argv[0] in ('-repeat', '-tree') and len(argv) >= 2:
+            if argv[0] == '-repeat':
+                repeat = int(argv[1])
+            else:
+                tree = os.path.abspath(argv[1])
+            argv = argv[2:]
+        elif argv[0].startswith('-'):
+            raise SystemExit(__doc__)
+        else:
+            files.append(argv.pop(0))
+    if len(files) != 0:
+        programs = [(f, open(f, 'r').read()) for f in files]
+    else:
+        programs = [('tests/spill_many.proto',
+                     open(os.path.join(HW6, 'tests', 'spill_many.proto'),
+                          'r').read())]
+        for live in [30, 60]:
+            programs.append(('genproto -live %s' % live,
+                             generate(functions=2, statements=40,
+                                      live=live, classes=0)))
+    main(programs, repeat, tree)
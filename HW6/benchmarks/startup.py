@@ -0,0 +1,64 @@
+"""Compare cold and warm compiler startup with the lexer/parser table cache.
+
+Usage:
+    python benchmarks/startup.py [-runs N]
+
+Every measurement runs in a fresh interpreter, so module imports and table
+loading are paid for exactly like a real compiler invocation.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HW6 = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Child process: time building the lexer and parser from a cache directory
+CHILD = '''
+import sys, time
+start = time.time()
+import TableCache
+TableCache.load(sys.argv[1])
+print time.time() - start
+'''
+
+
+def startup_time(cache_dir):
+    """Time one lexer and parser build in a new interpreter
+
+    Arguments:
+    cache_dir - table cache directory
+
+    Return:
+    seconds
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD, cache_dir], cwd=HW6,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    if p.returncode != 0:
+        raise RuntimeError(err)
+    return float(out.strip().split('\n')[-1])
+
+
+def main(runs):
+    cold, warm = [], []
+    for i in xrange(runs):
+        cache_dir = tempfile.mkdtemp(prefix='proplasm5_tables_')
+        try:
+            cold.append(startup_time(cache_dir))
+            warm.append(startup_time(cache_dir))
+        finally:
+            shutil.rmtree(cache_dir)
+    print '%-6s %10s %10s' % ('', 'min (ms)', 'mean (ms)')
+    for name, times in (('cold', cold), ('warm', warm)):
+        print '%-6s %10.1f %10.1f' % (name, min(times) * 1000,
+                                      sum(times) / len(times) * 1000)
+    print 'speedup: %.1fx' % (min(cold) / min(warm))
+
+if __name__ == '__main__':
+    runs = 5
+    if len(sys.argv) == 3 and sys.argv[1] == '-runs':
+        runs = int(sys.argv[2])
+    main(runs)
@@ -0,0 +1,108 @@
+"""Measure the peak memory of compiling a program whole or streamed.
+
+Usage:
+    python benchmarks/streaming.py [-functions N,N,...] [-statements S]
+                                   [-live L]
+
+Every size is a generated program (look @genproto) of N functions
+(default: 8, 32 and 128) of S statements (default: 40) over L variables
+(default: 12). It is compiled in a fresh interpreter, once keeping the
+code of the whole program and once one function at a time (the -stream
+option). The growth of the peak memory (KB) is printed for both, split
+into the front end (tokens and AST, the same for both) and the backend
+(everything after the wellformed checks), with the wall time. The assembly
+must be the same.
+"""
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HW6 = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+from genproto import generate
+
+# Child process: compile a program read from stdin, writing the assembly
+# to a file, and report the peak memory growth of the front end and of the
+# backend, and the time
+CHILD = '''
+import gc, json, resource, sys, time
+sys.path.insert(0, '.')
+from Compiler import CompileOptions, compile_source, load_frontend
+text = sys.stdin.read()
+load_frontend()
+out = open(sys.argv[2], 'w')
+gc.collect()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.time()
+result = compile_source(text, CompileOptions(
+    timings=True, stream=sys.argv[1] == 'stream'), out=out)
+seconds = time.time() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if not result.ok:
+    raise SystemExit(str(result.diagnostics))
+out.write(result.asm)
+out.close()
+frontend = result.timings.memory['wellformed']
+print json.dumps([frontend - before, after - frontend, seconds])
+'''
+
+
+def measure(text, mode, path):
+    """Compile a program in a new interpreter
+
+    Arguments:
+    text - program source string
+    mode - 'whole' or 'stream'
+    path - file to write the assembly to
+
+    Return:
+    (front end KB, backend KB, seconds)
+
+    """
+    p = subprocess.Popen([sys.executable, '-c', CHILD, mode, path],
+                         cwd=HW6, stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate(text)
+    if p.returncode != 0:
+        raise RuntimeError(out + err)
+    return json.loads(out.strip().split('\n')[-1])
+
+
+def main(sizes, statements, live):
+    print '%10s %12s %12s %12s %10s %10s' % (
+        'functions', 'front KB', 'whole KB', 'stream KB', 'whole s',
+        'stream s')
+    paths = [os.path.join(HW6, 'streaming_%s.asm' % m)
+             for m in ['whole', 'stream']]
+    try:
+        for n in sizes:
+            text = generate(functions=n, statements=statements, live=live,
+                            classes=0)
+            whole = measure(text, 'whole', paths[0])
+            stream = measure(text, 'stream', paths[1])
+            if open(paths[0]).read() != open(paths[1]).read():
+                raise SystemExit('different assembly with %s functions' % n)
+            print '%10s %12s %12s %12s %10.2f %10.2f' % (
+                n, whole[0], whole[1], stream[1], whole[2], stream[2])
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, statements, live = [8, 32, 128], 40, 12
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-functions':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-statements':
+            statements = int(value)
+        elif flag == '-live':
+            live = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, statements, live)
@@ -0,0 +1,81 @@
+"""Measure how AST to intermediate code generation scales with the number
+of statements.
+
+Usage:
+    python benchmarks/traversal.py [-sizes N,N,...] [-depth D]
+
+Every size is a generated program (look @genproto) with one function of N
+statements, nested up to D blocks deep (default: 1). Only the gencode
+phase is timed, since register allocation of such a function takes much
+longer than the traversal itself.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+import genproto
+from AbstractSyntaxTree import count_nodes
+from Compiler import load_frontend
+from Diagnostics import Diagnostics
+from proto5lexer import tokenize, token_function
+from scaling import growth
+
+
+def gencode_time(statements, depth):
+    """Parse a generated program and time its gencode
+
+    Arguments:
+    statements - statements in the function
+    depth - nesting depth of blocks
+
+    Return:
+    (number of AST nodes, seconds)
+
+    """
+    text = genproto.generate(functions=1, statements=statements,
+                             depth=depth, classes=0)
+    lexer, parser = load_frontend()
+    diagnostics = Diagnostics('<generated>', text)
+    lexer.proto_classes = set()
+    lexer.proto_errors = 0
+    lexer.proto_diagnostics = diagnostics
+    lexer.lineno = 0
+    parser.proto_errors = 0
+    program = parser.parse(lexer=lexer,
+                           tokenfunc=token_function(tokenize(lexer, text)))
+    if not program.wellformed(diagnostics):
+        raise SystemExit(str(diagnostics))
+    start = time.time()
+    program.gencode()
+    return count_nodes(program), time.time() - start
+
+
+def main(sizes, depth):
+    print '%12s %12s %12s %8s' % ('statements', 'ast nodes', 'seconds',
+                                  'growth')
+    last = None
+    for size in sizes:
+        nodes, seconds = gencode_time(size, depth)
+        k = None
+        if last is not None:
+            k = growth(last[0], last[1], size, seconds)
+        print '%12s %12s %12.4f %8s' % (size, nodes, seconds,
+                                        '-' if k is None else '%.2f' % k)
+        last = (size, seconds)
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    sizes, depth = [2500, 5000, 10000, 20000, 40000], 1
+    if len(argv) % 2 != 0:
+        raise SystemExit(__doc__)
+    for flag, value in zip(argv[::2], argv[1::2]):
+        if flag == '-sizes':
+            sizes = [int(x) for x in value.split(',')]
+        elif flag == '-depth':
+            depth = int(value)
+        else:
+            raise SystemExit(__doc__)
+    main(sizes, depth)
@@ -2,90 +2,237 @@ try:
     import argparse
 except ImportError:
     argparse = None
+import glob
+import multiprocessing
 import os
 import sys
+import time
+from StringIO import StringIO
 
-import ply.lex as lex
-import ply.yacc as yacc
-import proto5lexer
-import proto5parser
+import IRText
+import PassManager
+import TableCache
+from Compiler import CompileOptions, compile_ir, compile_source
 
 from proto5lexer import colorize
 
-from AbstractSyntaxTree import ASTProgram
 from ASMCode import write_asm_to_file
 
 
-def main(args):
+def compile_file(args, path, lexer, parser):
+    """Compile one proto file (or intermediate code file, with -from-ir) to
+    path.asm, printing any errors
+
+    Arguments:
+    args - command line arguments
+    path - proto file name
+    lexer - ply lexer
+    parser - ply parser
+
+    Return:
+    True / False for compiled / errors
+
+    """
     # Remove file extension from name
-    program_name = os.path.splitext(args.file)[0]
-    # Load lexer
-    lexer = lex.lex(module=proto5lexer)
-    lexer.proto_classes = set()
-    lexer.proto_file = args.file
-    lexer.proto_errors = 0
-    # Tokenize file
-    lexer.input(open(args.file, 'r').read())
-    # Tokenize to get all classes
-    while True:
-        tok = lexer.token()
-        if not tok:
-            break
-    # Reset line number
-    lexer.lineno = 0
-    # Load parser
-    parser = yacc.yacc(module=proto5parser)
-    parser.proto_errors = 0
-    # Parse program
+    program_name = os.path.splitext(path)[0]
+    if args.from_ir:
+        # file.PHASE.ir compiles to file.asm
+        base, phase = os.path.splitext(program_name)
+        if phase[1:] in IRText.PHASES:
+            program_name = base
+    # Graphs and intermediate code need the whole pipeline to run in this
+    # process, so never use the cache or backend workers for them, or
+    # stream them
+    stream = args.stream and not (args.graphs or args.emit_ir or
+                                  args.from_ir)
+    whole = args.graphs or args.emit_ir or stream
+    options = CompileOptions(nossa=args.nossa,
+                             cache=None if whole else args.cache,
+                             tablecache=args.tablecache,
+                             timings=args.timings or args.timings_json,
+                             backend_jobs=1 if whole else args.backend_jobs,
+                             graphs=args.graphs, stream=stream,
+                             emit_ir=args.emit_ir, opt_level=args.opt_level,
+                             enable_passes=args.enable_pass,
+                             disable_passes=args.disable_pass,
+                             pass_order=args.pass_order)
+    out = None
+    if options.cache is None:
+        # Assembly is written as it is generated, and only renamed to
+        # path.asm once the whole program compiled. The cache keeps the
+        # whole text of the program instead
+        out = open('%s.asm.part' % program_name, 'w')
+    ok = False
     try:
-        program = parser.parse(open(args.file, 'r').read())
-    except:
-        # Exception probably because of errors
-        if parser.proto_errors > 0 or lexer.proto_errors > 0:
-            print colorize('Could not continue parsing due to previous errors', 'red')
-            sys.exit(1)
-        else:  # Idk
-            raise
-    if parser.proto_errors > 0 or lexer.proto_errors > 0:
-        print colorize('Could not continue parsing due to previous errors', 'red')
-        sys.exit(1)
-    # print program
-    # print 'FIX WELLFORMED'
-    if not program.wellformed():
-        print 'Program not well formed!'
-        sys.exit(1)
-    # Generate three address code
-    tac = program.gencode()
-    # print tac
-    #print tac
-    # for block in tac.blocks:
-    #     print '----------\n'
-    #     print 'MASTER:\n%s' % block
-    #     for follow in block.follow:
-    #         print 'FOLLOW:\n%s' % follow
-    # sys.exit(0)
-    # Optimize and assign registers
-    tac.registerize(ssa=not(args.nossa))
-    # for block in tac.blocks:
-    #     print '----------\n'
-    #     print 'MASTER:\n%s' % block
-    #     for follow in block.follow:
-    #         print 'FOLLOW:\n%s' % follow
-    # sys.exit(0)
-    # Generate assembly
-    asm = tac.gencode()
-    # for a in asm:
-    #     print a
+        if args.from_ir:
+            result = compile_ir(open(path, 'r').read(), options,
+                                filename=path, out=out)
+        else:
+            result = compile_source(open(path, 'r').read(), options,
+                                    filename=path, frontend=(lexer, parser),
+                                    out=out)
+        ok = result.ok
+    finally:
+        if out is not None:
+            out.close()
+            if ok:
+                os.rename(out.name, '%s.asm' % program_name)
+            else:
+                os.remove(out.name)
+    for d in result.diagnostics:
+        print d
+    if args.timings:
+        print result.timings
+    if args.timings_json:
+        out = open('%s.timings.json' % program_name, 'w')
+        out.write(result.timings.to_json())
+        out.close()
+    if result.ir is not None:
+        out = open('%s.%s.ir' % (program_name, args.emit_ir), 'w')
+        out.write(result.ir)
+        out.close()
+    if not result.ok:
+        return False
     if args.graphs:
         # Output program abstract syntax tree as png
-        program.to_png(program_name)
+        if result.program is not None:
+            result.program.to_png(program_name)
         # Output liveliness coloring of
-        for i, g in tac.all_graphs:
+        for i, g in result.icc.all_graphs:
             g.to_png("%s_%s" % (program_name, i))
-        tac.basic_blocks_to_png(program_name)
-    write_asm_to_file(program_name, asm, program.icc)
+        result.icc.basic_blocks_to_png(program_name)
+    if out is None:
+        write_asm_to_file(program_name, result.asm)
+    return True
+
+
+def main(args):
+    # Load lexer and parser
+    lexer, parser = TableCache.load(args.tablecache)
+    if not compile_file(args, args.files[0], lexer, parser):
+        sys.exit(1)
     sys.exit(0)
 
+
+def expand_files(names, extension='.proto'):
+    """Expand directories (recursively) and glob patterns into a list
+    of proto files
+
+    Arguments:
+    names - list of file names, directories, or glob patterns
+
+    Keyword Arguments:
+    extension - extension of the files to take from directories
+
+    Return:
+    list of file names
+
+    """
+    files = []
+    for name in names:
+        if os.path.isdir(name):
+            for root, dirs, dir_files in os.walk(name):
+                dirs.sort()
+                files.extend(os.path.join(root, f) for f in sorted(dir_files)
+                             if f.endswith(extension))
+        elif not os.path.exists(name) and glob.has_magic(name):
+            files.extend(sorted(glob.glob(name)))
+        else:
+            files.append(name)
+    return files
+
+
+# Per process state of batch compilation workers
+worker_args = None
+worker_frontend = None
+
+
+def batch_worker_init(args):
+    """Set up a batch worker process. The lexer and parser are built once
+    here (unless inherited from the parent), and reused for every file
+
+    Arguments:
+    args - command line arguments
+
+    """
+    global worker_args, worker_frontend
+    # Files are already compiled in parallel, and pool workers can not
+    # start workers of their own
+    args.backend_jobs = 1
+    worker_args = args
+    if worker_frontend is None:
+        worker_frontend = TableCache.load(args.tablecache)
+
+
+def batch_worker(path):
+    """Compile a file in a batch worker, capturing anything it prints
+
+    Arguments:
+    path - proto file name
+
+    Return:
+    (path, ok, seconds, captured output)
+
+    """
+    start = time.time()
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        if not os.path.exists(path):
+            print '%r does not exist' % path
+            ok = False
+        else:
+            lexer, parser = worker_frontend
+            ok = compile_file(worker_args, path, lexer, parser)
+    except Exception as e:
+        print '%s: %s' % (type(e).__name__, e)
+        ok = False
+    finally:
+        output, sys.stdout = sys.stdout.getvalue(), stdout
+    return path, ok, time.time() - start, output
+
+
+def batch(args, files):
+    """Compile many files over a pool of worker processes, and print a
+    per file summary and the total throughput
+
+    Arguments:
+    args - command line arguments
+    files - list of proto file names
+
+    """
+    global worker_frontend
+    start = time.time()
+    # Build lexer and parser before forking, so workers can share them
+    worker_frontend = TableCache.load(args.tablecache)
+    pool = None
+    if args.jobs == 1:
+        batch_worker_init(args)
+        results = (batch_worker(f) for f in files)
+    else:
+        pool = multiprocessing.Pool(args.jobs, batch_worker_init, (args,))
+        results = pool.imap(batch_worker, files)
+    failed, lines = 0, 0
+    try:
+        for path, ok, seconds, output in results:
+            status = colorize('ok', 'green') if ok else colorize('FAIL', 'red')
+            print '%s %7.3fs %s' % (status, seconds, path)
+            if ok:
+                lines += open(path, 'r').read().count('\n')
+            else:
+                failed += 1
+                for line in output.rstrip().split('\n'):
+                    print '    %s' % line
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.time() - start
+    print '%s files, %s ok, %s failed in %.2fs (%.1f files/s, %.0f lines/s)' % (
+        len(files), len(files) - failed, failed, elapsed,
+        len(files) / elapsed, lines / elapsed)
+    sys.exit(1 if failed else 0)
+
+
 if __name__ == '__main__':
     if argparse is not None:
         parser = argparse.ArgumentParser(description='proto5 Compiler')
@@ -93,8 +240,63 @@ if __name__ == '__main__':
             help='Do NOT use SSA')
         parser.add_argument('-graphs', action='store_true', default=False,
             help='Generate png graphs for AST and liveliness')
-        parser.add_argument('file', type=str, help='File to compile')
+        parser.add_argument('-tablecache', metavar='DIR', default=None,
+            help='Load lexer and parser tables from DIR, building them '
+                 'there once per grammar')
+        parser.add_argument('-cache', metavar='DIR', default=None,
+            help='Reuse assembly of unchanged programs and functions '
+                 'from DIR')
+        parser.add_argument('-timings', action='store_true', default=False,
+            help='Print the time of each compiler phase, and counters')
+        parser.add_argument('-timings-json', action='store_true',
+            default=False, help='Write timings and counters as json to '
+                                'file.timings.json')
+        parser.add_argument('-jobs', type=int, metavar='N',
+            default=multiprocessing.cpu_count(),
+            help='Number of worker processes for batch compilation '
+                 '(default: number of cpus)')
+        parser.add_argument('-backend-jobs', type=int, metavar='N',
+            default=1, help='Number of worker processes which allocate '
+                            'registers and generate assembly of the '
+                            'functions of a file (default: 1)')
+        parser.add_argument('-stream', action='store_true', default=False,
+            help='Compile and write out one function at a time, keeping '
+                 'only its code in memory (no -cache or -backend-jobs)')
+        parser.add_argument('-emit-ir', metavar='PHASE', default=None,
+            choices=IRText.PHASES,
+            help='Write the intermediate code after PHASE (one of: %s) to '
+                 'file.PHASE.ir (no -cache, -backend-jobs or -stream)' %
+                 ', '.join(IRText.PHASES))
+        parser.add_argument('-from-ir', action='store_true', default=False,
+            help='Files are intermediate code written by -emit-ir: run '
+                 'only the phases after it')
+        parser.add_argument('-O', type=int, metavar='LEVEL',
+            dest='opt_level', default=PassManager.DEFAULT_LEVEL,
+            choices=PassManager.LEVELS,
+            help='Optimization level, as -O0, -O1 or -O2 (default: %s)' %
+                 PassManager.DEFAULT_LEVEL)
+        parser.add_argument('-enable-pass', metavar='PASS', action='append',
+            default=[], choices=PassManager.PASS_NAMES,
+            help='Run PASS (one of: %s) above its optimization level' %
+                 ', '.join(PassManager.PASS_NAMES))
+        parser.add_argument('-disable-pass', metavar='PASS', action='append',
+            default=[], choices=PassManager.PASS_NAMES,
+            help='Do NOT run PASS')
+        parser.add_argument('-pass-order', metavar='PASS,PASS,...',
+            default=None, type=lambda x: x.split(','),
+            help='Run these passes in this order, instead of the passes of '
+                 'the optimization level')
+        parser.add_argument('files', type=str, nargs='+', metavar='file',
+            help='Files to compile. Directories and glob patterns, or more '
+                 'than one file, are compiled in batch mode')
         args = parser.parse_args()
+        if args.jobs < 1:
+            parser.error('-jobs must be at least 1')
+        try:
+            PassManager.PassManager(args.opt_level, args.enable_pass,
+                                    args.disable_pass, args.pass_order)
+        except ValueError as e:
+            parser.error(str(e))
     else:
         class CArgs(object):
             def __init__(self):
@@ -104,10 +306,30 @@ if __name__ == '__main__':
                 self.nossa = False
                 self.noflatten = False
                 self.graphs = False
-                self.file = sys.argv[1]
+                self.tablecache = None
+                self.cache = None
+                self.timings = False
+                self.timings_json = False
+                self.jobs = 1
+                self.backend_jobs = 1
+                self.stream = False
+                self.emit_ir = None
+                self.from_ir = False
+                self.opt_level = PassManager.DEFAULT_LEVEL
+                self.enable_pass = []
+                self.disable_pass = []
+                self.pass_order = None
+                self.files = [sys.argv[1]]
         args = CArgs()
-    if not os.path.exists(args.file):
-        print '%r does not exist' % args.file
+    extension = '.ir' if args.from_ir else '.proto'
+    files = expand_files(args.files, extension)
+    if len(files) == 0:
+        print 'no %s files in %s' % (extension, ' '.join(args.files))
+        sys.exit(1)
+    if files != args.files or len(files) != 1:
+        batch(args, files)
+    if not os.path.exists(args.files[0]):
+        print '%r does not exist' % args.files[0]
         sys.exit(1)
     main(args)
     sys.exit(0)
@@ -104,7 +104,10 @@ def t_NUMBER(t):
     try:
         t.value = int(t.value)
     except ValueError:
-        print "Bad integer: %r" % t.value
+        t.lexer.proto_errors += 1
+        lineno, col = t.lexer.proto_diagnostics.position(t.lexpos)
+        t.lexer.proto_diagnostics.error('bad integer: %r' % t.value,
+                                        lineno=lineno, column=col)
         t.value = 0
     return t
 
@@ -119,12 +122,47 @@ def t_newline(t):
     t.lexer.lineno += t.value.count('\n')
 
 
-def find_column(input, token):
-    last_cr = input.rfind('\n', 0, token.lexpos)
-    if last_cr < 0:
-        last_cr = 0
-    column = (token.lexpos - last_cr) + 1
-    return column
+def tokenize(lexer, data):
+    """Tokenize a whole program in a single pass.
+    Class names are only all known at the end of the input, so IDs of
+    classes used before their declaration are turned into CLASSIDs
+    afterwards, instead of lexing everything a second time
+
+    Arguments:
+    lexer - ply lexer
+    data - program source string
+
+    Return:
+    list of tokens
+
+    """
+    global state
+    state = 'INITIAL'
+    lexer.input(data)
+    tokens = []
+    while True:
+        tok = lexer.token()
+        if not tok:
+            break
+        tokens.append(tok)
+    for tok in tokens:
+        if tok.type == 'ID' and tok.value in lexer.proto_classes:
+            tok.type = 'CLASSID'
+    return tokens
+
+
+def token_function(tokens):
+    """Make a ply tokenfunc which feeds the parser already lexed tokens
+
+    Arguments:
+    tokens - list of tokens
+
+    Return:
+    function returning the next token, or None at the end
+
+    """
+    tokens = iter(tokens)
+    return lambda: next(tokens, None)
 
 
 def colorize(string, color):
@@ -145,14 +183,8 @@ def colorize(string, color):
 # On character error
 def t_error(t):
     t.lexer.proto_errors += 1
-    lineno, col = t.lexer.lineno, find_column(t.lexer.lexdata, t)
-    line = t.lexer.lexdata.split('\n')[lineno]
-    print "%s %s %s" % (
-        colorize('%s:%s:%s' % (t.lexer.proto_file, lineno, col), 'white'),
-        colorize('error:', 'red'),
-        colorize('unexpected token', 'white'))
-    print line.rstrip()
-    print '%s%s' % (' ' * (col - 2), colorize('^', 'green'))
-    # sys.exit(1)
+    lineno, col = t.lexer.proto_diagnostics.position(t.lexpos)
+    t.lexer.proto_diagnostics.error('unexpected token', lineno=lineno,
+                                    column=col, caret=col - 2)
     t.lexer.skip(1)
     t.type = 'ERROR'
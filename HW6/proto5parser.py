@@ -1,7 +1,7 @@
 import ply.yacc as yacc
 
 # Get tokens from lexer
-from proto5lexer import tokens, colorize, find_column
+from proto5lexer import tokens, colorize
 from AbstractSyntaxTree import *
 
 # Precedence ordering lowest to highest
@@ -24,9 +24,12 @@ def p_pgm(p):
     p[0] = ASTProgram(p, p[1])
 
 
+# Lists are left recursive: every item is appended in place to the list of
+# the items before it, and the parser stack does not grow with the list
 def p_pgm_decl(p):
-    '''pgm_seq : decl pgm_seq'''
-    p[0] = [p[1]] + p[2]
+    '''pgm_seq : pgm_seq decl'''
+    p[1].append(p[2])
+    p[0] = p[1]
 
 
 def p_pgm_empty(p):
@@ -64,14 +67,15 @@ def p_var(p):
 def p_vardecl(p):
     '''vardecl : type varlist SEMICOLON'''
     p[0] = ASTDeclareList(p, p[1][0],
-        [ASTDeclareVariable(v, v[0], (p[1][0], v[1])) for v in p[2]])
+        [ASTDeclareVariable(p, v[0], (p[1][0], v[1])) for v in p[2]])
 
 
 def p_vardecl_star(p):
-    '''vardecl_star : vardecl vardecl_star
+    '''vardecl_star : vardecl_star vardecl
                     | empty'''
     if len(p) == 3:
-        p[0] = [p[1]] + p[2]
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = []
 
@@ -96,10 +100,11 @@ def p_memberdecl_fundecl(p):
 
 
 def p_memberdecl_star(p):
-    '''memberdecl_star : memberdecl memberdecl_star
+    '''memberdecl_star : memberdecl_star memberdecl
                     | empty'''
     if len(p) == 3:
-        p[0] = [p[1]] + p[2]
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = []
 
@@ -122,19 +127,21 @@ def p_type(p):
 
 
 def p_varlist(p):
-    '''varlist : var COMMA varlist
+    '''varlist : varlist COMMA var
                | var'''
     if len(p) == 4:
-        p[0] = [p[1]] + p[3]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
 
 def p_formals(p):
-    '''formals : type var COMMA formals
+    '''formals : formals COMMA type var
                | type var'''
     if len(p) == 5:
-        p[0] = [ASTDeclareVariable(p, p[2][0], (p[1][0], p[2][1]))] + p[4]
+        p[1].append(ASTDeclareVariable(p, p[4][0], (p[3][0], p[4][1])))
+        p[0] = p[1]
     else:
         p[0] = [ASTDeclareVariable(p, p[2][0], (p[1][0], p[2][1]))]
 
@@ -195,10 +202,11 @@ def p_stmt_return(p):
 
 
 def p_stmt_star(p):
-    '''stmt_star : stmt stmt_star
+    '''stmt_star : stmt_star stmt
                   | empty'''
     if len(p) == 3:
-        p[0] = [p[1]] + p[2]
+        p[1].append(p[2])
+        p[0] = p[1]
     else:
         p[0] = []
 
@@ -378,10 +386,11 @@ def p_field_call(p):
 
 
 def p_args(p):
-    '''args : ae COMMA args
+    '''args : args COMMA ae
             | ae'''
     if len(p) == 4:
-        p[0] = [p[1]] + p[3]
+        p[1].append(p[3])
+        p[0] = p[1]
     else:
         p[0] = [p[1]]
 
@@ -467,8 +476,9 @@ def p_type_lbrace_error(p):
 
 
 def p_varlist_error(p):
-    '''varlist : var COMMA error'''
+    '''varlist : varlist COMMA error'''
     print_expected_error(p, 2, "expected variable after ','")
+    p[0] = p[1]
 
 
 def p_stmt_print_semi_error(p):
@@ -499,23 +509,21 @@ def p_function_call_rparen_error(p):
 
 def print_expected_error(p, t, message, missing=None, aug=1):
     p.parser.proto_errors += 1
-    lineno, col = p.lineno(t), find_column(p.lexer.lexdata, p.slice[t])
-    line = p.lexer.lexdata.split('\n')[lineno]
-    print "%s %s %s" % (
-        colorize('%s:%s:%s' % (p.lexer.proto_file, lineno, col), 'white'),
-        colorize('error:', 'red'),
-        colorize(message, 'white'))
-    print line.rstrip()
-    print '%s%s' % (' ' * (col - aug), colorize('^', 'green'))
-    if missing:
-        print '%s%s' % (' ' * (col - aug), colorize(missing, 'green'))
+    lineno, col = p.lexer.proto_diagnostics.position(p.lexpos(t))
+    p.lexer.proto_diagnostics.error(message, lineno=lineno, column=col,
+                                    caret=col - aug, missing=missing)
     p.parser.errok()
 
 
 # Syntax errors
 def p_error(p):
+    if p is None:
+        # No token (nor lexer) to report the end of input with
+        raise SyntaxError('unexpected end of input')
     p.lexer.proto_errors += 1
-    print colorize(str(ValueError("Syntax error!: %r" % p)), 'blue')
+    lineno, col = p.lexer.proto_diagnostics.position(p.lexpos)
+    p.lexer.proto_diagnostics.error('syntax error at %r' % p.value,
+                                    lineno=lineno, column=col)
     # print colorize("Somewhere here", 'blue')
     # print colorize("##")
     # print '\n'.join(p.lexer.lexdata.split('\n')[p.lineno - 1:p.lineno + 1])
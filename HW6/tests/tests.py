@@ -1,5 +1,18 @@
 from nose.tools import *
 from subprocess import Popen, PIPE
+import os
+import shutil
+import sys
+import tempfile
+
+# Tests run from the compiler directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from AbstractSyntaxTree import ASTNode, ASTBinaryOp, node_fields
+from Compiler import CompileOptions, compile_ir, compile_source
+from Diagnostics import LineIndex
+from Graph import SimplifyQueue, UndirectedGraph
+import IRText
+from PassManager import LEVELS, PassManager
 
 
 RUNTIME_OOB = "Proto Runtime Error: Attempt to access array out of bounds."
@@ -20,11 +33,12 @@ def pre_entry(f):
     return new_f
 
 
-def compile_and_run(file_prefix, expected_output, input_lines=None):
+def compile_and_run(file_prefix, expected_output, input_lines=None, args=None):
     expected_output = [str(x) for x in expected_output]
     # Call compiler to compile program
     print 'tests/%s.proto' % file_prefix
-    p = Popen(['python2', 'proplasm5.py', 'tests/%s.proto' % file_prefix],
+    p = Popen(['python2', 'proplasm5.py'] + (args or []) +
+              ['tests/%s.proto' % file_prefix],
               stdout=PIPE, stdin=PIPE, stderr=PIPE)
     # Wait for compiler to finish compiling
     retcode = p.wait()
@@ -48,12 +62,12 @@ def compile_and_run(file_prefix, expected_output, input_lines=None):
 
 
 def compile_and_fail(file_prefix):
-    print 'tests/%s.proto' % file_prefix
-    p = Popen(['python2', 'proplasm5.py', 'tests/%s.proto' % file_prefix],
-              stdout=PIPE, stdin=PIPE, stderr=PIPE)
-    retcode = p.wait()
-    eq_(retcode, 1, 'tests/%s.proto: %s != 1\n%s' % (file_prefix, retcode,
-        'It compiled, but it should not have!'))
+    path = 'tests/%s.proto' % file_prefix
+    print path
+    # Compile in process, no need to start up the compiler for each one
+    result = compile_source(open(path, 'r').read(), filename=path)
+    ok_(not result.ok, '%s: It compiled, but it should not have!' % path)
+    ok_(len(result.diagnostics.errors()) > 0, '%s: no errors reported' % path)
 
 
 @pre_entry
@@ -157,6 +171,7 @@ def test_while():
                     5, 8, 13, 21, 34, 55, 89, 144, 233, 377, 610, 987])
     compile_and_run('do_while', [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 0, 1, 2, 3,
                     4, 1, 2, 3, 4, 2, 3, 4, 5])
+    compile_and_run('nested_loops', [24, 4, 0, 6, 0, 2, 2, 1, 0, 9, 3])
 
 
 @pre_entry
@@ -223,6 +238,12 @@ def test_runtime_error():
     compile_and_run('fail_array_bounds', [0, RUNTIME_OOB])
 
 
+@pre_entry
+def test_array_size_expression():
+    """array size expression"""
+    compile_and_run('array_size_expression', [7])
+
+
 @pre_entry
 def test_comments():
     """comments"""
@@ -235,6 +256,534 @@ def test_inheritance():
     compile_and_run('class_functions', [20,30,40,90,20,62,62])
     compile_and_run('class_functions_inheritence', [20,30,40,1,49,90,55,30,30,105])
 
+
+@pre_entry
+def test_compile_source():
+    """in process compile"""
+    result = compile_source('void main() { print(1 + 2); return; }')
+    ok_(result.ok, str(result.diagnostics))
+    ok_('func_main:' in result.asm)
+    result = compile_source('void main() {\n  print(x);\n  return;\n}',
+                            filename='x.proto')
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].message, 'x not declared!')
+    eq_(result.diagnostics.errors()[0].filename, 'x.proto')
+    # A function can not take the name of a global
+    result = compile_source('int f;\nint f() { return 1; }\n'
+                            'void main() { return; }')
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].message,
+        'Redeclaration of class as function: f')
+    # Syntax errors know where they are
+    result = compile_source('void main() {\n  int x, 4y;\n}')
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].lineno, 1)
+
+
+@pre_entry
+def test_gencode_depth():
+    """code generation of nested statements and calls does not recurse"""
+    import inspect
+    depth = 100
+    text = ('int f(int x) { return x; }\nvoid main() {\n  int x;\n'
+            '  x = 5;\n' +
+            '  if (x > 0) then {\n  while (x > 100) do {\n' * depth +
+            '  x = ' + 'f(' * depth + 'x' + ')' * depth + ';\n' +
+            '  }\n  }\n' * depth + '  print(x);\n  return;\n}\n')
+    result = compile_source(text)
+    ok_(result.ok, str(result.diagnostics))
+    expected = result.program.gencode()
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        icc = result.program.gencode()
+    finally:
+        sys.setrecursionlimit(limit)
+    eq_(len(icc.blocks), len(expected.blocks))
+    eq_([str(i) for b in icc.blocks for i in b.instructions],
+        [str(i) for b in expected.blocks for i in b.instructions])
+
+
+@pre_entry
+def test_line_index():
+    """line and column lookup of diagnostics"""
+    index = LineIndex('ab\ncd\n\nef')
+    eq_(index.position(1), (0, 2))
+    eq_(index.position(3), (1, 2))
+    eq_(index.position(8), (3, 3))
+    eq_(index.line(1), 'cd')
+    eq_(index.line(2), '')
+    eq_(index.line(3), 'ef')
+    # Every bad character gets its own line and column
+    result = compile_source('void main() {\n' + '  x = 1 $ 2;\n' * 100 + '}\n')
+    errors = result.diagnostics.errors()
+    eq_(errors[99].lineno, 100)
+    eq_(errors[99].column, 10)
+    eq_(errors[99].source_line, '  x = 1 $ 2;')
+
+
+@pre_entry
+def test_scopes():
+    """nested scopes"""
+    # Shadowed in sibling and nested blocks
+    result = compile_source('void main() {\n  int x;\n  x = 1;\n'
+                            '  { int x; x = 2; { int x; x = 3; } }\n'
+                            '  { int x; x = 4; }\n  print(x);\n  return;\n}')
+    ok_(result.ok, str(result.diagnostics))
+    # Only defined in one branch of the if
+    result = compile_source('void main() {\n  int x, y;\n  x = 1;\n'
+                            '  if x < 2 then { y = 1; }\n  print(y);\n'
+                            '  return;\n}')
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].message,
+        'y declared but used before definition!')
+    # Declarations end with their block
+    result = compile_source('void main() {\n  { int z; z = 1; }\n'
+                            '  print(z);\n  return;\n}')
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].message, 'z not declared!')
+
+
+@pre_entry
+def test_class_hierarchy():
+    """method resolution and casts along the class hierarchy"""
+    classes = ('class A {\n  int x;\n  int get(B o) {\n    return o.x;\n  }\n}\n'
+               'class B extends A {\n}\nclass C extends B {\n}\n')
+    result = compile_source(classes + 'void main() {\n  C c;\n'
+                            '  c = new C();\n  c.x = 1;\n  print(c.get(c));\n'
+                            '  return;\n}')
+    ok_(result.ok, str(result.diagnostics))
+    # A is not a B
+    result = compile_source(classes + 'void main() {\n  A a;\n'
+                            '  a = new A();\n  a.x = 1;\n  print(a.get(a));\n'
+                            '  return;\n}')
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].message, 'Missing function: a.get')
+
+
+@pre_entry
+def test_expression_types():
+    """expression types annotated by wellformed"""
+    result = compile_source('void main() {\n  int x;\n  x = 1;\n'
+                            '  print(x * 2 + 3);\n  if x < 2 then { print(x); }\n'
+                            '  return;\n}')
+    ok_(result.ok, str(result.diagnostics))
+    types = {}
+    stack = [result.program]
+    while len(stack) != 0:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(n)
+        elif isinstance(n, ASTNode):
+            if isinstance(n, ASTBinaryOp):
+                types[n.b_type] = n.expr_type
+            stack.extend(node_fields(n))
+    eq_(types, {'*': ('int', 0), '+': ('int', 0), '<': ('bool', 0)})
+
+
+@pre_entry
+def test_node_positions():
+    """AST nodes keep a source position, but not the parser production"""
+    result = compile_source('void main() {\n  int x;\n  x = 1;\n'
+                            '  print(x * 2 + 3);\n  return;\n}')
+    ok_(result.ok, str(result.diagnostics))
+    positions = {}
+    stack = [result.program]
+    while len(stack) != 0:
+        n = stack.pop()
+        if isinstance(n, list):
+            stack.extend(n)
+        elif isinstance(n, ASTNode):
+            ok_(not hasattr(n, '__dict__'), type(n))
+            ok_(not hasattr(n, 'p'), type(n))
+            if isinstance(n, ASTBinaryOp):
+                positions[n.b_type] = (n.lineno, n.lexpos)
+            stack.extend(node_fields(n))
+    # Binary operators start at their left operand
+    eq_(positions, {'*': (3, 40), '+': (3, 40)})
+    # Semantic errors are reported at the position of their node
+    result = compile_source('void main() {\n  int x;\n  x = 1;\n'
+                            '  print(y + 3);\n  return;\n}')
+    error = result.diagnostics.errors()[0]
+    eq_((error.message, error.lineno, error.column), ('y not declared!', 3, 10))
+    ok_(result.program.wellformed() is False)
+    eq_(result.program.diagnostics.errors()[0].lineno, None)
+
+
+@pre_entry
+def test_liveness():
+    """block liveness matches per instruction liveness"""
+    for name in ['liveliness', 'do_while', 'factorial', 'for', 'while_do']:
+        result = compile_source(open('tests/%s.proto' % name, 'r').read())
+        ok_(result.ok, str(result.diagnostics))
+        icc = result.icc
+        for function, blocks in icc.functions():
+            icc.set_function(function)
+            icc.update_liveliness(blocks)
+            liveness = icc.liveness
+            blocks = [b for b in blocks if len(b.instructions) != 0]
+            # Iterate the equations of every instruction until stable
+            bits = dict((id(i), (u, d)) for b in blocks for i, u, d in zip(
+                b.instructions, liveness.used[b], liveness.defined[b]))
+            nexts = dict((id(b), [f.instructions[0]
+                                  for f in b.follower_blocks()])
+                         for b in blocks)
+            live_in = dict((i, 0) for i in bits)
+            changed = True
+            while changed:
+                changed = False
+                for b in blocks:
+                    follow = nexts[id(b)]
+                    for i in reversed(b.instructions):
+                        out = 0
+                        for f in follow:
+                            out |= live_in[id(f)]
+                        used, defined = bits[id(i)]
+                        new = used | (out & ~defined)
+                        if new != live_in[id(i)]:
+                            live_in[id(i)] = new
+                            changed = True
+                        follow = [i]
+            for b in blocks:
+                for i, computed in zip(b.instructions, liveness.live_in(b)):
+                    eq_(live_in[id(i)], computed, '%s %s' % (name, i))
+
+
+@pre_entry
+def test_operands():
+    """interned variables, integers and labels"""
+    import cPickle
+    from IntermediateCode import Integer, Label, Variable
+    a = Variable('operands_a')
+    ok_(Variable('operands_a') is a)
+    ok_(Integer(1) is Integer(1))
+    ok_(Label('operands_l') is Label('operands_l'))
+    ok_(Variable('operands_b') is not a)
+    # Tables do not keep operands which are no longer used
+    b = Variable('operands_b')
+    ok_('operands_b' in Variable._table)
+    del b
+    ok_('operands_b' not in Variable._table)
+    eq_(Label('operands_l').name, 'operands_l')
+    eq_(str(Integer(-3)), '-3')
+    ok_(cPickle.loads(cPickle.dumps(a, cPickle.HIGHEST_PROTOCOL)) is a)
+
+
+@pre_entry
+def test_graph():
+    """bitset graph edges, degrees and removal"""
+    g = UndirectedGraph()
+    for a, b in [('a', 'b'), ('a', 'c'), ('a', 'd'), ('b', 'c'), ('b', 'a')]:
+        g.add_edge(a, b)
+    g.add_edge_bits('e', 1 << g.number('a') | 1 << g.number('e'))
+    eq_(len(g), 5)
+    eq_(g.num_edges(), 5)
+    eq_([g.degree(n) for n in 'abcde'], [4, 2, 2, 1, 1])
+    eq_(g.smallest_degree_node(), 'd')
+    eq_(sorted(g.remove_node('a')), ['b', 'c', 'd', 'e'])
+    eq_(g.nodes(), ['b', 'c', 'd', 'e'])
+    eq_(g.num_edges(), 1)
+    eq_([g.degree(n) for n in 'bcde'], [1, 1, 0, 0])
+    g.add_edges('a', ['d'])
+    eq_(g.neighbors('a'), ['d'])
+    eq_(g.copy().num_edges(), 2)
+
+
+@pre_entry
+def test_simplify_queue():
+    """simplify order of graph coloring"""
+    # A 4-clique with a tail: a - b - {c, d, e, f} clique
+    g = UndirectedGraph()
+    g.add_edge('a', 'b')
+    for x in 'bcdef':
+        for y in 'bcdef':
+            g.add_edge(x, y)
+    uses = {'c': 5, 'd': 1, 'e': 9, 'f': 9}
+    q = SimplifyQueue(g, 3, lambda x: uses.get(x, 0))
+    eq_(q.low_degree_node(), 'a')
+    eq_(q.remove('a'), ['b'])
+    # Everything left has degree 4
+    eq_(q.low_degree_node(), None)
+    # Smallest degree - uses first: e and f (4 - 9), e numbered first
+    eq_(q.spill_candidate(set(['b'])), 'e')
+    q.remove('e')
+    eq_(q.low_degree_node(), None)
+    # b is excluded for good, f (3 - 9) is cheaper than c (3 - 5)
+    eq_(q.spill_candidate(set()), 'f')
+    q.remove('f')
+    eq_(g.degree('c'), 2)
+    ok_(q.low_degree_node() in ['b', 'c', 'd'])
+    eq_(q.spill_candidate(set()), None)
+
+
+@pre_entry
+def test_parallel_backend():
+    """functions compiled in worker processes give the same assembly"""
+    text = open('tests/class_functions_inheritence.proto', 'r').read()
+    serial = compile_source(text, CompileOptions(timings=True))
+    parallel = compile_source(text, CompileOptions(timings=True,
+                                                   backend_jobs=2))
+    ok_(serial.ok, str(serial.diagnostics))
+    ok_(parallel.ok, str(parallel.diagnostics))
+    eq_(parallel.asm, serial.asm)
+    eq_(parallel.timings.functions.keys(), serial.timings.functions.keys())
+
+
+@pre_entry
+def test_parallel_backend_long_function():
+    """functions of hundreds of blocks are sent to worker processes"""
+    body = ''.join(['    if (x > %d) then x = x - 1;\n' % k
+                    for k in xrange(100)])
+    text = ('int f(int x) {\n%s    return x;\n}\n'
+            'void main() { print(f(200)); return; }\n' % body)
+    serial = compile_source(text)
+    ok_(serial.ok, str(serial.diagnostics))
+    ok_(len(serial.icc.functions()[0][1]) > 200)
+    eq_(compile_source(text, CompileOptions(backend_jobs=2)).asm, serial.asm)
+    cache = tempfile.mkdtemp()
+    try:
+        eq_(compile_source(text, CompileOptions(cache=cache,
+                                                backend_jobs=2)).asm,
+            serial.asm)
+    finally:
+        shutil.rmtree(cache)
+
+
+@pre_entry
+def test_stream():
+    """functions compiled one at a time give the same assembly"""
+    from StringIO import StringIO
+    text = open('tests/class_functions_inheritence.proto', 'r').read()
+    whole = compile_source(text, CompileOptions(timings=True))
+    stream = compile_source(text, CompileOptions(timings=True, stream=True))
+    ok_(whole.ok, str(whole.diagnostics))
+    ok_(stream.ok, str(stream.diagnostics))
+    eq_(stream.asm, whole.asm)
+    for counter in ['functions', 'basic_blocks', 'ic_instructions']:
+        eq_(stream.timings.counters[counter], whole.timings.counters[counter])
+    # Only the empty first block is left, and no graphs are kept
+    eq_(len(stream.icc.blocks), 1)
+    eq_(stream.icc.all_graphs, [])
+    eq_(len(compile_source(text, CompileOptions(graphs=True)).icc.all_graphs),
+        len(whole.timings.functions))
+    for options in [CompileOptions(stream=True), CompileOptions(),
+                    CompileOptions(backend_jobs=2)]:
+        out = StringIO()
+        written = compile_source(text, options, out=out)
+        eq_(written.asm, '')
+        eq_(out.getvalue(), whole.asm)
+    # Nothing is written for programs with errors
+    out = StringIO()
+    ok_(not compile_source('int main() { return x; }',
+                           CompileOptions(stream=True), out=out).ok)
+    eq_(out.getvalue(), '')
+
+
+@pre_entry
+def test_ir():
+    """intermediate code written after a phase compiles to the same assembly"""
+    text = open('tests/class_functions_inheritence.proto', 'r').read()
+    whole = compile_source(text)
+    for nossa in [False, True]:
+        asm = compile_source(text, CompileOptions(nossa=nossa)).asm
+        for phase in IRText.PHASES:
+            written = compile_source(text, CompileOptions(nossa=nossa,
+                                                          emit_ir=phase))
+            ok_(written.ok, str(written.diagnostics))
+            eq_(written.asm, asm)
+            ok_(written.ir.startswith(IRText.HEADER % phase))
+            loaded = compile_ir(written.ir, CompileOptions(nossa=nossa))
+            ok_(loaded.ok, str(loaded.diagnostics))
+            eq_(loaded.asm, asm)
+            eq_(loaded.timings.counters['functions'],
+                whole.timings.counters['functions'])
+    # Registerize runs only for intermediate code written after gencode
+    ir = compile_source(text, CompileOptions(emit_ir='gencode')).ir
+    again = compile_ir(ir, CompileOptions(emit_ir='registerize'))
+    ok_('registerize' in again.timings.phases)
+    eq_(compile_ir(again.ir).asm, whole.asm)
+    ok_('registerize' not in compile_ir(again.ir).timings.phases)
+    # Malformed intermediate code is an error on its line
+    result = compile_ir(ir.replace('follow: 2', 'follow: 2000'))
+    ok_(not result.ok)
+    eq_(result.diagnostics.errors()[0].lineno,
+        ir.split('\n').index([l for l in ir.split('\n')
+                              if 'follow: 2' in l][0]))
+    ok_(not compile_ir('int main() { return 0; }').ok)
+
+
+@pre_entry
+def test_timings():
+    """phase timings and counters"""
+    result = compile_source(open('tests/spill_many.proto', 'r').read(),
+                            CompileOptions(timings=True))
+    ok_(result.ok, str(result.diagnostics))
+    for phase in ['lex', 'parse', 'wellformed', 'gencode', 'mipsify',
+                  'update_liveliness', 'allocate_registers', 'asm']:
+        ok_(phase in result.timings.phases, phase)
+    ok_(result.timings.counters['tokens'] > 0)
+    ok_(result.timings.counters['ast_nodes'] > 0)
+    ok_(result.timings.functions['main']['spill_rounds'] > 0)
+    ok_('"interference_edges"' in result.timings.to_json())
+
+
+@pre_entry
+def test_passes():
+    """pass manager levels, options and statistics"""
+    from IntermediateCode import Integer, Variable, fold_binary_op
+    eq_(PassManager().names(), ['mipsify', 'allocate'])
+    eq_(PassManager(1).names(), ['fold', 'mipsify', 'allocate'])
+    eq_(PassManager(2).names(), ['fold', 'dce', 'mipsify', 'allocate'])
+    eq_(PassManager(0, enable=['dce']).names(), ['dce', 'mipsify', 'allocate'])
+    eq_(PassManager(2, disable=['fold']).names(),
+        ['dce', 'mipsify', 'allocate'])
+    eq_(PassManager(order=['mipsify', 'fold', 'allocate']).names(),
+        ['mipsify', 'fold', 'allocate'])
+    assert_raises(ValueError, PassManager, 3)
+    assert_raises(ValueError, PassManager, enable=['inline'])
+    assert_raises(ValueError, PassManager, disable=['mipsify'])
+    assert_raises(ValueError, PassManager, order=['allocate', 'mipsify'])
+    assert_raises(ValueError, PassManager, order=['fold', 'allocate'])
+    text = open('tests/spill_many.proto', 'r').read()
+    sizes = []
+    for level in [0, 1, 2]:
+        result = compile_source(text, CompileOptions(opt_level=level))
+        ok_(result.ok, str(result.diagnostics))
+        eq_(result.timings.passes.keys(), PassManager(level).names())
+        for stats in result.timings.passes.itervalues():
+            eq_(stats['runs'], 1)
+        sizes.append(len(result.asm.splitlines()))
+    ok_(sizes[0] > sizes[1] > sizes[2])
+    stats = result.timings.passes['dce']
+    ok_(stats['instructions_after'] < stats['instructions_before'])
+    # Constants are folded as the assembly computes them
+    eq_(fold_binary_op('/', Integer(-7), Integer(2)), Integer(-3))
+    eq_(fold_binary_op('%', Integer(-7), Integer(2)), Integer(-1))
+    eq_(fold_binary_op('*', Integer(65536), Integer(65536)), Integer(0))
+    eq_(fold_binary_op('<=', Integer(2), Integer(2)), Integer(1))
+    eq_(fold_binary_op('/', Integer(1), Integer(0)), None)
+    eq_(fold_binary_op('+', Integer(1), Variable('x')), None)
+    eq_(fold_binary_op('&&', Integer(0), Variable('x')), Integer(0))
+    eq_(fold_binary_op('||', Integer(0), Variable('x')), Variable('x'))
+
+
+@pre_entry
+def test_opt_levels():
+    """optimized programs print the same output"""
+    programs = [
+        ('while_do', [10, 10, 11, 3, 6, 9, 12, 15, 18, 21, 1, 2, 3, 5, 8, 13,
+                      21, 34, 55, 89, 144, 233, 377, 610, 987]),
+        ('do_while', [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 0, 1, 2, 3, 4, 1, 2,
+                      3, 4, 2, 3, 4, 5]),
+        ('for', [120, 5, 5, 5]),
+        ('nested_loops', [24, 4, 0, 6, 0, 2, 2, 1, 0, 9, 3]),
+        ('arrays', [0, 1, 2, 3, 4, 0, 1, 1, 2, 0, 1, 1, 2, 0, 1, 2, 3, 4, 1]),
+        ('spill_array', [86, 0, 1, 2, 3, 4]),
+    ]
+    for level in LEVELS:
+        for name, expected_output in programs:
+            compile_and_run(name, expected_output, args=['-O', str(level)])
+
+
+@pre_entry
+def test_table_cache():
+    """lexer and parser table cache"""
+    cache_dir = tempfile.mkdtemp()
+    try:
+        # First compile builds the tables, second one loads them
+        compile_and_run('factorial', [120, 479001600],
+                        args=['-tablecache', cache_dir])
+        compile_and_run('factorial', [120, 479001600],
+                        args=['-tablecache', cache_dir])
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+@pre_entry
+def test_table_cache_broken():
+    """broken cached tables are rebuilt"""
+    import TableCache
+    cache_dir = tempfile.mkdtemp()
+    try:
+        name = TableCache.grammar_hash()
+        paths = [os.path.join(cache_dir, 'parsetab_%s.pickle' % name),
+                 os.path.join(cache_dir, 'lextab_%s.py' % name)]
+        for path in paths:
+            open(path, 'w').write('\x80\x02garbage')
+        lexer, parser = TableCache.load(cache_dir)
+        result = compile_source('void main() { print(1 + 2); return; }',
+                                frontend=(lexer, parser))
+        ok_(result.ok, str(result.diagnostics))
+        # The broken files were replaced, and load from now on
+        for path in paths:
+            ok_('garbage' not in open(path, 'r').read())
+        ok_(compile_source('void main() { return; }',
+                           frontend=TableCache.load(cache_dir)).ok)
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+@pre_entry
+def test_compiler_modules():
+    """the compile cache hashes every module on the compile path"""
+    from CompileCache import compiler_modules
+    names = [m.__name__ for m in compiler_modules()]
+    for name in ['Compiler', 'CompileCache', 'ParallelBackend', 'PassManager',
+                 'IntermediateCode', 'AbstractSyntaxTree', 'Graph', 'ASMCode',
+                 'proto5lexer', 'proto5parser']:
+        ok_(name in names, name)
+    ok_('proplasm5' not in names)
+
+
+@pre_entry
+def test_compile_cache():
+    """compile cache"""
+    cache_dir = tempfile.mkdtemp()
+    try:
+        # First compile fills the cache, second one reuses the program
+        compile_and_run('class_functions_inheritence',
+                        [20,30,40,1,49,90,55,30,30,105],
+                        args=['-cache', cache_dir])
+        compile_and_run('class_functions_inheritence',
+                        [20,30,40,1,49,90,55,30,30,105],
+                        args=['-cache', cache_dir])
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+@pre_entry
+def test_batch():
+    """batch compile"""
+    p = Popen(['python2', 'proplasm5.py', '-jobs', '2', 'tests/add.proto',
+               'tests/sub.proto', 'tests/fail_declare_global.proto'],
+              stdout=PIPE, stdin=PIPE, stderr=PIPE)
+    output = p.stdout.read()
+    # One failure fails the whole batch, but not the other files
+    eq_(p.wait(), 1, output)
+    ok_('3 files, 2 ok, 1 failed' in output, output)
+    for jobs in ['0', '-1']:
+        p = Popen(['python2', 'proplasm5.py', '-jobs', jobs, 'tests/add.proto',
+                   'tests/sub.proto'], stdout=PIPE, stdin=PIPE, stderr=PIPE)
+        error = p.stderr.read()
+        eq_(p.wait(), 2, error)
+        ok_('-jobs must be at least 1' in error, error)
+
+
+@pre_entry
+def test_batch_empty():
+    """batch compile of no files"""
+    empty_dir = tempfile.mkdtemp()
+    try:
+        for name in [empty_dir, 'tests/nothing*.proto']:
+            p = Popen(['python2', 'proplasm5.py', name],
+                      stdout=PIPE, stdin=PIPE, stderr=PIPE)
+            output = p.stdout.read()
+            eq_(p.wait(), 1, output)
+            ok_('no .proto files in %s' % name in output, output)
+    finally:
+        shutil.rmtree(empty_dir)
+
+
 @pre_entry
 def test_empty():
     """empty"""